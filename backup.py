@@ -2,13 +2,26 @@ import os
 import datetime
 import zipfile
 import shutil
+import zlib
 import urllib3
 import json
 import csv
 import argparse
-from typing import List, Tuple, Dict, Optional
+import hashlib
+import io
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, NamedTuple, Tuple, Dict, Optional
+from urllib.parse import urlparse
 from arcgis.gis import GIS
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from retrying import RetryEngine, is_transient_message
 
 # Suppress HTTPS warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -39,17 +52,146 @@ def connect_to_gis(connection_string: str = "home") -> GIS:
         log(f"[ERR] Error connecting to GIS: {e}")
         raise
 
+# ---------------------------
+# Retries and circuit breakers
+# ---------------------------
+# The engine and the error classification live in retrying.py (shared with
+# scan.py); this script's calls all go through one engine.
+retry_engine = RetryEngine(log=log)
+
+def portal_key(item) -> str:
+    """Breaker key for calls served by the portal (item data, downloads, thumbnails)."""
+    return urlparse(getattr(getattr(item, "_gis", None), "url", None) or "").netloc or "portal"
+
+def service_key(item) -> str:
+    """Breaker key for calls served by the item's hosting server (exports, replicas)."""
+    return urlparse(getattr(item, "url", None) or "").netloc or portal_key(item)
+
+# ---------------------------
+# Compression codecs
+# ---------------------------
+# "store", "deflate", "bzip2" and "lzma" work everywhere. "zstd" needs
+# Python 3.14+ for zip archives (or the zstandard package for the chunk
+# store) and "lz4" needs the lz4 package and only applies to the chunk store,
+# since zip has no lz4 method.
+CODECS = ("store", "deflate", "bzip2", "lzma", "zstd", "lz4")
+INCOMPRESSIBLE_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst", ".lz4",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp3", ".mp4", ".mov",
+    ".docx", ".xlsx", ".pptx", ".sd", ".sdpk", ".tpk", ".tpkx", ".vtpk",
+    ".mmpk", ".mpkx", ".ppkx", ".contentexport",
+}
+TRIAL_SAMPLE_SIZE = 64 * 1024
+TRIAL_MIN_SAVING = 0.10   # store a member unless a sample shrinks by at least 10%
+
+class Codec(NamedTuple):
+    name: str = "deflate"
+    level: Optional[int] = None
+
+STORE = Codec("store")
+
+def _zstd_module():
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd
+    except ImportError:
+        import zstandard
+        return zstandard
+
+def check_codec(codec: Codec, for_zip: bool):
+    """Raise ValueError if the codec cannot be used in this environment."""
+    if codec.name not in CODECS:
+        raise ValueError(f"Unknown codec: {codec.name}")
+    if for_zip and codec.name == "lz4":
+        raise ValueError("lz4 is not a zip compression method; use it with --target store.")
+    if for_zip and codec.name == "zstd" and not hasattr(zipfile, "ZIP_ZSTANDARD"):
+        raise ValueError("zstd in .zip archives requires Python 3.14 or newer.")
+    try:
+        if codec.name == "zstd" and not for_zip:
+            _zstd_module()
+        if codec.name == "lz4":
+            import lz4.frame  # noqa: F401
+    except ImportError as e:
+        raise ValueError(f"Codec {codec.name} is not available: {e}")
+
+def zip_compression(codec: Codec) -> Tuple[int, Optional[int]]:
+    """(compress_type, compresslevel) for ZipFile.write/writestr."""
+    if codec.name == "store":
+        return zipfile.ZIP_STORED, None
+    if codec.name == "bzip2":
+        return zipfile.ZIP_BZIP2, codec.level
+    if codec.name == "lzma":
+        return zipfile.ZIP_LZMA, None
+    if codec.name == "zstd":
+        return zipfile.ZIP_ZSTANDARD, codec.level
+    return zipfile.ZIP_DEFLATED, codec.level
+
+def is_incompressible(name: str, path: Optional[str] = None, sample: Optional[bytes] = None) -> bool:
+    """Already-compressed content: known extension, or a trial deflate of a sample barely shrinks it."""
+    if os.path.splitext(name)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return True
+    if sample is None and path:
+        try:
+            with open(path, "rb") as f:
+                sample = f.read(TRIAL_SAMPLE_SIZE)
+        except OSError:
+            return False
+    if not sample or len(sample) < 4096:
+        return False
+    return len(zlib.compress(sample, 1)) > len(sample) * (1 - TRIAL_MIN_SAVING)
+
+def member_codec(codec: Codec, name: str, path: Optional[str] = None, sample: Optional[bytes] = None) -> Codec:
+    if codec.name == "store" or is_incompressible(name, path, sample):
+        return STORE
+    return codec
+
+# Chunk-store payloads carry a one-byte codec tag. Untagged payloads are
+# zlib streams (first byte 0x78) from stores written before codecs existed.
+CHUNK_TAGS = {"store": b"S", "deflate": b"Z", "bzip2": b"B", "lzma": b"X", "zstd": b"T", "lz4": b"L"}
+
+def encode_chunk(codec: Codec, data: bytes) -> bytes:
+    """Compress one chunk. Top-level so it can run on a process pool."""
+    if codec.name == "deflate":
+        body = zlib.compress(data, 6 if codec.level is None else codec.level)
+    elif codec.name == "bzip2":
+        import bz2
+        body = bz2.compress(data, codec.level or 9)
+    elif codec.name == "lzma":
+        import lzma
+        body = lzma.compress(data)
+    elif codec.name == "zstd":
+        zstd = _zstd_module()
+        if hasattr(zstd, "ZstdCompressor"):
+            body = zstd.ZstdCompressor(level=codec.level or 3).compress(data)
+        else:
+            body = zstd.compress(data, level=codec.level or 3)
+    elif codec.name == "lz4":
+        import lz4.frame
+        body = lz4.frame.compress(data, compression_level=codec.level or 0)
+    else:
+        body = data
+    return CHUNK_TAGS[codec.name] + body
+
 # ---------------------------
 # FS Utilities
 # ---------------------------
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
-def make_backup_dir(dest_root: str, item_title: str) -> str:
+def remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def make_backup_name(item_title: Optional[str]) -> str:
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     safe_title = "".join(c for c in (item_title or "untitled") if c.isalnum() or c in (" ", "_")).rstrip()
     safe_title = safe_title[:100] or "untitled"
-    backup_dir = os.path.join(dest_root, f"{safe_title}_{timestamp}")
+    return f"{safe_title}_{timestamp}"
+
+def make_backup_dir(dest_root: str, item_title: str) -> str:
+    backup_dir = os.path.join(dest_root, make_backup_name(item_title))
     ensure_dir(backup_dir)
     return backup_dir
 
@@ -70,7 +212,23 @@ def any_file_in_dir_nonempty(path: str) -> bool:
     except Exception:
         return False
 
-def compress_backup(backup_dir: str, delete_uncompressed: bool = True) -> Tuple[bool, Optional[str], Optional[str]]:
+def path_disk_usage(path: str) -> int:
+    """Bytes held by a file or everything under a folder; 0 if it is gone."""
+    total = 0
+    try:
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+        for root, _, files in os.walk(path):
+            for f in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, f))
+                except OSError:
+                    pass  # removed while walking
+    except OSError:
+        pass
+    return total
+
+def compress_backup(backup_dir: str, delete_uncompressed: bool = True, codec: Codec = Codec()) -> Tuple[bool, Optional[str], Optional[str]]:
     try:
         zip_path = f"{backup_dir}.zip"
         base_dir = os.path.dirname(backup_dir)
@@ -79,7 +237,8 @@ def compress_backup(backup_dir: str, delete_uncompressed: bool = True) -> Tuple[
                 for file in files:
                     file_path = os.path.join(root, file)
                     arcname = os.path.relpath(file_path, base_dir)
-                    zipf.write(file_path, arcname)
+                    compress_type, level = zip_compression(member_codec(codec, file, path=file_path))
+                    zipf.write(file_path, arcname, compress_type=compress_type, compresslevel=level)
         if not file_exists_and_nonempty(zip_path):
             return False, None, "Zip file is missing or empty."
         log(f"[ZIP] Compressed backup to: {zip_path}")
@@ -97,170 +256,2493 @@ def append_log_line(backup_dir: str, line: str):
     except Exception:
         pass
 
-# ---------------------------
-# Artifact helpers
-# ---------------------------
-def save_metadata_only(item, backup_dir: str):
-    try:
-        data = {
-            "title": item.title,
-            "id": item.id,
-            "type": item.type,
-            "url": getattr(item, "url", None),
-            "owner": getattr(item, "owner", None),
-            "tags": getattr(item, "tags", []),
-            "description": getattr(item, "description", ""),
-            "created": getattr(item, "created", None),
-            "modified": getattr(item, "modified", None),
-        }
-        path = os.path.join(backup_dir, f"{item.title}_metadata.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        append_log_line(backup_dir, f"METADATA: {item.title}")
-    except Exception as e:
-        log(f"[WARN] Could not save minimal metadata for {getattr(item, 'title', 'unknown')}: {e}")
+# ---------------------------
+# Artifact sinks
+# ---------------------------
+# Helpers write artifacts through a sink instead of straight into a folder.
+# FolderSink keeps the original staging-folder layout (needed for
+# --keep-uncompressed and the chunk store); ZipSink writes JSON and streamed
+# HTTP downloads (item data, exports, replicas, thumbnails) into the item's
+# archive. Only ArcGIS API calls that can only target a folder (the resources
+# export, and fallbacks when no REST URL is available) land in a scratch
+# folder and are added at close().
+class FolderSink:
+    """Artifacts as plain files in a backup folder, zipped later by compress_backup."""
+
+    def __init__(self, backup_dir: str):
+        self.backup_dir = backup_dir
+        self.scratch_dir = backup_dir
+
+    def __str__(self) -> str:
+        return self.backup_dir
+
+    def write_json(self, name: str, obj: Any, indent: int = 4) -> str:
+        path = os.path.join(self.backup_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=indent, ensure_ascii=False)
+        return path
+
+    @contextmanager
+    def open_stream(self, name: str):
+        path = os.path.join(self.backup_dir, name)
+        ensure_dir(os.path.dirname(path))
+        try:
+            with open(path, "wb") as f:
+                yield f
+        except BaseException:
+            remove_quietly(path)
+            raise
+
+    def member_size(self, name: str) -> int:
+        path = os.path.join(self.backup_dir, name)
+        return os.path.getsize(path) if os.path.isfile(path) else 0
+
+    def add_file(self, path: str) -> str:
+        return path  # already in place
+
+    def disk_usage(self) -> int:
+        """Bytes written so far: the folder plus the archive compress_backup builds next to it."""
+        return path_disk_usage(self.backup_dir) + path_disk_usage(f"{self.backup_dir}.zip")
+
+    def log_line(self, line: str):
+        append_log_line(self.backup_dir, line)
+
+class ZipSink:
+    """
+    Artifacts written straight into <dest_root>/<name>.zip, under the same
+    <name>/ prefix compress_backup would use. The archive is built as
+    <name>.zip.partial and only renamed once close() succeeds.
+
+    Small JSON members are held in memory until close() so a later write of
+    the same name replaces the earlier one, as it would in a folder. Streamed
+    members are spooled to scratch_dir and only added once complete, so
+    streams run in parallel and a failed one leaves nothing in the archive.
+    """
+
+    def __init__(self, dest_root: str, name: str, codec: Codec = Codec()):
+        self.root = name
+        self.codec = codec
+        self.zip_path = os.path.join(dest_root, f"{name}.zip")
+        self.partial_path = self.zip_path + ".partial"
+        self.scratch_dir = os.path.join(dest_root, f".{name}.scratch")
+        ensure_dir(self.scratch_dir)
+        self._zf = zipfile.ZipFile(self.partial_path, "w", zipfile.ZIP_DEFLATED)
+        self._lock = threading.Lock()
+        self._sizes: Dict[str, int] = {}
+        self._members: Dict[str, bytes] = {}
+        self._pending: List[str] = []
+        self._log: List[str] = []
+        self.closed = False
+
+    def __str__(self) -> str:
+        return self.zip_path
+
+    def _arcname(self, name: str) -> str:
+        return f"{self.root}/{name}"
+
+    def write_json(self, name: str, obj: Any, indent: int = 4) -> str:
+        payload = json.dumps(obj, indent=indent, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._members[name] = payload
+            self._sizes[name] = len(payload)
+        return f"{self.zip_path}:{name}"
+
+    @contextmanager
+    def open_stream(self, name: str):
+        fd, spool = tempfile.mkstemp(suffix=".part", dir=self.scratch_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                yield f
+            compress_type, level = zip_compression(member_codec(self.codec, name, path=spool))
+            # ZipFile takes one member at a time; only this copy holds the lock.
+            with self._lock:
+                self._zf.write(spool, self._arcname(name), compress_type=compress_type, compresslevel=level)
+                self._sizes[name] = os.path.getsize(spool)
+        finally:
+            remove_quietly(spool)
+
+    def member_size(self, name: str) -> int:
+        return self._sizes.get(name, 0)
+
+    def add_file(self, path: str) -> str:
+        """Queue a file (or folder) the ArcGIS API downloaded into scratch_dir for close()."""
+        with self._lock:
+            self._pending.append(path)
+        return path
+
+    def disk_usage(self) -> int:
+        """Bytes written so far: the partial archive plus scratch files."""
+        return path_disk_usage(self.partial_path) + path_disk_usage(self.scratch_dir)
+
+    def log_line(self, line: str):
+        with self._lock:
+            self._log.append(line.rstrip())
+
+    def _flush(self):
+        for name, payload in self._members.items():
+            compress_type, level = zip_compression(member_codec(self.codec, name, sample=payload[:TRIAL_SAMPLE_SIZE]))
+            self._zf.writestr(self._arcname(name), payload, compress_type=compress_type, compresslevel=level)
+        self._members = {}
+        for path in dict.fromkeys(self._pending):
+            if os.path.isdir(path):
+                files = [os.path.join(root, f) for root, _, names in os.walk(path) for f in names]
+            else:
+                files = [path] if os.path.isfile(path) else []
+            for file_path in files:
+                arcname = self._arcname(os.path.relpath(file_path, self.scratch_dir).replace(os.sep, "/"))
+                compress_type, level = zip_compression(member_codec(self.codec, file_path, path=file_path))
+                self._zf.write(file_path, arcname, compress_type=compress_type, compresslevel=level)
+        self._pending = []
+        if self._log:
+            compress_type, level = zip_compression(self.codec)
+            self._zf.writestr(self._arcname("backup_log.txt"), "\n".join(self._log) + "\n",
+                              compress_type=compress_type, compresslevel=level)
+            self._log = []
+
+    def close(self, failed: bool = False) -> Tuple[bool, Optional[str], Optional[str]]:
+        """Finish the archive. A failed backup is kept as <name>_FAILED.zip for diagnostics."""
+        if self.closed:
+            return False, None, "Archive already closed."
+        self.closed = True
+        target = self.zip_path[:-4] + "_FAILED.zip" if failed else self.zip_path
+        try:
+            with self._lock:
+                self._flush()
+                self._zf.close()
+            if not file_exists_and_nonempty(self.partial_path):
+                return False, None, "Zip file is missing or empty."
+            os.replace(self.partial_path, target)
+            log(f"[ZIP] Streamed backup to: {target}")
+            return True, target, None
+        except Exception as e:
+            return False, None, f"Compression failed: {e}"
+        finally:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+class MemorySink:
+    """Collects streamed members in memory (small JSON bodies that are parsed as well as stored)."""
+
+    scratch_dir = "."
+
+    def __init__(self):
+        self.members: Dict[str, bytes] = {}
+
+    @contextmanager
+    def open_stream(self, name: str):
+        buf = io.BytesIO()
+        yield buf
+        self.members[name] = buf.getvalue()
+
+    def member_size(self, name: str) -> int:
+        return len(self.members.get(name, b""))
+
+def as_sink(target) -> Any:
+    """Accept a sink or, for callers of the original helper API, a folder path."""
+    return FolderSink(target) if isinstance(target, str) else target
+
+# ---------------------------
+# Item artifact cache
+# ---------------------------
+class ItemArtifacts:
+    """
+    Fetch-once cache of one item's REST-backed artifacts (get_data, _json,
+    related_items and the resources export). Every branch of a backup reads
+    through it, so each call reaches the portal at most once per item.
+    Failures are cached too and re-raised to later callers.
+    """
+
+    def __init__(self, item):
+        self.item = item
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Any, threading.Lock] = {}
+        self._results: Dict[Any, Tuple[bool, Any]] = {}
+
+    def _once(self, key, fetch):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._results:
+                try:
+                    self._results[key] = (True, fetch())
+                except Exception as e:
+                    self._results[key] = (False, e)
+        ok, value = self._results[key]
+        if not ok:
+            raise value
+        return value
+
+    def get_data(self):
+        return self._once("data", lambda: retry_engine.call(portal_key(self.item), self.item.get_data, label="get_data"))
+
+    def json(self):
+        return self._once("json", lambda: getattr(self.item, "_json", None))
+
+    def related_items(self, direction: str = "forward", rel_type: Optional[str] = None) -> List[Any]:
+        key = portal_key(self.item)
+        if rel_type:
+            return self._once(("related", direction, rel_type),
+                              lambda: retry_engine.call(key, self.item.related_items, direction, rel_type) or [])
+        return self._once(("related", direction), lambda: retry_engine.call(key, self.item.related_items, direction) or [])
+
+    def save_data_json(self, sink) -> Tuple[bool, Optional[str]]:
+        return self._once("save_data_json", lambda: backup_item_data_json(self.item, sink, artifacts=self))
+
+    def export_resources(self, sink) -> Tuple[bool, Optional[str]]:
+        return self._once("export_resources", lambda: backup_item_resources(self.item, sink))
+
+# ---------------------------
+# Artifact helpers
+# ---------------------------
+def save_metadata_only(item, backup_dir):
+    sink = as_sink(backup_dir)
+    try:
+        data = {
+            "title": item.title,
+            "id": item.id,
+            "type": item.type,
+            "url": getattr(item, "url", None),
+            "owner": getattr(item, "owner", None),
+            "tags": getattr(item, "tags", []),
+            "description": getattr(item, "description", ""),
+            "created": getattr(item, "created", None),
+            "modified": getattr(item, "modified", None),
+        }
+        sink.write_json(f"{item.title}_metadata.json", data, indent=4)
+        sink.log_line(f"METADATA: {item.title}")
+    except Exception as e:
+        log(f"[WARN] Could not save minimal metadata for {getattr(item, 'title', 'unknown')}: {e}")
+
+def backup_json_metadata(item, backup_dir, artifacts: Optional[ItemArtifacts] = None):
+    sink = as_sink(backup_dir)
+    try:
+        metadata = artifacts.json() if artifacts else getattr(item, "_json", None)
+        if metadata:
+            sink.write_json(f"{item.title}_metadata_full.json", metadata, indent=4)
+            sink.log_line(f"JSON_METADATA: {item.title}")
+    except Exception as e:
+        log(f"[WARN] Could not save JSON metadata for {getattr(item, 'title', 'unknown')}: {e}")
+
+def backup_thumbnail(item, backup_dir, downloader: Optional["HttpDownloader"] = None) -> Tuple[bool, Optional[str]]:
+    sink = as_sink(backup_dir)
+    try:
+        thumbnail = getattr(item, "thumbnail", None)
+        source = item_rest_url(item, f"info/{thumbnail}") if thumbnail else None
+        if not stream_item_file(item, sink, os.path.basename(thumbnail or ""), source, downloader, probe=False):
+            path = retry_engine.call(portal_key(item), item.download_thumbnail, save_folder=sink.scratch_dir)
+            if path:
+                sink.add_file(path)
+        sink.log_line(f"THUMBNAIL: {item.title}")
+        return True, None
+    except Exception as e:
+        return False, f"Thumbnail not downloaded: {e}"
+
+# ---------------------------
+# Resource and Data helpers
+# ---------------------------
+def backup_item_resources(item, backup_dir) -> Tuple[bool, Optional[str]]:
+    sink = as_sink(backup_dir)
+    try:
+        resources = getattr(item, "resources", None)
+        if not resources:
+            return True, "No resources"
+        # The API builds the resources zip into a folder, so this one is staged in scratch
+        res_zip_path = os.path.join(sink.scratch_dir, "resources.zip")
+        retry_engine.call(portal_key(item), item.resources.export, save_path=sink.scratch_dir,
+                          file_name="resources.zip", label="resources.export")
+        if os.path.isfile(res_zip_path) and os.path.getsize(res_zip_path) > 0:
+            sink.add_file(res_zip_path)
+            sink.log_line(f"RESOURCES: {item.title}")
+            log(f"[OK] Exported all resources for {item.title} -> {res_zip_path}")
+            return True, None
+        else:
+            return False, "Resource ZIP missing or empty."
+    except Exception as e:
+        log(f"[WARN] Failed to export resources for {item.title}: {e}")
+        return False, str(e)
+
+def backup_item_data_json(item, backup_dir, artifacts: Optional[ItemArtifacts] = None) -> Tuple[bool, Optional[str]]:
+    sink = as_sink(backup_dir)
+    try:
+        data = artifacts.get_data() if artifacts else retry_engine.call(portal_key(item), item.get_data)
+        sink.write_json(f"{item.title}_data.json", data if data is not None else {}, indent=2)
+        sink.log_line(f"DATA_JSON: {item.title}")
+        return True, None
+    except Exception as e:
+        return False, f"get_data failed: {e}"
+
+# ---------------------------
+# HTTP downloads
+# ---------------------------
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+SEGMENT_MIN_SIZE = 64 * 1024 * 1024   # a file is only split when every segment gets at least this much
+DOWNLOAD_TIMEOUT = (30, 600)          # (connect, read) seconds
+DOWNLOAD_RESUMES = 5                  # mid-transfer drops survived per file/segment
+
+class HttpDownloader:
+    """
+    One pooled requests.Session for item data, export and replica result
+    URLs, shared by all download workers. A transfer is written straight into
+    a sink member and resumes with HTTP Range after a dropped connection
+    (when the server accepts ranges). Only large files on servers that accept
+    ranges are fetched as `segments` parallel .part files in the sink's scratch
+    folder, each resumable, and joined into the member afterwards. 429/5xx
+    responses are raised and retried by the caller through retry_engine.
+    """
+
+    def __init__(self, chunk_size: int = DOWNLOAD_CHUNK_SIZE, segments: int = 1, pool_size: int = 16):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.chunk_size = max(64 * 1024, chunk_size)
+        self.segments = max(1, segments)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size * self.segments)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._transient = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+    def _probe(self, url: str, params: Optional[Dict[str, str]]) -> Tuple[Optional[int], bool]:
+        """(total size, accepts ranges) from a one-byte ranged GET; presigned URLs often reject HEAD."""
+        with self.session.get(url, params=params, headers={"Range": "bytes=0-0"}, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            r.raise_for_status()
+            content_range = r.headers.get("Content-Range", "")
+            if r.status_code == 206 and "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                return (int(total) if total.isdigit() else None), True
+            length = r.headers.get("Content-Length")
+            return (int(length) if length and length.isdigit() else None), False
+
+    def _fetch_range(self, url: str, params: Optional[Dict[str, str]], path: str, start: int, end: Optional[int]) -> int:
+        """Fetch bytes start..end (inclusive, None = to the end) into path, resuming from what path already holds."""
+        expected = end - start + 1 if end is not None else None
+        for attempt in range(DOWNLOAD_RESUMES + 1):
+            have = os.path.getsize(path) if os.path.isfile(path) else 0
+            if expected is not None and have >= expected:
+                return have
+            offset = start + have
+            headers = {"Range": f"bytes={offset}-{'' if end is None else end}"} if offset or end is not None else {}
+            try:
+                with self.session.get(url, params=params, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                    if r.status_code == 416 and expected is None and have:
+                        return have  # already complete
+                    r.raise_for_status()
+                    if headers and r.status_code != 206:
+                        if start:
+                            raise RuntimeError("Server ignored the Range header for a segment.")
+                        have = 0  # server sent the whole file again; start over
+                    with open(path, "ab" if have else "wb") as f:
+                        for chunk in r.iter_content(chunk_size=self.chunk_size):
+                            if chunk:
+                                f.write(chunk)
+                have = os.path.getsize(path)
+                if expected is None or have >= expected:
+                    return have
+                log(f"[WARN] Short read on {os.path.basename(path)} ({have}/{expected} bytes), resuming")
+            except self._transient as e:
+                if attempt == DOWNLOAD_RESUMES:
+                    raise
+                have = os.path.getsize(path) if os.path.isfile(path) else 0
+                log(f"[WARN] Download of {os.path.basename(path)} interrupted at {have} bytes, resuming: {e}")
+        raise RuntimeError(f"Download incomplete after {DOWNLOAD_RESUMES} resumes: {path}")
+
+    def _stream(self, url: str, params: Optional[Dict[str, str]], out, total: Optional[int], ranged: bool) -> int:
+        """One GET written straight to `out`; a drop resumes from the bytes already written when the server allows Range."""
+        have = 0
+        for attempt in range(DOWNLOAD_RESUMES + 1):
+            headers = {"Range": f"bytes={have}-"} if have else {}
+            try:
+                with self.session.get(url, params=params, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                    if r.status_code == 416 and have:
+                        return have  # already complete
+                    r.raise_for_status()
+                    if have and r.status_code != 206:
+                        raise RuntimeError("Server ignored the Range header; the streamed download cannot resume.")
+                    for chunk in r.iter_content(chunk_size=self.chunk_size):
+                        if chunk:
+                            out.write(chunk)
+                            have += len(chunk)
+                if total is None or have >= total:
+                    return have
+                log(f"[WARN] Short read on {url} ({have}/{total} bytes), resuming")
+            except self._transient as e:
+                if attempt == DOWNLOAD_RESUMES or not ranged:
+                    raise
+                log(f"[WARN] Download of {url} interrupted at {have} bytes, resuming: {e}")
+        raise RuntimeError(f"Download incomplete after {DOWNLOAD_RESUMES} resumes: {url}")
+
+    def fetch_into(self, url: str, sink, name: str, params: Optional[Dict[str, str]] = None, probe: bool = True) -> int:
+        """
+        Download url into the sink member `name` and return its size. A failed
+        transfer leaves no member behind. probe=False skips the size/Range probe
+        for small files (a single GET, no resume).
+        """
+        total, ranged = self._probe(url, params) if probe else (None, False)
+        segments = self.segments if ranged and total else 1
+        if total:
+            segments = max(1, min(segments, total // SEGMENT_MIN_SIZE))
+        if segments <= 1:
+            with sink.open_stream(name) as out:
+                size = self._stream(url, params, out, total, ranged)
+                if total and size != total:
+                    raise RuntimeError(f"Downloaded {size} of {total} bytes.")
+            return size
+        part = os.path.join(sink.scratch_dir, name + ".part")
+        ensure_dir(os.path.dirname(part))
+        step = -(-total // segments)
+        bounds = [(i, min(i + step, total) - 1) for i in range(0, total, step)]
+        seg_paths = [f"{part}.{n}" for n in range(len(bounds))]
+        try:
+            with ThreadPoolExecutor(max_workers=len(bounds), thread_name_prefix="segment") as ex:
+                futures = [ex.submit(self._fetch_range, url, params, p, s, e) for p, (s, e) in zip(seg_paths, bounds)]
+                for fut in futures:
+                    fut.result()
+            size = sum(os.path.getsize(p) for p in seg_paths)
+            if size != total:
+                raise RuntimeError(f"Downloaded {size} of {total} bytes.")
+            with sink.open_stream(name) as out:
+                for p in seg_paths:
+                    with open(p, "rb") as f:
+                        shutil.copyfileobj(f, out, self.chunk_size)
+            return size
+        finally:
+            for p in seg_paths:
+                remove_quietly(p)
+
+    def fetch(self, url: str, dest_path: str, params: Optional[Dict[str, str]] = None) -> str:
+        """Download url to dest_path and return it."""
+        self.fetch_into(url, FolderSink(os.path.dirname(dest_path) or "."), os.path.basename(dest_path), params=params)
+        return dest_path
+
+    def close(self):
+        self.session.close()
+
+_downloader: Optional[HttpDownloader] = None
+_downloader_lock = threading.Lock()
+
+def get_downloader() -> HttpDownloader:
+    """Process-wide default downloader for callers outside the pipeline."""
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = HttpDownloader()
+        return _downloader
+
+def item_rest_url(item, path: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """(url, params) for content/items/<id>/<path>, or None when the connection does not expose them."""
+    try:
+        resturl = item._gis._portal.resturl
+        token = getattr(item._gis._con, "token", None)
+    except Exception:
+        return None
+    if not resturl:
+        return None
+    return f"{resturl.rstrip('/')}/content/items/{item.id}/{path}", ({"token": token} if token else {})
+
+def export_data_url(export) -> Optional[Tuple[str, Dict[str, str]]]:
+    """(url, params) for an export item's file, or None when the connection does not expose them."""
+    if not getattr(export, "name", None):
+        return None
+    return item_rest_url(export, "data")
+
+def stream_item_file(item, sink, name: str, source: Optional[Tuple[str, Dict[str, str]]],
+                     downloader: Optional[HttpDownloader], probe: bool = True) -> bool:
+    """Stream a REST file into sink member `name`; False when it has to go through the ArcGIS API instead."""
+    if not source or not downloader:
+        return False
+    try:
+        retry_engine.call(portal_key(item), downloader.fetch_into, source[0], sink, name, params=source[1], probe=probe)
+        return sink.member_size(name) > 0
+    except Exception as e:
+        log(f"[WARN] Pooled download of {item.id} failed, using the ArcGIS API: {e}")
+        return False
+
+# ---------------------------
+# Download/Export handlers
+# ---------------------------
+def download_item(item, backup_dir, downloader: Optional[HttpDownloader] = None) -> Tuple[bool, Optional[str], Optional[str]]:
+    sink = as_sink(backup_dir)
+    try:
+        log(f"[TASK] Downloading {item.title}...")
+        name = getattr(item, "name", None)
+        if name and stream_item_file(item, sink, name, item_rest_url(item, "data"), downloader):
+            sink.log_line(f"DOWNLOAD: {item.title}")
+            log(f"[OK] Downloaded: {sink}:{name}")
+            return True, name, None
+        path = retry_engine.call(portal_key(item), item.download, save_path=sink.scratch_dir)
+        if isinstance(path, str) and file_exists_and_nonempty(path):
+            sink.add_file(path)
+            sink.log_line(f"DOWNLOAD: {item.title}")
+            log(f"[OK] Downloaded: {path}")
+            return True, path, None
+        if path and os.path.isdir(path) and any_file_in_dir_nonempty(path):
+            sink.add_file(path)
+            sink.log_line(f"DOWNLOAD_DIR: {item.title}")
+            log(f"[OK] Downloaded to folder: {path}")
+            return True, path, None
+        return False, None, "Download returned no file or empty content."
+    except Exception as e:
+        return False, None, f"Download failed: {e}"
+
+def submit_export(item, export_format: str, label: str, wait: bool = True):
+    log(f"[TASK] Exporting {label} {item.title} as {export_format}...")
+    return retry_engine.call(service_key(item), item.export, f"{item.title}_export",
+                             export_format=export_format, wait=wait, idempotent=False)
+
+def start_export(item, export_format: str, label: str, keep_exports: bool = False) -> "ServerJob":
+    """Submit an export without waiting for it; poll the returned job for the export item."""
+    res = submit_export(item, export_format, label, wait=False)
+    if isinstance(res, dict) and res.get("exportItemId"):
+        return ExportJob(item, res, label=f"Export of {item.title}", keep_exports=keep_exports)
+    # Some API versions hand back the finished export item even with wait=False.
+    return CompletedJob(res)
+
+def download_export(item, export, export_format: str, backup_dir, keep_exports: bool = False,
+                    downloader: Optional[HttpDownloader] = None) -> Tuple[bool, Optional[str], Optional[str]]:
+    sink = as_sink(backup_dir)
+    try:
+        if stream_item_file(export, sink, export.name, export_data_url(export), downloader):
+            sink.log_line(f"EXPORT_{export_format.upper().replace(' ', '_')}: {item.title}")
+            log(f"[OK] Exported to: {sink}:{export.name}")
+            return True, export.name, None
+        path = retry_engine.call(portal_key(export), export.download, sink.scratch_dir)
+        if isinstance(path, str) and os.path.isfile(path) and os.path.getsize(path) > 0:
+            sink.add_file(path)
+            sink.log_line(f"EXPORT_{export_format.upper().replace(' ', '_')}: {item.title}")
+            log(f"[OK] Exported to: {path}")
+            return True, path, None
+        if path and os.path.isdir(path) and any_file_in_dir_nonempty(path):
+            sink.add_file(path)
+            sink.log_line(f"EXPORTDIR_{export_format.upper().replace(' ', '_')}: {item.title}")
+            log(f"[OK] Exported to folder: {path}")
+            return True, path, None
+        return False, None, "Export produced no file or empty content."
+    except Exception as e:
+        return False, None, f"Export failed: {e}"
+    finally:
+        if not keep_exports:
+            try:
+                export.delete()
+                log(f"[CLEAN] Deleted temporary export item: {export.id}")
+            except Exception as de:
+                log(f"[WARN] Could not delete temporary export item: {de}")
+        else:
+            log(f"[INFO] Keeping temporary export item: {export.id}")
+
+def export_item(item, export_format: str, backup_dir, label: str, keep_exports: bool = False) -> Tuple[bool, Optional[str], Optional[str]]:
+    try:
+        export = submit_export(item, export_format, label)
+    except Exception as e:
+        return False, None, f"Export failed: {e}"
+    return download_export(item, export, export_format, backup_dir, keep_exports=keep_exports)
+
+def request_replica(item, layer_ids: Optional[List[str]] = None, name: Optional[str] = None,
+                    sync: bool = False) -> Tuple[bool, Optional["ServerJob"], Optional[str]]:
+    """
+    Ask the service for an FGDB replica of every layer (or only layer_ids).
+    sync=True registers it (perLayer) so later deltas can be pulled from it.
+    Returns (ok, job, error); the job yields the result URL.
+    """
+    try:
+        if not getattr(item, "url", None):
+            return False, None, "No service URL; replica not applicable."
+        if layer_ids is None:
+            layers = getattr(item, "layers", None)
+            if not layers:
+                return False, None, "Item has no layers; replica not applicable."
+            layer_ids = []
+            for lyr in layers:
+                try:
+                    lid = lyr.properties.id
+                    layer_ids.append(str(lid))
+                except Exception:
+                    continue
+        if not layer_ids:
+            return False, None, "No layer IDs available for replica."
+        params = {
+            "f": "json",
+            "replicaName": name or f"{item.title}_replica",
+            "layers": ",".join(layer_ids),
+            "returnAttachments": True,
+            "attachmentsSyncDirection": "none",
+            "syncModel": "perLayer" if sync else "none",
+            "dataFormat": "filegdb",
+            "async": True,
+            "transportType": "esriTransportTypeUrl"
+        }
+        url = item.url.rstrip("/") + "/createReplica"
+        resp = retry_engine.call(service_key(item), item._con.post, url, params, idempotent=False, label="createReplica")
+        if resp and resp.get("resultUrl"):
+            return True, CompletedJob(resp["resultUrl"]), None
+        if resp and resp.get("statusUrl"):
+            return True, ReplicaJob(item, resp["statusUrl"]), None
+        return False, None, f"Replica response invalid: {resp}"
+    except Exception as e:
+        return False, None, f"Replica failed: {e}"
+
+def download_replica(item, result_url: str, backup_dir,
+                     downloader: Optional[HttpDownloader] = None) -> Tuple[bool, Optional[str], Optional[str]]:
+    sink = as_sink(backup_dir)
+    try:
+        name = f"{item.title}_replica.gdb.zip"
+        size = retry_engine.call(urlparse(result_url).netloc or service_key(item), (downloader or get_downloader()).fetch_into,
+                                 result_url, sink, name)
+        if size > 0:
+            sink.log_line(f"REPLICA_FGDB: {item.title}")
+            log(f"[OK] Replica downloaded: {sink}:{name}")
+            return True, name, None
+        return False, None, "Replica file empty."
+    except Exception as e:
+        return False, None, f"Replica failed: {e}"
+
+def download_layer_replicas(item, results: Dict[str, str], backup_dir, downloader: Optional[HttpDownloader] = None,
+                            workers: int = 4) -> Tuple[bool, Optional[str], Optional[str]]:
+    """Fetch every per-layer replica into <title>_layers/ and write <title>_layers.json describing them."""
+    sink = as_sink(backup_dir)
+    folder = f"{item.title}_layers"
+    ensure_dir(os.path.join(sink.scratch_dir, folder))
+    names = {}
+    for lyr in list(getattr(item, "layers", None) or []) + list(getattr(item, "tables", None) or []):
+        try:
+            names[str(lyr.properties.id)] = lyr.properties.get("name") or ""
+        except Exception:
+            continue
+
+    def fetch(lid: str, url: str) -> str:
+        path = os.path.join(sink.scratch_dir, folder, f"layer_{lid}.gdb.zip")
+        retry_engine.call(urlparse(url).netloc or service_key(item), (downloader or get_downloader()).fetch, url, path)
+        if os.path.getsize(path) == 0:
+            raise RuntimeError(f"layer {lid} replica file empty")
+        return path
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(results))), thread_name_prefix="layer-dl") as pool:
+            paths = dict(zip(results, pool.map(fetch, results, results.values())))
+    except Exception as e:
+        return False, None, f"Layer replica download failed: {e}"
+    for path in paths.values():
+        sink.add_file(path)
+    name = f"{item.title}_layers.json"
+    sink.write_json(name, {
+        "item_id": item.id, "service_url": item.url,
+        "layers": [{"id": lid, "name": names.get(lid, ""), "file": f"{folder}/layer_{lid}.gdb.zip"} for lid in paths],
+    }, indent=2)
+    sink.log_line(f"LAYER_REPLICAS: {item.title} ({len(paths)} layer(s))")
+    log(f"[OK] Downloaded {len(paths)} per-layer replica(s): {item.title}")
+    return True, name, None
+
+def try_create_replica(item, backup_dir) -> Tuple[bool, Optional[str], Optional[str]]:
+    ok, server_job, err = request_replica(item)
+    if ok:
+        ok, result_url, err = server_job.wait()
+    if not ok:
+        return False, None, err
+    return download_replica(item, result_url, backup_dir)
+
+# ---------------------------
+# Server-side jobs
+# ---------------------------
+POLL_INTERVAL = 2.0          # first status check after submitting, in seconds
+POLL_MAX_INTERVAL = 15.0     # polling backs off up to this interval
+POLL_MAX_ERRORS = 5          # consecutive failed status checks before giving up
+SERVER_JOB_TIMEOUT = 4 * 3600
+
+class ServerJob(ABC):
+    """
+    An export or replica job running on the portal. check() asks for its
+    status once without blocking and returns (state, result, error), where
+    state is "pending", "done" or "failed". wait() polls until it settles.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.timeout: Optional[float] = SERVER_JOB_TIMEOUT
+        self.started = time.time()
+        self.interval = POLL_INTERVAL
+        self.next_poll = self.started
+        self.errors = 0
+
+    @abstractmethod
+    def poll(self) -> Tuple[str, Any, Optional[str]]:
+        """Ask for the job's status once: (state, result, error)."""
+
+    def cleanup(self):
+        """Remove anything the job left on the portal after it failed."""
+
+    def check(self) -> Tuple[str, Any, Optional[str]]:
+        if self.timeout and time.time() - self.started > self.timeout:
+            state = ("failed", None, f"{self.label} timed out")
+        else:
+            try:
+                state = self.poll()
+                self.errors = 0
+            except Exception as e:
+                self.errors += 1
+                state = ("pending", None, None)
+                if self.errors >= POLL_MAX_ERRORS:
+                    state = ("failed", None, f"{self.label} status check failed: {e}")
+        if state[0] == "pending":
+            self.next_poll = time.time() + self.interval
+            self.interval = min(self.interval * 1.5, POLL_MAX_INTERVAL)
+        elif state[0] == "failed":
+            self.cleanup()
+        return state
+
+    def wait(self) -> Tuple[bool, Any, Optional[str]]:
+        while True:
+            state, result, err = self.check()
+            if state != "pending":
+                return state == "done", result, err
+            time.sleep(max(0.0, self.next_poll - time.time()))
+
+class CompletedJob(ServerJob):
+    """A server step that already finished when it was submitted."""
+
+    def __init__(self, result: Any):
+        super().__init__("Completed job")
+        self.result = result
+
+    def poll(self):
+        return "done", self.result, None
+
+class ExportJob(ServerJob):
+    """An item.export(wait=False) job; polls the export item's status."""
+
+    def __init__(self, item, response: Dict[str, Any], label: str, keep_exports: bool = False):
+        super().__init__(label)
+        self.item = item
+        self.response = response
+        self.keep_exports = keep_exports
+        self.export_item = None
+
+    def poll(self):
+        if self.export_item is None:
+            self.export_item = self.item._gis.content.get(self.response["exportItemId"])
+            if self.export_item is None:
+                return "pending", None, None
+        status = self.export_item.status(job_id=self.response.get("jobId"), job_type="export") or {}
+        state = str(status.get("status", "")).lower()
+        if state == "completed":
+            return "done", self.export_item, None
+        if state == "failed":
+            return "failed", None, f"Export failed: {status.get('statusMessage') or status}"
+        return "pending", None, None
+
+    def cleanup(self):
+        if self.export_item is None or self.keep_exports:
+            return
+        try:
+            self.export_item.delete()
+            log(f"[CLEAN] Deleted failed export item: {self.export_item.id}")
+        except Exception as e:
+            log(f"[WARN] Could not delete failed export item: {e}")
+
+class ReplicaJob(ServerJob):
+    """An async createReplica job; polls its statusUrl for the result URL."""
+
+    def __init__(self, item, status_url: str):
+        super().__init__(f"Replica of {item.title}")
+        self.item = item
+        self.status_url = status_url
+
+    def poll(self):
+        resp = self.item._con.get(self.status_url, {"f": "json"}) or {}
+        state = str(resp.get("status", "")).lower()
+        if state == "completed":
+            if resp.get("resultUrl"):
+                return "done", resp["resultUrl"], None
+            return "failed", None, f"Replica completed without a result URL: {resp}"
+        if "fail" in state or "error" in state:
+            return "failed", None, f"Replica failed: {resp.get('error') or resp}"
+        return "pending", None, None
+
+class LayerSetJob(ServerJob):
+    """
+    One replica per layer of a service, at most `parallel` of them on the
+    server at once. A layer whose replica fails or outlives layer_timeout is
+    resubmitted on its own, up to `retries` times, while the other layers
+    carry on. Settles with {layer id: result URL} once every layer has one.
+
+    With a poller, every layer replica in flight holds one of its server job
+    slots: the slot the export worker took covers the first, and the others
+    are taken without blocking and given back as layers finish.
+
+    createReplica calls run on the job's own small pool, so a slow
+    submission never holds up the poller thread; poll() picks up the
+    submitted jobs on its next pass.
+    """
+
+    def __init__(self, item, layer_ids: List[str], parallel: int = 4, retries: int = 2,
+                 layer_timeout: Optional[float] = None, poller: Optional["ExportPoller"] = None):
+        super().__init__(f"Layer replicas of {item.title}")
+        self.timeout = None  # every layer job has its own
+        self.item = item
+        self.layer_ids = list(layer_ids)
+        self.parallel = max(1, parallel)
+        self.retries = max(0, retries)
+        self.layer_timeout = layer_timeout
+        self.queue = list(layer_ids)
+        self.running: Dict[str, ServerJob] = {}
+        self.submitting: Dict[str, Future] = {}
+        self.results: Dict[str, Any] = {}
+        self.tries = {lid: 0 for lid in layer_ids}
+        self.poller = poller
+        self.extra_slots = 0
+        self._pool = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix="layer-submit")
+
+    def _in_flight(self) -> int:
+        return len(self.running) + len(self.submitting)
+
+    def _take_slot(self) -> bool:
+        """Room for one more layer replica on the server."""
+        if self.poller is None or self._in_flight() < 1 + self.extra_slots:
+            return True
+        if self.poller.try_acquire():
+            self.extra_slots += 1
+            return True
+        return False
+
+    def _return_slots(self, keep: int):
+        while self.extra_slots > keep:
+            self.extra_slots -= 1
+            self.poller.release()
+
+    def _retry(self, lid: str, err: Optional[str], later: List[str]) -> Optional[str]:
+        """Queue the layer again; returns the job's error once its retries are used up."""
+        if self.tries[lid] > self.retries:
+            return f"Layer {lid} of {self.item.title} failed after {self.tries[lid]} attempt(s): {err}"
+        log(f"[RETRY] {self.item.title}: layer {lid} replica failed ({err}); resubmitting that layer")
+        later.append(lid)
+        return None
+
+    def poll(self):
+        later: List[str] = []
+        for lid, job in list(self.running.items()):
+            if job.next_poll > time.time():
+                continue
+            state, result, err = job.check()
+            if state == "pending":
+                continue
+            del self.running[lid]
+            if state == "done":
+                self.results[lid] = result
+                continue
+            fatal = self._retry(lid, err, later)
+            if fatal:
+                return "failed", None, fatal
+        for lid, future in list(self.submitting.items()):
+            if not future.done():
+                continue
+            del self.submitting[lid]
+            try:
+                ok, job, err = future.result()
+            except Exception as e:
+                ok, job, err = False, None, f"Replica failed: {e}"
+            if not ok:
+                fatal = self._retry(lid, err, later)
+                if fatal:
+                    return "failed", None, fatal
+                continue
+            job.timeout = self.layer_timeout or job.timeout
+            self.running[lid] = job
+        while self.queue and self._in_flight() < self.parallel and self._take_slot():
+            lid = self.queue.pop(0)
+            self.tries[lid] += 1
+            self.submitting[lid] = self._pool.submit(request_replica, self.item, [lid], f"{self.item.title}_layer{lid}")
+        self.queue.extend(later)  # failed layers go back in on the next poll
+        if self.running or self.submitting or self.queue:
+            return "pending", None, None
+        return "done", {lid: self.results[lid] for lid in self.layer_ids}, None
+
+    def check(self):
+        state = super().check()
+        if state[0] == "pending" and self.running:
+            self.next_poll = min(job.next_poll for job in self.running.values())
+        if state[0] == "pending" and (self.queue or self.submitting):
+            # Waiting for a free slot or a submission: look again soon rather than on the backoff schedule.
+            self.next_poll = min(self.next_poll, time.time() + POLL_INTERVAL)
+        if state[0] != "pending":
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        # The poller releases the worker's own slot once the job settles.
+        self._return_slots(max(0, self._in_flight() - 1) if state[0] == "pending" else 0)
+        return state
+
+# ---------------------------
+# Replica sync (incremental feature data)
+# ---------------------------
+# A sync-enabled service's full baseline is itself a registered (perLayer)
+# FGDB replica, so the layer server generations recorded for it describe
+# exactly the rows in the baseline. Later runs pull only the edits made since
+# those generations, as a JSON delta. sync_chain.json in
+# each backup lists the baseline and earlier deltas (paths relative to the
+# backup root) so restore.py can rebuild the data from the chain.
+SYNC_CHAIN_FILE = "sync_chain.json"
+
+def is_sync_enabled(item) -> bool:
+    if not getattr(item, "url", None):
+        return False
+    try:
+        info = retry_engine.call(service_key(item), item._con.get, item.url, {"f": "json"}, label="service info") or {}
+    except Exception as e:
+        log(f"[WARN] Could not read service info for {item.title}: {e}")
+        return False
+    return bool(info.get("syncEnabled")) or "sync" in str(info.get("capabilities", "")).lower()
+
+def replica_layer_ids(item) -> List[str]:
+    ids = []
+    for lyr in list(getattr(item, "layers", None) or []) + list(getattr(item, "tables", None) or []):
+        try:
+            ids.append(str(lyr.properties.id))
+        except Exception:
+            continue
+    return ids
+
+def fetch_replica_gens(item, replica_id: str) -> List[Dict[str, Any]]:
+    url = f"{item.url.rstrip('/')}/replicas/{replica_id}"
+    info = retry_engine.call(service_key(item), item._con.get, url, {"f": "json"}, label="replica info") or {}
+    return info.get("layerServerGens") or []
+
+def find_replica_id(item, name: str) -> Optional[str]:
+    """ID of the replica registered on the service under `name`."""
+    url = item.url.rstrip("/") + "/replicas"
+    replicas = retry_engine.call(service_key(item), item._con.get, url, {"f": "json"}, label="replicas") or []
+    for replica in replicas if isinstance(replicas, list) else []:
+        if replica.get("replicaName") == name:
+            return replica.get("replicaID")
+    return None
+
+def unregister_sync_replica(item, replica_id: str):
+    try:
+        url = item.url.rstrip("/") + "/unRegisterReplica"
+        retry_engine.call(service_key(item), item._con.post, url, {"f": "json", "replicaID": replica_id}, label="unRegisterReplica")
+        log(f"[CLEAN] Unregistered sync replica {replica_id} for {item.title}")
+    except Exception as e:
+        log(f"[WARN] Could not unregister sync replica {replica_id}: {e}")
+
+def request_sync_delta(item, replica_id: str, layer_gens: List[Dict[str, Any]]) -> Tuple[bool, Optional["ServerJob"], Optional[str]]:
+    """Ask for every edit since layer_gens. The job yields a result URL, or the delta itself for a synchronous reply."""
+    try:
+        params = {
+            "f": "json",
+            "replicaID": replica_id,
+            "transportType": "esriTransportTypeUrl",
+            "closeReplica": False,
+            "returnIdsForAdds": False,
+            "edits": "[]",
+            "returnAttachmentDatabyURL": False,
+            "async": True,
+            "syncDirection": "download",
+            "syncLayers": json.dumps([
+                {"id": g["id"], "serverGen": g["serverGen"], "syncDirection": "download"} for g in layer_gens
+            ]),
+            "dataFormat": "json",
+        }
+        url = item.url.rstrip("/") + "/synchronizeReplica"
+        resp = retry_engine.call(service_key(item), item._con.post, url, params, idempotent=False, label="synchronizeReplica") or {}
+        if resp.get("statusUrl"):
+            return True, ReplicaJob(item, resp["statusUrl"]), None
+        if resp.get("resultUrl") or resp.get("responseUrl"):
+            return True, CompletedJob(resp.get("resultUrl") or resp.get("responseUrl")), None
+        if "edits" in resp:
+            return True, CompletedJob(resp), None
+        return False, None, f"Sync response invalid: {resp}"
+    except Exception as e:
+        return False, None, f"Replica sync failed: {e}"
+
+def download_sync_delta(item, result: Any, sink, downloader: Optional[HttpDownloader], name: str) -> Dict[str, Any]:
+    """Save the delta as `name` in the sink and return it parsed."""
+    if isinstance(result, dict):
+        sink.write_json(name, result, indent=None)
+        return result
+    buffer = MemorySink()
+    retry_engine.call(urlparse(result).netloc or service_key(item), (downloader or get_downloader()).fetch_into,
+                      result, buffer, name)
+    payload = buffer.members[name]
+    with sink.open_stream(name) as out:
+        out.write(payload)
+    return json.loads(payload.decode("utf-8"))
+
+# ---------------------------
+# Feature query extraction
+# ---------------------------
+# Last-resort copy of a feature service's rows when neither export nor replica
+# works (non-sync services, views, export disabled). Each layer's query
+# endpoint is paged by objectId range (or resultOffset when the ids are too
+# sparse or their bounds cannot be read) with several page requests in
+# flight. Ranges come from the min/max objectId, so no id list is held. Pages are written to a SQLite
+# file as they complete: one table per layer/table, attribute columns typed
+# from the layer fields and the Esri JSON geometry in a last column named so
+# it cannot clash with a field ("_geometry" unless a field already has that
+# name; _layers records it). Attachments are streamed into their blob in
+# chunks. Only a fixed window of pages is held in memory at a time.
+QUERY_PAGE_MAX = 2000
+QUERY_WINDOW_PER_WORKER = 2
+QUERY_SPARSE_FACTOR = 4  # range paging may cost at most this many queries per full page
+SQL_FIELD_TYPES = {
+    "esriFieldTypeOID": "INTEGER",
+    "esriFieldTypeInteger": "INTEGER",
+    "esriFieldTypeSmallInteger": "INTEGER",
+    "esriFieldTypeBigInteger": "INTEGER",
+    "esriFieldTypeDouble": "REAL",
+    "esriFieldTypeSingle": "REAL",
+    "esriFieldTypeDate": "INTEGER",  # epoch milliseconds, as the service returns them
+}
+
+def quote_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def geometry_column(names: List[str]) -> str:
+    """A column name for the geometry that no field uses (SQLite compares names case-insensitively)."""
+    taken = {str(n).lower() for n in names}
+    column = "_geometry"
+    while column.lower() in taken:
+        column = "_" + column
+    return column
+
+def store_attachment(conn: sqlite3.Connection, lid: int, oid, aid, name: str, content_type: str, path: str):
+    """Insert an attachment row with a zeroblob and copy the file into it chunk by chunk."""
+    size = os.path.getsize(path)
+    cursor = conn.execute("INSERT INTO _attachments VALUES (?, ?, ?, ?, ?, zeroblob(?))",
+                          (lid, oid, aid, name, content_type, size))
+    with open(path, "rb") as f, conn.blobopen("_attachments", "data", cursor.lastrowid) as blob:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            blob.write(chunk)
+
+def query_layer(item, layer_url: str, params: Dict[str, Any], endpoint: str = "query") -> Dict[str, Any]:
+    url = f"{layer_url.rstrip('/')}/{endpoint}"
+    resp = retry_engine.call(service_key(item), item._con.post, url, dict(params, f="json"), label=endpoint) or {}
+    if resp.get("error"):
+        raise RuntimeError(f"{endpoint} failed: {resp['error']}")
+    return resp
+
+def objectid_bounds(item, lyr, oid_field: str) -> Tuple[int, int, int]:
+    """(min objectId, max objectId, row count) of a layer from one statistics query."""
+    stats = [{"statisticType": kind, "onStatisticField": oid_field, "outStatisticFieldName": f"oid_{kind}"}
+             for kind in ("min", "max", "count")]
+    resp = query_layer(item, lyr.url, {"where": "1=1", "outStatistics": json.dumps(stats)})
+    attrs = ((resp.get("features") or [{}])[0]).get("attributes") or {}
+    attrs = {k.lower(): v for k, v in attrs.items()}
+    return int(attrs.get("oid_min") or 0), int(attrs.get("oid_max") or 0), int(attrs.get("oid_count") or 0)
+
+def layer_query_pages(item, lyr, oid_field: str, page_size: int) -> Tuple[Iterator[Dict[str, Any]], bool]:
+    """
+    Query params for every page of a layer, generated lazily; the flag is True
+    when pages are objectId ranges. A range spans page_size ids, so it never
+    holds more rows than a page even where the ids are dense.
+    """
+    try:
+        low, high, count = objectid_bounds(item, lyr, oid_field)
+        if not count:
+            return iter(()), True
+        if (high - low + 1) <= count * QUERY_SPARSE_FACTOR:
+            column = quote_ident(oid_field)
+            return ({"where": f"{column} >= {start} AND {column} < {start + page_size}"}
+                    for start in range(low, high + 1, page_size)), True
+        log(f"[INFO] {item.title}: objectIds of {lyr.url} are sparse; paging by offset")
+    except Exception as e:
+        log(f"[WARN] {item.title}: objectId range unavailable for {lyr.url} ({e}); paging by offset")
+    count = int(query_layer(item, lyr.url, {"where": "1=1", "returnCountOnly": True}).get("count") or 0)
+    return (
+        {"where": "1=1", "resultOffset": offset, "resultRecordCount": page_size, "orderByFields": oid_field}
+        for offset in range(0, count, page_size)
+    ), False
+
+def fetch_page_attachments(item, layer_url: str, selection: Dict[str, Any], folder: str) -> List[Tuple[Any, Any, str, str, str]]:
+    """
+    Download the attachments of one page of features, selected by
+    definitionExpression or objectIds; returns (oid, attachment id, name,
+    content type, path).
+    """
+    resp = query_layer(item, layer_url, selection, endpoint="queryAttachments")
+    files = []
+    for group in resp.get("attachmentGroups") or []:
+        oid = group.get("parentObjectId")
+        for info in group.get("attachmentInfos") or []:
+            aid = info.get("id")
+            url = f"{layer_url.rstrip('/')}/{oid}/attachments/{aid}"
+            path = retry_engine.call(service_key(item), item._con.get, url, {}, try_json=False,
+                                     out_folder=folder, file_name=f"{oid}_{aid}", label="attachment")
+            files.append((oid, aid, info.get("name") or "", info.get("contentType") or "", path))
+    return files
+
+def extract_layer(item, lyr, conn: sqlite3.Connection, pool: ThreadPoolExecutor, window: int,
+                  page_size: int, attachments: bool, scratch: str) -> int:
+    props = lyr.properties
+    lid = int(props.id)
+    fields = [f for f in (props.get("fields") or []) if f.get("type") != "esriFieldTypeGeometry"]
+    names = [f["name"] for f in fields]
+    oid_field = props.get("objectIdField") or next(
+        (f["name"] for f in fields if f.get("type") == "esriFieldTypeOID"), "OBJECTID")
+    size = max(1, min(page_size or props.get("maxRecordCount") or 1000, QUERY_PAGE_MAX))
+    table = f"layer_{lid}"
+    geometry = geometry_column(names)
+    columns = [f"{quote_ident(f['name'])} {SQL_FIELD_TYPES.get(f.get('type'), 'TEXT')}" for f in fields]
+    conn.execute(f"CREATE TABLE {table} ({', '.join(columns + [quote_ident(geometry) + ' TEXT'])})")
+    insert = f"INSERT INTO {table} VALUES ({', '.join('?' * (len(names) + 1))})"
+
+    pages, by_range = layer_query_pages(item, lyr, oid_field, size)
+    with_attachments = attachments and bool(props.get("hasAttachments"))
+    base = {"outFields": "*", "returnGeometry": True, "returnZ": True, "returnM": True}
+
+    def submit(params):
+        rows = pool.submit(query_layer, item, lyr.url, dict(base, **params))
+        files = None
+        if with_attachments and by_range:
+            files = pool.submit(fetch_page_attachments, item, lyr.url, {"definitionExpression": params["where"]}, scratch)
+        return rows, files
+
+    def write(rows_future, files_future) -> int:
+        features = rows_future.result().get("features") or []
+        if with_attachments and not by_range and features:
+            # Offset pages are only known by their rows, so their attachments follow them.
+            oids = [(feat.get("attributes") or {}).get(oid_field) for feat in features]
+            selection = {"objectIds": ",".join(str(oid) for oid in oids if oid is not None)}
+            files_future = pool.submit(fetch_page_attachments, item, lyr.url, selection, scratch)
+        conn.executemany(insert, (
+            [(feat.get("attributes") or {}).get(name) for name in names]
+            + [json.dumps(feat["geometry"]) if feat.get("geometry") else None]
+            for feat in features
+        ))
+        for oid, aid, name, content_type, path in (files_future.result() if files_future else []):
+            store_attachment(conn, lid, oid, aid, name, content_type, path)
+            os.remove(path)
+        conn.commit()
+        return len(features)
+
+    count = 0
+    in_flight = []
+    for params in pages:
+        in_flight.append(submit(params))
+        if len(in_flight) >= window:
+            count += write(*in_flight.pop(0))
+    while in_flight:
+        count += write(*in_flight.pop(0))
+
+    conn.execute("INSERT INTO _layers VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+        lid, table, props.get("name") or "", props.get("geometryType") or "",
+        json.dumps((props.get("extent") or {}).get("spatialReference") or props.get("spatialReference")),
+        json.dumps(fields), geometry, count,
+    ))
+    conn.commit()
+    return count
+
+def extract_features(item, backup_dir, workers: int = 8, page_size: int = 0,
+                     attachments: bool = False) -> Tuple[bool, Optional[str], Optional[str]]:
+    """Copy every layer/table of a feature service into <title>_features.sqlite through paged queries."""
+    sink = as_sink(backup_dir)
+    if not getattr(item, "url", None):
+        return False, None, "No service URL; query extraction not applicable."
+    layers = list(getattr(item, "layers", None) or []) + list(getattr(item, "tables", None) or [])
+    if not layers:
+        return False, None, "Item has no layers; query extraction not applicable."
+    name = f"{item.title}_features.sqlite"
+    path = os.path.join(sink.scratch_dir, name)
+    if os.path.exists(path):
+        os.remove(path)
+    scratch = os.path.join(sink.scratch_dir, f".{item.id}_attachments")
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("""CREATE TABLE _layers (
+            id INTEGER PRIMARY KEY, table_name TEXT, name TEXT, geometry_type TEXT,
+            spatial_reference TEXT, fields TEXT, geometry_column TEXT, feature_count INTEGER)""")
+        if attachments:
+            ensure_dir(scratch)
+            conn.execute("""CREATE TABLE _attachments (
+                layer_id INTEGER, object_id INTEGER, attachment_id INTEGER,
+                name TEXT, content_type TEXT, data BLOB)""")
+        total = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="query") as pool:
+            for lyr in layers:
+                total += extract_layer(item, lyr, conn, pool, max(1, workers) * QUERY_WINDOW_PER_WORKER,
+                                       page_size, attachments, scratch)
+    except Exception as e:
+        conn.close()
+        os.remove(path)
+        return False, None, f"Query extraction failed: {e}"
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    conn.close()
+    sink.add_file(path)
+    sink.log_line(f"QUERY_EXTRACT: {item.title} ({len(layers)} layer(s), {total} row(s))")
+    log(f"[OK] Queried {total} row(s) from {len(layers)} layer(s): {item.title}")
+    return True, name, None
+
+# ---------------------------
+# Backup catalog
+# ---------------------------
+CATALOG_FILE = "backup_catalog.sqlite"
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class BackupCatalog:
+    """
+    SQLite record of the last successful backup of each item, kept in dest_root.
+    Used by --incremental to skip items whose `modified` has not changed.
+    A single connection is shared by all pipeline workers behind a lock.
+    """
+
+    def __init__(self, dest_root: str):
+        self.path = os.path.join(dest_root, CATALOG_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS backups (
+                    item_id TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    modified INTEGER,
+                    artifact_path TEXT NOT NULL,
+                    checksum TEXT,
+                    size INTEGER,
+                    backed_up_at TEXT,
+                    PRIMARY KEY (item_id, mode)
+                )"""
+            )
+            # Outcome of each data strategy, per item (scope 'item', key = item id)
+            # and per item type (scope 'type', key = item.type).
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS strategies (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    export_format TEXT NOT NULL,
+                    successes INTEGER NOT NULL DEFAULT 0,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    last_outcome TEXT,
+                    duration REAL,
+                    error TEXT,
+                    updated_at TEXT,
+                    PRIMARY KEY (scope, key, kind, export_format)
+                )"""
+            )
+            # Sync replica of each service backed up with --replica-sync; chain is a
+            # JSON list of artifact paths (relative to dest_root), baseline first.
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS sync_replicas (
+                    item_id TEXT PRIMARY KEY,
+                    replica_id TEXT NOT NULL,
+                    layer_server_gens TEXT NOT NULL,
+                    chain TEXT NOT NULL,
+                    baseline_at TEXT,
+                    updated_at TEXT
+                )"""
+            )
+            # Layer edit stamps of each feature service's last backup and the archive
+            # members (names, or folders ending in "/") holding its data (--detect-data-changes).
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS data_versions (
+                    item_id TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    data_version TEXT NOT NULL,
+                    members TEXT NOT NULL,
+                    reason TEXT,
+                    artifact_path TEXT NOT NULL,
+                    backed_up_at TEXT,
+                    PRIMARY KEY (item_id, mode)
+                )"""
+            )
+            # Export items kept in the portal for reuse (--reuse-exports).
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS exports (
+                    source_id TEXT NOT NULL,
+                    export_format TEXT NOT NULL,
+                    source_version TEXT,
+                    export_item_id TEXT NOT NULL,
+                    created_at TEXT,
+                    PRIMARY KEY (source_id, export_format)
+                )"""
+            )
+
+    def lookup(self, item_id: str, mode: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT modified, artifact_path, checksum, size, backed_up_at FROM backups WHERE item_id = ? AND mode = ?",
+                (item_id, mode),
+            ).fetchone()
+        if not row:
+            return None
+        keys = ("modified", "artifact_path", "checksum", "size", "backed_up_at")
+        return dict(zip(keys, row))
+
+    def find_unchanged(self, item, mode: str) -> Optional[Dict[str, Any]]:
+        """Return the catalog entry if `item` is unchanged and its artifact is still on disk."""
+        entry = self.lookup(item.id, mode)
+        modified = getattr(item, "modified", None)
+        if not entry or modified is None or entry["modified"] != modified:
+            return None
+        path = entry["artifact_path"]
+        try:
+            if not os.path.isfile(path) or os.path.getsize(path) != entry["size"]:
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def record(self, item_id: str, mode: str, modified: Optional[int], artifact_path: str, checksum: Optional[str] = None):
+        size = os.path.getsize(artifact_path)
+        checksum = checksum or file_sha256(artifact_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO backups (item_id, mode, modified, artifact_path, checksum, size, backed_up_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (item_id, mode, modified, artifact_path, checksum, size, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def strategy_history(self, scope: str, key: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """{(kind, export_format): record} of the strategies tried for one item or item type."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, export_format, successes, failures, last_outcome, duration, error, updated_at "
+                "FROM strategies WHERE scope = ? AND key = ?",
+                (scope, key),
+            ).fetchall()
+        keys = ("successes", "failures", "last_outcome", "duration", "error", "updated_at")
+        return {(row[0], row[1]): dict(zip(keys, row[2:])) for row in rows}
+
+    def record_strategy(self, scope: str, key: str, kind: str, export_format: str, ok: bool,
+                        duration: float, error: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO strategies (scope, key, kind, export_format, successes, failures, last_outcome, duration, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (scope, key, kind, export_format) DO UPDATE SET "
+                "successes = successes + excluded.successes, failures = failures + excluded.failures, "
+                "last_outcome = excluded.last_outcome, duration = COALESCE(excluded.duration, duration), "
+                "error = excluded.error, updated_at = excluded.updated_at",
+                (scope, key, kind, export_format, int(ok), int(not ok), "ok" if ok else "failed",
+                 duration if ok else None, error, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def data_entry(self, item_id: str, mode: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data_version, members, reason, artifact_path, backed_up_at FROM data_versions WHERE item_id = ? AND mode = ?",
+                (item_id, mode),
+            ).fetchone()
+        if not row:
+            return None
+        return {"data_version": row[0], "members": json.loads(row[1]), "reason": row[2], "artifact_path": row[3], "backed_up_at": row[4]}
+
+    def record_data(self, item_id: str, mode: str, data_version: str, members: List[str], reason: str, artifact_path: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO data_versions (item_id, mode, data_version, members, reason, artifact_path, backed_up_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (item_id, mode, data_version, json.dumps(members), reason, artifact_path,
+                 datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def sync_state(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT replica_id, layer_server_gens, chain, baseline_at FROM sync_replicas WHERE item_id = ?",
+                (item_id,),
+            ).fetchone()
+        if not row:
+            return None
+        return {"replica_id": row[0], "layer_server_gens": json.loads(row[1]), "chain": json.loads(row[2]), "baseline_at": row[3]}
+
+    def record_sync(self, item_id: str, replica_id: str, layer_server_gens: List[Dict[str, Any]], chain: List[str],
+                    baseline_at: Optional[str] = None):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_replicas (item_id, replica_id, layer_server_gens, chain, baseline_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (item_id, replica_id, json.dumps(layer_server_gens), json.dumps(chain), baseline_at or now, now),
+            )
+
+    def cached_export(self, source_id: str, export_format: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_version, export_item_id, created_at FROM exports WHERE source_id = ? AND export_format = ?",
+                (source_id, export_format),
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("source_version", "export_item_id", "created_at"), row))
+
+    def record_export(self, source_id: str, export_format: str, source_version: str, export_item_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO exports (source_id, export_format, source_version, export_item_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (source_id, export_format, source_version, export_item_id, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def forget_export(self, source_id: str, export_format: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM exports WHERE source_id = ? AND export_format = ?", (source_id, export_format))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def link_unchanged_artifact(dest_root: str, item_title: str, artifact_path: str) -> Optional[str]:
+    """
+    Hard-link a previous artifact under a fresh timestamped name so this run's
+    output is complete. Items with the same title linked within the same
+    second get a _2, _3, ... suffix instead of colliding.
+    """
+    ext = ".contentexport" if artifact_path.endswith(".contentexport") else ".zip"
+    base = os.path.join(dest_root, make_backup_name(item_title))
+    target, n = base + ext, 1
+    while True:
+        if os.path.abspath(target) == os.path.abspath(artifact_path):
+            return artifact_path
+        try:
+            os.link(artifact_path, target)
+            return target
+        except FileExistsError:
+            n += 1
+            target = f"{base}_{n}{ext}"
+        except OSError as e:
+            log(f"[WARN] Could not hard-link {artifact_path}: {e}")
+            return None
+
+def layer_edit_stamps(item) -> Optional[Dict[str, Any]]:
+    """
+    {layer/table id: editingInfo.lastEditDate (or serverGen)} from one
+    <service>/layers request. None when the request fails or any layer has
+    neither (views, edit tracking off), since its edits cannot be seen then.
+    """
+    if not getattr(item, "url", None):
+        return None
+    try:
+        info = retry_engine.call(service_key(item), item._con.get, item.url.rstrip("/") + "/layers",
+                                 {"f": "json"}, label="layers info") or {}
+    except Exception as e:
+        log(f"[WARN] Could not read layer edit dates for {item.title}: {e}")
+        return None
+    stamps = {}
+    for lyr in (info.get("layers") or []) + (info.get("tables") or []):
+        stamp = (lyr.get("editingInfo") or {}).get("lastEditDate") or lyr.get("serverGen")
+        if stamp is None or lyr.get("id") is None:
+            return None
+        stamps[str(lyr["id"])] = stamp
+    return stamps or None
+
+def source_version(item) -> Optional[str]:
+    """
+    Version stamp of an export source: its `modified` plus, for services, the
+    layer edit stamps (hosted data edits do not bump `modified`). None when
+    the stamps cannot be read, so the export is not reused.
+    """
+    modified = getattr(item, "modified", None)
+    if not is_feature_item(item):
+        return f"{modified}"
+    stamps = layer_edit_stamps(item)
+    if stamps is None:
+        return None
+    return f"{modified}:{json.dumps(stamps, sort_keys=True)}"
+
+def feature_data_version(item) -> Optional[str]:
+    """Edit stamp of a feature service's data (its layer edit stamps); None when they cannot be read."""
+    stamps = layer_edit_stamps(item)
+    return json.dumps(stamps, sort_keys=True) if stamps else None
+
+def data_members(sink, strategy: "Strategy", result: str) -> List[str]:
+    """Archive member names (relative to the item folder) a data strategy produced; folders end in "/"."""
+    scratch = os.path.abspath(sink.scratch_dir)
+    full = os.path.abspath(result)
+    name = os.path.relpath(full, scratch).replace(os.sep, "/") if full.startswith(scratch + os.sep) else result
+    if os.path.isdir(os.path.join(sink.scratch_dir, name)):
+        name += "/"
+    members = [name]
+    if strategy.kind == "layers":
+        members.append(f"{strategy.source.title}_layers/")
+    return members
+
+def matches_member(name: str, members: List[str]) -> Optional[str]:
+    for member in members:
+        if name == member or (member.endswith("/") and name.startswith(member)):
+            return member
+    return None
+
+def copy_data_members(artifact_path: str, members: List[str], sink) -> bool:
+    """Copy the data members of a previous .zip backup into this backup's sink."""
+    with zipfile.ZipFile(artifact_path) as zf:
+        infos = []
+        for info in zf.infolist():
+            name = info.filename.partition("/")[2]
+            if not info.is_dir() and matches_member(name, members):
+                infos.append((name, info))
+        if {matches_member(name, members) for name, _ in infos} != set(members):
+            return False
+        for name, info in infos:
+            with zf.open(info) as src, sink.open_stream(name) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+    return True
+
+def cached_export_item(gis: GIS, catalog: BackupCatalog, source, export_format: str, max_age_days: float):
+    """
+    The export item a previous run left for `source` if the source has not
+    changed since and the export is younger than max_age_days. A stale entry
+    is evicted: its export item is deleted from the portal and forgotten.
+    Returns (export item or None, current source version or None when it
+    cannot be read).
+    """
+    version = source_version(source)
+    entry = catalog.cached_export(source.id, export_format)
+    if not entry or version is None:
+        return None, version
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=max_age_days)).isoformat(timespec="seconds")
+    export = None
+    if entry["source_version"] == version and (entry["created_at"] or "") >= cutoff:
+        try:
+            export = gis.content.get(entry["export_item_id"])
+        except Exception:
+            export = None
+        if export is not None:
+            return export, version
+    else:
+        try:
+            export = gis.content.get(entry["export_item_id"])
+            if export is not None:
+                export.delete()
+                log(f"[CLEAN] Evicted stale export item {entry['export_item_id']} for {source.title}")
+        except Exception as e:
+            log(f"[WARN] Could not evict export item {entry['export_item_id']}: {e}")
+    catalog.forget_export(source.id, export_format)
+    return None, version
+
+# ---------------------------
+# Content-addressed chunk store
+# ---------------------------
+STORE_DIR = "store"
+STORE_CHUNK_SIZE = 4 * 1024 * 1024
+MANIFEST_SUFFIX = ".manifest.json"
+
+class ChunkStore:
+    """
+    Deduplicating backup target. Files are cut into fixed-size chunks keyed by
+    their sha256 and stored once under store/chunks; each item backup becomes a
+    small JSON manifest under store/manifests/<item_id>/ listing its chunks.
+    Chunks are reference-counted in store/index.sqlite so prune() can delete
+    old manifests and drop chunks nothing points to any more.
+
+    With a process pool, new chunks of a large file are compressed in
+    parallel, a few pool-widths at a time to bound memory.
+    """
+
+    def __init__(self, dest_root: str, chunk_size: int = STORE_CHUNK_SIZE, codec: Codec = Codec(),
+                 pool: Optional[ProcessPoolExecutor] = None, pool_width: int = 1):
+        self.root = os.path.join(dest_root, STORE_DIR)
+        self.chunk_dir = os.path.join(self.root, "chunks")
+        self.manifest_dir = os.path.join(self.root, "manifests")
+        self.chunk_size = chunk_size
+        self.codec = codec
+        self.pool = pool
+        self.batch = max(1, pool_width * 2) if pool else 1
+        ensure_dir(self.chunk_dir)
+        ensure_dir(self.manifest_dir)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (hash TEXT PRIMARY KEY, size INTEGER, stored_size INTEGER, refs INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifests (path TEXT PRIMARY KEY, item_id TEXT NOT NULL, created_at TEXT NOT NULL)"
+            )
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def _write_chunk(self, digest: str, payload: bytes) -> int:
+        path = self.chunk_path(digest)
+        ensure_dir(os.path.dirname(path))
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        return len(payload)
+
+    def _put_file(self, file_path: str) -> Tuple[Dict[str, Any], Dict[str, Tuple[int, int]]]:
+        chunks: List[str] = []
+        sizes: Dict[str, Tuple[int, int]] = {}
+        file_digest = hashlib.sha256()
+        codec = member_codec(self.codec, file_path, path=file_path)
+        with open(file_path, "rb") as f:
+            while True:
+                batch = [data for data in (f.read(self.chunk_size) for _ in range(self.batch)) if data]
+                if not batch:
+                    break
+                new: Dict[str, bytes] = {}
+                for data in batch:
+                    file_digest.update(data)
+                    digest = hashlib.sha256(data).hexdigest()
+                    chunks.append(digest)
+                    if digest in sizes or digest in new:
+                        continue
+                    path = self.chunk_path(digest)
+                    if os.path.isfile(path):
+                        sizes[digest] = (len(data), os.path.getsize(path))
+                    else:
+                        new[digest] = data
+                if self.pool and len(new) > 1:
+                    payloads = self.pool.map(encode_chunk, [codec] * len(new), new.values())
+                else:
+                    payloads = (encode_chunk(codec, data) for data in new.values())
+                for (digest, data), payload in zip(new.items(), payloads):
+                    sizes[digest] = (len(data), self._write_chunk(digest, payload))
+        entry = {"size": os.path.getsize(file_path), "sha256": file_digest.hexdigest(), "chunks": chunks}
+        return entry, sizes
+
+    def _add_manifest(self, manifest: Dict[str, Any], sizes: Dict[str, Tuple[int, int]]) -> str:
+        item_dir = os.path.join(self.manifest_dir, manifest["item_id"])
+        ensure_dir(item_dir)
+        path = os.path.join(item_dir, f"{manifest['root']}{MANIFEST_SUFFIX}")
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = os.path.join(item_dir, f"{manifest['root']}_{n}{MANIFEST_SUFFIX}")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        with self._lock, self._conn:
+            for digest, (size, stored_size) in sizes.items():
+                self._conn.execute(
+                    "INSERT INTO chunks (hash, size, stored_size, refs) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT(hash) DO UPDATE SET refs = refs + 1",
+                    (digest, size, stored_size),
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifests (path, item_id, created_at) VALUES (?, ?, ?)",
+                (path, manifest["item_id"], manifest["created_at"]),
+            )
+        return path
+
+    def put_dir(self, backup_dir: str, item, carry: Optional[Tuple[str, List[str]]] = None) -> str:
+        """
+        Store every file under backup_dir and return the new manifest path.
+        carry=(manifest path, members) also references those members of an
+        earlier manifest, reusing its chunks without reading them.
+        """
+        base_dir = os.path.dirname(backup_dir)
+        files: Dict[str, Any] = {}
+        sizes: Dict[str, Tuple[int, int]] = {}
+        if carry:
+            with open(carry[0], "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            for name, entry in previous["files"].items():
+                rel = name.partition("/")[2]
+                if matches_member(rel, carry[1]):
+                    files[f"{os.path.basename(backup_dir)}/{rel}"] = entry
+                    sizes.update({digest: (0, 0) for digest in entry["chunks"]})
+        for root, _, names in os.walk(backup_dir):
+            for name in names:
+                file_path = os.path.join(root, name)
+                arcname = os.path.relpath(file_path, base_dir).replace(os.sep, "/")
+                entry, file_sizes = self._put_file(file_path)
+                files[arcname] = entry
+                sizes.update(file_sizes)
+        manifest = {
+            "version": 1,
+            "item_id": item.id,
+            "title": item.title,
+            "type": item.type,
+            "modified": getattr(item, "modified", None),
+            "root": os.path.basename(backup_dir),
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "codec": self.codec.name,
+            "files": files,
+        }
+        return self._add_manifest(manifest, sizes)
+
+    def clone_manifest(self, manifest_path: str) -> str:
+        """Re-reference an unchanged item's chunks under a new run's manifest."""
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        old_root = manifest["root"]
+        new_root = os.path.basename(make_backup_name(manifest.get("title")))
+        manifest["root"] = new_root
+        manifest["created_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+        manifest["files"] = {new_root + name[len(old_root):]: entry for name, entry in manifest["files"].items()}
+        digests = {d for entry in manifest["files"].values() for d in entry["chunks"]}
+        return self._add_manifest(manifest, {d: (0, 0) for d in digests})
+
+    def _drop_manifest(self, path: str) -> int:
+        """Forget one manifest and delete chunks whose refcount reaches zero. Returns chunks freed."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            digests = {d for entry in manifest["files"].values() for d in entry["chunks"]}
+        except (OSError, ValueError):
+            digests = set()
+        with self._lock, self._conn:
+            for digest in digests:
+                self._conn.execute("UPDATE chunks SET refs = refs - 1 WHERE hash = ?", (digest,))
+            dead = [row[0] for row in self._conn.execute("SELECT hash FROM chunks WHERE refs <= 0")]
+            self._conn.execute("DELETE FROM chunks WHERE refs <= 0")
+            self._conn.execute("DELETE FROM manifests WHERE path = ?", (path,))
+        for digest in dead:
+            try:
+                os.remove(self.chunk_path(digest))
+            except OSError:
+                pass
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return len(dead)
+
+    def prune(self, keep_runs: int) -> Tuple[int, int]:
+        """Keep the newest keep_runs manifests per item. Returns (manifests removed, chunks freed)."""
+        keep_runs = max(1, keep_runs)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, item_id FROM manifests ORDER BY item_id, created_at DESC, path DESC"
+            ).fetchall()
+        seen: Dict[str, int] = {}
+        doomed = []
+        for path, item_id in rows:
+            seen[item_id] = seen.get(item_id, 0) + 1
+            if seen[item_id] > keep_runs:
+                doomed.append(path)
+        freed = sum(self._drop_manifest(path) for path in doomed)
+        return len(doomed), freed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# ---------------------------
+# Backup jobs
+# ---------------------------
+@dataclass
+class BackupOptions:
+    dest_root: str
+    keep_uncompressed: bool = False
+    include_thumbnails: bool = True
+    try_export_fgdb: bool = True
+    keep_exports: bool = False
+    use_ocm_per_item: bool = False
+    max_workers: int = 4
+    stage_workers: Dict[str, Optional[int]] = field(default_factory=dict)  # per-stage pool size overrides
+    queue_size: int = 8               # items that may wait between two stages
+    catalog: Optional[BackupCatalog] = None
+    incremental: bool = False
+    link_unchanged: bool = False
+    target: str = "zip"               # "zip" (one archive per item) or "store" (chunk store in dest_root/store)
+    keep_runs: Optional[int] = None   # with target="store", manifests kept per item after the run
+    store: Optional[ChunkStore] = None  # when set, backups go to the chunk store instead of per-item zips
+    codec: Codec = Codec()
+    compress_processes: int = 0       # > 1 compresses chunk-store chunks on a process pool
+    capture_concurrency: int = 8      # pre-capture calls in flight across all items (0 = one after another)
+    capture_executor: Optional[ThreadPoolExecutor] = None  # shared pool for concurrent pre-capture calls
+    max_server_jobs: int = 16         # exports/replicas running on the portal at once (0 = wait inline)
+    poller: Optional["ExportPoller"] = None  # when set, export workers hand server jobs to it instead of waiting
+    download_chunk_mb: int = 1
+    download_segments: int = 4        # parallel Range segments for large files
+    downloader: Optional[HttpDownloader] = None  # pooled client for replica/export result URLs
+    adaptive: bool = False            # AIMD concurrency for the capture/export/download stages
+    min_concurrency: int = 1
+    max_concurrency: Optional[int] = None  # default: 4x the stage's workers
+    retries: int = 3                  # retries per portal/service call on transient errors
+    breaker_threshold: int = 5        # transient failures in a row that pause a host
+    breaker_cooldown: float = 60.0
+    learn_strategies: bool = True     # reorder strategies from the catalog's strategy history
+    reuse_exports: bool = False       # keep export items and reuse them while their source is unchanged
+    replica_sync: bool = False        # pull replica deltas for sync-enabled services instead of full copies
+    query_extract: bool = True        # page layer queries into SQLite when export and replica fail
+    query_workers: int = 8            # concurrent page requests per extraction
+    query_page_size: int = 0          # 0 = each layer's maxRecordCount (capped at QUERY_PAGE_MAX)
+    query_attachments: bool = False
+    split_layers: int = 0             # services with at least this many layers/tables get per-layer replicas (0 = off)
+    layer_jobs: int = 4               # per-layer replicas running at once for one service
+    layer_retries: int = 2            # resubmissions of a single failed layer
+    layer_timeout: float = 3600.0     # seconds before a layer's replica is given up and resubmitted
+    detect_data_changes: bool = False  # compare layer edit stamps with the last backup and reuse unchanged data
+    order: str = "largest"            # "largest" (highest estimated cost first) or "csv"
+    min_free_gb: float = 0.0          # free space to keep in dest_root (0 = no admission control)
+    admission: Optional["DiskAdmission"] = None  # holds items back while dest_root is short of space
+    skip_removed: Optional[str] = None  # scan.py's removed-items feed; its IDs are not backed up
+    sync_full_every: int = 7          # deltas before a new full baseline is taken
+    export_max_age_days: float = 30.0
+    strategy_ttl_days: float = 14.0   # history older than this is ignored, so the strategy is re-probed
+
+    @property
+    def mode(self) -> str:
+        if self.use_ocm_per_item:
+            return "ocm_per_item"
+        return "store" if self.store else "standard"
+
+class Strategy(NamedTuple):
+    """One way of capturing an item's data: a server-side step followed by a download step."""
+    kind: str               # "layers", "export", "replica", "sync", "sync_baseline", "query", "download" or "ocm"
+    source: Any             # the item the strategy acts on (the item itself or a related item)
+    export_format: str = ""
+    label: str = ""
+    reason: str = ""        # data_reason recorded when the strategy succeeds
+
+class BackupJob:
+    """Per-item state handed from one pipeline stage to the next."""
+
+    def __init__(self, item_id: str, item=None):
+        self.item_id = item_id
+        self.item = item
+        self.backup_dir: Optional[str] = None   # staging folder, only when not streaming into a zip
+        self.sink: Any = None
+        self.artifacts: Optional[ItemArtifacts] = None
+        self.ocm_failed = False
+        self.strategies: List[Strategy] = []
+        self.strategy_idx = 0
+        self.pending: Any = None            # server-side result waiting for the download stage
+        self.last_error: Optional[str] = None
+        self.fallback_reason: Optional[str] = None
+        self.data_ok = False
+        self.data_reason = "No data captured."
+        self.unchanged = False
+        self.checksum: Optional[str] = None
+        self.relinked = False               # unchanged, but hard-linked under a new name the catalog must point to
+        self.success = False
+        self.path: Optional[str] = None
+        self.message = ""
+        self.errors: List[str] = []        # every failure seen, in order: capture calls, strategies (read by the adaptive limiter)
+        self.waited = 0.0                  # seconds spent waiting for a server job slot
+        self.attempts: List[Tuple[Strategy, bool, float, Optional[str]]] = []  # (strategy, ok, seconds, error)
+        self.strategy_started = time.time()
+        self.export_version: Optional[str] = None  # source version of an export this run created (--reuse-exports)
+        self.reused_export = False
+        self.sync_state: Optional[Dict[str, Any]] = None   # catalog sync record when a delta is planned
+        self.sync_update: Optional[Dict[str, Any]] = None  # replica/generations to record once the backup succeeds
+        self.data_version: Optional[str] = None  # layer edit stamp read at capture (--detect-data-changes)
+        self.data_members: List[str] = []        # archive members holding the item's data
+        self.carry: Optional[Tuple[str, List[str]]] = None  # store manifest + members reused for unchanged data
+        self.reused_data: Optional[str] = None   # how the carried-over data was originally captured
+
+    @property
+    def title(self) -> str:
+        return getattr(self.item, "title", None) or self.item_id
+
+    @property
+    def strategy(self) -> Optional[Strategy]:
+        if self.strategy_idx < len(self.strategies):
+            return self.strategies[self.strategy_idx]
+        return None
+
+    def advance(self, err: Optional[str]):
+        strategy = self.strategy
+        log(f"[WARN] {strategy.kind} strategy failed for {self.title}: {err}")
+        self.last_error = err
+        self.errors.append(err or "")
+        self.attempts.append((strategy, False, time.time() - self.strategy_started, err))
+        self.pending = None
+        self.strategy_idx += 1
+        self.strategy_started = time.time()
+
+    def strategy_succeeded(self):
+        self.attempts.append((self.strategy, True, time.time() - self.strategy_started, None))
+
+    def finish(self, success: bool, path: Optional[str], message: str):
+        self.success, self.path, self.message = success, path, message
+        if not success:
+            self.errors.append(message)
+
+# ---------------------------
+# Pipeline stages
+# ---------------------------
+# Every stage takes (job, gis, opts) and returns the name of the next stage,
+# or None once the job is complete. Stages never raise; see run_stage.
+STAGE_ORDER = ("capture", "export", "download", "compress", "finalize")
+STRATEGY_TYPE_FAILURES = 3  # failures (and no successes) across an item type before its strategy is tried last
+
+def is_feature_item(item) -> bool:
+    item_type = (item.type or "").lower()
+    return ("feature layer" in item_type) or ("feature service" in item_type) or ("table" in item_type)
+
+def is_survey_item(item) -> bool:
+    type_keywords = [k.lower() for k in getattr(item, "typeKeywords", []) or []]
+    return ("survey123" in type_keywords) or (item.type and item.type.lower() == "form")
+
+def capture_item_artifacts(item, sink, include_thumbnails: bool, artifacts: ItemArtifacts,
+                           executor: Optional[ThreadPoolExecutor] = None,
+                           downloader: Optional[HttpDownloader] = None) -> List[str]:
+    """
+    Save metadata, data JSON, thumbnail, resources and relationships. With an
+    executor the independent portal calls run concurrently, so an item takes
+    as long as its slowest call rather than the sum of them. The executor is
+    shared by all capture workers and so doubles as a global cap on calls.
+
+    Returns the calls that failed; each is also logged and written to the
+    item's backup log.
+    """
+    errors: List[str] = []
+
+    def collect(what: str, result):
+        if isinstance(result, tuple) and result and result[0] is False:
+            errors.append(f"{what}: {result[1]}")
+
+    try:
+        calls = [
+            ("data JSON", lambda: artifacts.save_data_json(sink)),
+            ("resources", lambda: artifacts.export_resources(sink)),
+            ("relationships", lambda: artifacts.related_items("forward")),
+            ("relationships", lambda: artifacts.related_items("reverse")),
+        ]
+        if include_thumbnails:
+            calls.append(("thumbnail", lambda: backup_thumbnail(item, sink, downloader)))
+        futures = [(what, executor.submit(call)) for what, call in calls] if executor else []
+
+        save_metadata_only(item, sink)
+        backup_json_metadata(item, sink, artifacts=artifacts)
+        if executor:
+            for what, fut in futures:
+                try:
+                    collect(what, fut.result())
+                except Exception as e:
+                    errors.append(f"{what}: {e}")
+        else:
+            for what, call in calls:
+                try:
+                    collect(what, call())
+                except Exception as e:
+                    errors.append(f"{what}: {e}")
+        if not any(err.startswith("relationships:") for err in errors):
+            rel = {
+                "forward": [ri.id for ri in artifacts.related_items("forward")],
+                "reverse": [ri.id for ri in artifacts.related_items("reverse")]
+            }
+            sink.write_json(f"{item.title}_relationships.json", rel, indent=2)
+    except Exception as pree:
+        errors.append(f"metadata: {pree}")
+
+    for err in errors:
+        log(f"[WARN] Capture issue for {item.title} — {err}")
+        sink.log_line(f"CAPTURE_ERROR: {err}")
+    return errors
+
+def plan_strategies(job: BackupJob, opts: BackupOptions) -> List[Strategy]:
+    """Decide, per item type, which data strategies to try and in what order."""
+    item, sink, artifacts = job.item, job.sink, job.artifacts
+    item_type = (item.type or "").lower()
+
+    if is_feature_item(item):
+        strategies = []
+        if opts.split_layers and len(replica_layer_ids(item)) >= opts.split_layers:
+            strategies.append(Strategy("layers", item, reason="Created per-layer replicas as File Geodatabase."))
+        if opts.try_export_fgdb:
+            strategies.append(Strategy("export", item, "File Geodatabase", "Feature", "Exported as File Geodatabase."))
+        strategies.append(Strategy("replica", item, reason="Created replica as File Geodatabase."))
+        if opts.query_extract:
+            strategies.append(Strategy("query", item, reason="Extracted features through paged layer queries."))
+        strategies.append(Strategy("download", item, reason="Downloaded item package."))
+        return strategies
+
+    if is_survey_item(item):
+        reason = "Survey form JSON/resources saved; survey data exported if available."
+        dj_ok, _ = artifacts.save_data_json(sink)
+        res_ok, _ = artifacts.export_resources(sink)
+        if not dj_ok:
+            return []
+        if res_ok:
+            job.fallback_reason = reason
+        candidates = []
+        try:
+            candidates.extend(artifacts.related_items("forward", "Survey2Data"))
+            seen = {ri.id for ri in candidates}
+            for ri in artifacts.related_items("forward"):
+                if "feature" in (ri.type or "").lower() and ri.id not in seen:
+                    candidates.append(ri)
+        except Exception as se:
+            log(f"[WARN] Survey related data export attempt failed: {se}")
+        return [Strategy("export", ri, "File Geodatabase", "Survey Data", reason) for ri in candidates]
+
+    data_json_ok, _ = artifacts.save_data_json(sink)
+    if data_json_ok:
+        job.data_ok, job.data_reason = True, "Saved JSON definition and resources."
+        return []
+    export_type = "Web Map" if "web map" in item_type else "Web Mapping Application"
+    return [
+        Strategy("export", item, export_type, "Item", f"Exported as {export_type}."),
+        Strategy("download", item, reason="Downloaded item content."),
+    ]
+
+def order_strategies(strategies: List[Strategy], catalog: Optional[BackupCatalog], ttl_days: float) -> List[Strategy]:
+    """
+    Reorder strategies from what earlier runs learned: one that last worked
+    for this item goes first, one that last failed for it (or that has only
+    ever failed for its item type) goes last. History older than ttl_days is
+    ignored, so those strategies get re-probed in their default order.
+    """
+    if not catalog or len(strategies) < 2:
+        return strategies
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=ttl_days)).isoformat(timespec="seconds")
+    histories: Dict[Tuple[str, str], Dict[Tuple[str, str], Dict[str, Any]]] = {}
+
+    def history(scope: str, key: str):
+        if (scope, key) not in histories:
+            histories[(scope, key)] = catalog.strategy_history(scope, key)
+        return histories[(scope, key)]
+
+    def rank(strategy: Strategy) -> int:
+        key = (strategy.kind, strategy.export_format)
+        rec = history("item", strategy.source.id).get(key)
+        if rec and (rec["updated_at"] or "") >= cutoff:
+            return 0 if rec["last_outcome"] == "ok" else 2
+        rec = history("type", strategy.source.type or "").get(key)
+        if rec and (rec["updated_at"] or "") >= cutoff and rec["failures"] >= STRATEGY_TYPE_FAILURES and not rec["successes"]:
+            return 2
+        return 1
+
+    ordered = sorted(strategies, key=rank)  # stable: ties keep the default order
+    if ordered != strategies:
+        log(f"[LEARN] {strategies[0].source.title}: trying " + " -> ".join(s.kind for s in ordered) + " (from earlier runs)")
+    return ordered
+
+def record_strategy_attempts(job: BackupJob, catalog: BackupCatalog):
+    """Store how each strategy fared. Transient failures say nothing about the strategy and are not kept."""
+    for strategy, ok, duration, err in job.attempts:
+        if strategy.kind in ("ocm", "sync", "sync_baseline") or (not ok and is_transient_message(err)):
+            continue
+        source = strategy.source
+        catalog.record_strategy("item", source.id, strategy.kind, strategy.export_format, ok, duration, err)
+        catalog.record_strategy("type", source.type or "", strategy.kind, strategy.export_format, ok, duration, err)
+
+def plan_sync(job: BackupJob, opts: BackupOptions):
+    """
+    With --replica-sync, put a delta pull first when the service already has
+    a baseline whose chain is still short enough; otherwise put a registered
+    sync replica first, which becomes the new baseline.
+    """
+    item = job.item
+    if not (opts.replica_sync and opts.catalog and is_feature_item(item) and job.strategies and is_sync_enabled(item)):
+        return
+    # A sync chain restores from one geodatabase, so its baselines are never split per layer.
+    job.strategies = [s for s in job.strategies if s.kind != "layers"]
+    state = opts.catalog.sync_state(item.id)
+    if state and len(state["chain"]) - 1 < opts.sync_full_every and os.path.isfile(os.path.join(opts.dest_root, state["chain"][0])):
+        job.sync_state = state
+        delta_no = len(state["chain"])
+        job.strategies = [Strategy("sync", item, reason=f"Pulled replica edits since the last backup (delta {delta_no}).")] + job.strategies
+        return
+    start_sync_baseline(job, opts, state)
+
+def start_sync_baseline(job: BackupJob, opts: BackupOptions, state: Optional[Dict[str, Any]]):
+    """
+    Try a registered FGDB replica next: its data and its layer server
+    generations come from the same snapshot, so the first delta neither
+    overlaps nor misses baseline rows. If it fails, the remaining full
+    strategies take a plain backup.
+    """
+    item = job.item
+    if state:
+        unregister_sync_replica(item, state["replica_id"])
+    name = f"{item.title}_backup_sync_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    job.strategies.insert(job.strategy_idx, Strategy("sync_baseline", item, label=name,
+                                                     reason="Created sync replica baseline as File Geodatabase."))
 
-def backup_json_metadata(item, backup_dir: str):
+def save_sync_baseline(job: BackupJob, item, strategy: Strategy, opts: BackupOptions) -> Tuple[bool, Optional[str], Optional[str]]:
+    """Download the baseline replica, then record the generations later deltas start from."""
+    ok, name, err = download_replica(item, job.pending, job.sink, downloader=opts.downloader)
+    if not ok:
+        return ok, name, err
     try:
-        metadata = getattr(item, "_json", None)
-        if metadata:
-            path = os.path.join(backup_dir, f"{item.title}_metadata_full.json")
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=4)
-            append_log_line(backup_dir, f"JSON_METADATA: {item.title}")
+        replica_id = find_replica_id(item, strategy.label)
+        if not replica_id:
+            raise RuntimeError(f"replica {strategy.label} is not listed on the service")
+        gens = fetch_replica_gens(item, replica_id)
     except Exception as e:
-        log(f"[WARN] Could not save JSON metadata for {getattr(item, 'title', 'unknown')}: {e}")
+        log(f"[WARN] Could not read the sync replica of {item.title}; keeping a plain full backup: {e}")
+        return ok, name, None
+    log(f"[SYNC] {item.title}: new baseline, replica {replica_id}")
+    job.sync_update = {"kind": "baseline", "replica_id": replica_id, "layer_server_gens": gens}
+    job.sink.write_json(SYNC_CHAIN_FILE, {
+        "item_id": item.id, "service_url": item.url, "replica_id": replica_id,
+        "generation": 0, "baseline": None, "deltas": [], "layer_server_gens": gens,
+    })
+    return ok, name, None
 
-def backup_thumbnail(item, backup_dir: str):
-    try:
-        item.download_thumbnail(save_folder=backup_dir)
-        append_log_line(backup_dir, f"THUMBNAIL: {item.title}")
-    except Exception as e:
-        log(f"[WARN] Thumbnail not downloaded for {getattr(item, 'title', 'unknown')}: {e}")
+def conclude_strategies(job: BackupJob) -> str:
+    """Called once every strategy has failed."""
+    if job.strategies and job.strategies[0].kind == "ocm":
+        log(f"[WARN] OCM per-item export failed for {job.title}, falling back to standard")
+        job.ocm_failed = True
+        job.strategies, job.strategy_idx, job.last_error = [], 0, None
+        return "capture"
+    if job.data_ok:
+        return "compress"
+    if job.fallback_reason:
+        job.data_ok, job.data_reason = True, job.fallback_reason
+    elif job.last_error:
+        job.data_reason = f"No reliable data export or download: {job.last_error}"
+    return "compress"
 
-# ---------------------------
-# Resource and Data helpers
-# ---------------------------
-def backup_item_resources(item, backup_dir: str) -> Tuple[bool, Optional[str]]:
+def reuse_unchanged_data(job: BackupJob, opts: BackupOptions) -> bool:
+    """
+    When the service's layer edit stamps match its last backup, take the data
+    members from that backup instead of exporting again; metadata, thumbnail
+    and resources are still captured fresh.
+    """
+    item = job.item
+    entry = opts.catalog.data_entry(item.id, opts.mode) if job.data_version else None
+    if not entry or entry["data_version"] != job.data_version or not os.path.isfile(entry["artifact_path"]):
+        return False
+    path, members = entry["artifact_path"], entry["members"]
     try:
-        resources = getattr(item, "resources", None)
-        if not resources:
-            return True, "No resources"
-        res_zip_path = os.path.join(backup_dir, "resources.zip")
-        item.resources.export(save_path=backup_dir, file_name="resources.zip")
-        if os.path.isfile(res_zip_path) and os.path.getsize(res_zip_path) > 0:
-            append_log_line(backup_dir, f"RESOURCES: {item.title}")
-            log(f"[OK] Exported all resources for {item.title} -> {res_zip_path}")
-            return True, None
-        else:
-            return False, "Resource ZIP missing or empty."
+        if opts.store:
+            if not path.endswith(MANIFEST_SUFFIX):
+                return False
+            job.carry = (path, members)
+        elif not copy_data_members(path, members, job.sink):
+            return False
     except Exception as e:
-        log(f"[WARN] Failed to export resources for {item.title}: {e}")
-        return False, str(e)
+        log(f"[WARN] Could not reuse previous data of {item.title}, exporting again: {e}")
+        return False
+    job.data_members, job.reused_data = members, entry["reason"]
+    job.data_ok = True
+    job.data_reason = f"Data unchanged since {entry['backed_up_at']}; reused previous data ({entry['reason']})"
+    log(f"[REUSE] {item.title}: layer data unchanged, reusing {', '.join(members)} from {path}")
+    return True
 
-def backup_item_data_json(item, backup_dir: str) -> Tuple[bool, Optional[str]]:
-    try:
-        data = item.get_data()
-        path = os.path.join(backup_dir, f"{item.title}_data.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data if data is not None else {}, f, indent=2, ensure_ascii=False)
-        append_log_line(backup_dir, f"DATA_JSON: {item.title}")
-        return True, None
-    except Exception as e:
-        return False, f"get_data failed: {e}"
+def stage_capture(job: BackupJob, gis: GIS, opts: BackupOptions) -> Optional[str]:
+    if job.item is None:
+        job.item = gis.content.get(job.item_id)
+        if not job.item:
+            msg = f"FAILED: No item found with ID: {job.item_id}"
+            log("[ERR] " + msg)
+            job.finish(False, None, msg)
+            return "finalize"
+    item = job.item
 
-# ---------------------------
-# Download/Export handlers
-# ---------------------------
-def download_item(item, backup_dir: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    if opts.detect_data_changes and opts.catalog and is_feature_item(item) and not opts.use_ocm_per_item:
+        job.data_version = feature_data_version(item)
+
+    if opts.incremental and opts.catalog and not job.ocm_failed:
+        entry = opts.catalog.find_unchanged(item, opts.mode)
+        if entry and job.data_version:
+            # Feature edits do not bump `modified`, so the data must be unchanged as well.
+            data = opts.catalog.data_entry(item.id, opts.mode)
+            if not data or data["data_version"] != job.data_version:
+                entry = None
+        elif entry and opts.replica_sync and opts.catalog.sync_state(item.id):
+            # Without layer edit stamps only the delta pull can tell whether the data changed.
+            entry = None
+        if entry:
+            path = entry["artifact_path"]
+            if opts.link_unchanged and path.endswith(MANIFEST_SUFFIX) and opts.store:
+                path = opts.store.clone_manifest(path)
+            elif opts.link_unchanged:
+                path = link_unchanged_artifact(opts.dest_root, item.title, path) or path
+                job.checksum = entry["checksum"]  # a hard link has the same bytes
+            job.relinked = path != entry["artifact_path"]
+            msg = f"UNCHANGED: {item.title} ({item.id}) — not modified since {entry['backed_up_at']}. Artifact: {path}"
+            log("[SKIP] " + msg)
+            job.unchanged = True
+            job.finish(True, path, msg)
+            return "finalize"
+
+    if opts.admission:
+        admitted, waited, err = opts.admission.reserve(job, estimate_backup_bytes(item, opts.catalog, opts.mode))
+        job.waited += waited
+        if not admitted:
+            msg = f"FAILED: {item.title} ({item.id}) — {err}"
+            log("[ERR] " + msg)
+            job.finish(False, None, msg)
+            return "finalize"
+
+    if opts.use_ocm_per_item and not job.ocm_failed:
+        if hasattr(gis.content, "offline"):
+            job.strategies = [Strategy("ocm", item)]
+            return "export"
+        log(f"[WARN] OCM not available for {item.title}, falling back to standard backup")
+
+    log(f"\n=== Backing up: {item.title} ({item.type}) ===")
+    if opts.keep_uncompressed or opts.store:
+        job.backup_dir = make_backup_dir(opts.dest_root, item.title)
+        job.sink = FolderSink(job.backup_dir)
+    else:
+        job.sink = ZipSink(opts.dest_root, make_backup_name(item.title), codec=opts.codec)
+    job.artifacts = ItemArtifacts(item)
+    job.errors.extend(capture_item_artifacts(item, job.sink, opts.include_thumbnails, job.artifacts,
+                                             executor=opts.capture_executor, downloader=opts.downloader))
+    if job.data_version and reuse_unchanged_data(job, opts):
+        return "compress"
+    job.strategies = plan_strategies(job, opts)
+    if opts.learn_strategies:
+        job.strategies = order_strategies(job.strategies, opts.catalog, opts.strategy_ttl_days)
+    plan_sync(job, opts)
+    job.strategy_started = time.time()
+    return "export" if job.strategies else conclude_strategies(job)
+
+def keep_export(job: BackupJob, opts: BackupOptions) -> bool:
+    """Whether this job's export item stays in the portal (only reusable ones are kept for --reuse-exports)."""
+    return opts.keep_exports or job.reused_export or (opts.reuse_exports and job.export_version is not None)
+
+def run_server_step(job: BackupJob, strategy: Strategy, gis: GIS, opts: BackupOptions) -> Tuple[bool, Any, Optional[str]]:
+    if strategy.kind == "export":
+        job.export_version, job.reused_export = None, False
+        try:
+            if opts.reuse_exports and opts.catalog:
+                export, job.export_version = cached_export_item(gis, opts.catalog, strategy.source, strategy.export_format,
+                                                                opts.export_max_age_days)
+                if export is not None:
+                    log(f"[REUSE] {strategy.source.title} unchanged; reusing export item {export.id}")
+                    job.reused_export = True
+                    return True, CompletedJob(export), None
+            return True, start_export(strategy.source, strategy.export_format, strategy.label, keep_export(job, opts)), None
+        except Exception as e:
+            return False, None, f"Export failed: {e}"
+    if strategy.kind == "replica":
+        return request_replica(strategy.source)
+    if strategy.kind == "sync_baseline":
+        return request_replica(strategy.source, name=strategy.label, sync=True)
+    if strategy.kind == "layers":
+        item = strategy.source
+        layer_ids = replica_layer_ids(item)
+        log(f"[TASK] Replicating {item.title} as {len(layer_ids)} per-layer job(s)...")
+        return True, LayerSetJob(item, layer_ids, opts.layer_jobs, opts.layer_retries, opts.layer_timeout, opts.poller), None
+    if strategy.kind == "sync":
+        return request_sync_delta(strategy.source, job.sync_state["replica_id"], job.sync_state["layer_server_gens"])
+    if strategy.kind == "ocm":
+        item = strategy.source
+        log(f"[OCM] Exporting {item.title} as .contentexport...")
+        try:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            safe_title = "".join(c for c in item.title if c.isalnum() or c in ("_", "-"))[:50]
+            safe_title = safe_title.replace("--", "-").strip("-") or "item"
+            backup_path = gis.content.offline.export_items(
+                items=[item],
+                output_folder=opts.dest_root,
+                package_name=f"{safe_title}_{timestamp}",
+                service_format="File Geodatabase",
+            )
+            return True, CompletedJob(backup_path), None
+        except Exception as e:
+            return False, None, f"OCM export failed: {e}"
+    return True, CompletedJob(None), None
+
+def save_sync_delta(job: BackupJob, item, opts: BackupOptions) -> Tuple[bool, Optional[str], Optional[str]]:
+    state = job.sync_state
+    generation = len(state["chain"])
+    name = f"{item.title}_delta_{generation}.json"
     try:
-        log(f"[TASK] Downloading {item.title}...")
-        path = item.download(save_path=backup_dir)
-        if isinstance(path, str) and file_exists_and_nonempty(path):
-            append_log_line(backup_dir, f"DOWNLOAD: {item.title}")
-            log(f"[OK] Downloaded: {path}")
-            return True, path, None
-        if path and os.path.isdir(path) and any_file_in_dir_nonempty(path):
-            append_log_line(backup_dir, f"DOWNLOAD_DIR: {item.title}")
-            log(f"[OK] Downloaded to folder: {path}")
-            return True, path, None
-        return False, None, "Download returned no file or empty content."
+        delta = download_sync_delta(item, job.pending, job.sink, opts.downloader, name)
+        gens = delta.get("layerServerGens") or fetch_replica_gens(item, state["replica_id"])
     except Exception as e:
-        return False, None, f"Download failed: {e}"
+        return False, None, f"Replica sync failed: {e}"
+    edits = sum(
+        len((layer.get("features") or {}).get(key) or [])
+        for layer in delta.get("edits") or [] for key in ("adds", "updates", "deleteIds", "deletes")
+    )
+    job.sync_update = {"kind": "delta", "replica_id": state["replica_id"], "layer_server_gens": gens}
+    job.sink.write_json(SYNC_CHAIN_FILE, {
+        "item_id": item.id, "service_url": item.url, "replica_id": state["replica_id"],
+        "generation": generation, "baseline": state["chain"][0], "deltas": state["chain"][1:],
+        "delta_file": name, "layer_server_gens": gens,
+    })
+    job.sink.log_line(f"REPLICA_DELTA: {item.title} ({edits} edits)")
+    log(f"[SYNC] {item.title}: delta {generation} with {edits} edit(s)")
+    return True, name, None
 
-def export_item(item, export_format: str, backup_dir: str, label: str, keep_exports: bool = False) -> Tuple[bool, Optional[str], Optional[str]]:
-    try:
-        log(f"[TASK] Exporting {label} {item.title} as {export_format}...")
-        export = item.export(f"{item.title}_export", export_format=export_format, wait=True)
+def run_download_step(job: BackupJob, strategy: Strategy, opts: BackupOptions) -> Tuple[bool, Optional[str], Optional[str]]:
+    if strategy.kind == "export":
+        export = job.pending
+        result = download_export(strategy.source, export, strategy.export_format, job.sink,
+                                 keep_exports=keep_export(job, opts), downloader=opts.downloader)
+        if opts.reuse_exports and opts.catalog:
+            if result[0] and not job.reused_export and job.export_version:
+                opts.catalog.record_export(strategy.source.id, strategy.export_format, job.export_version, export.id)
+            elif not result[0] and job.reused_export:
+                opts.catalog.forget_export(strategy.source.id, strategy.export_format)
+        return result
+    if strategy.kind == "replica":
+        return download_replica(strategy.source, job.pending, job.sink, downloader=opts.downloader)
+    if strategy.kind == "layers":
+        return download_layer_replicas(strategy.source, job.pending, job.sink, opts.downloader, opts.layer_jobs)
+    if strategy.kind == "sync":
+        return save_sync_delta(job, strategy.source, opts)
+    if strategy.kind == "sync_baseline":
+        return save_sync_baseline(job, strategy.source, strategy, opts)
+    if strategy.kind == "ocm":
+        if job.pending and file_exists_and_nonempty(job.pending):
+            return True, job.pending, None
+        return False, None, "OCM export returned empty or invalid path."
+    if strategy.kind == "query":
+        return extract_features(strategy.source, job.sink, workers=opts.query_workers,
+                                page_size=opts.query_page_size, attachments=opts.query_attachments)
+    return download_item(strategy.source, job.sink, downloader=opts.downloader)
+
+def resume_after_server_job(job: BackupJob, ok: bool, result: Any, err: Optional[str],
+                            limiter: Optional["AdaptiveLimiter"] = None) -> str:
+    """
+    Next stage once the current strategy's server job has settled. `limiter`
+    is the export stage's when the job settled in the poller: its worker gave
+    the limiter slot back on parking, so a failure is recorded here instead.
+    """
+    if limiter and not ok:
+        limiter.record(classify_outcome([err or "Server job failed"]))
+    if ok:
+        job.pending = result
+        return "download"
+    job.advance(err)
+    return "export" if job.strategy is not None else conclude_strategies(job)
+
+def stage_export(job: BackupJob, gis: GIS, opts: BackupOptions) -> Optional[str]:
+    while job.strategy is not None:
+        strategy = job.strategy
+        if job.sync_state and strategy.kind != "sync" and job.sync_update is None:
+            # The delta pull failed; this run becomes the new baseline.
+            start_sync_baseline(job, opts, job.sync_state)
+            job.sync_state = None
+            strategy = job.strategy
+        if strategy.kind in ("query", "download"):
+            return "download"
+        if opts.poller:
+            job.waited += opts.poller.acquire()
+        ok, server_job, err = run_server_step(job, strategy, gis, opts)
+        if ok and opts.poller and not isinstance(server_job, CompletedJob):
+            # The poller releases the slot and routes the job once the server is done.
+            opts.poller.track(job, server_job)
+            return PARKED
+        if opts.poller:
+            opts.poller.release()
+        if ok:
+            ok, result, err = server_job.wait()
+        next_stage = resume_after_server_job(job, ok, result if ok else None, err)
+        if next_stage != "export":
+            return next_stage
+    return conclude_strategies(job)
+
+def stage_download(job: BackupJob, gis: GIS, opts: BackupOptions) -> Optional[str]:
+    strategy = job.strategy
+    ok, path, err = run_download_step(job, strategy, opts)
+    job.pending = None
+    if ok:
+        if strategy.kind == "ocm":
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            msg = f"SUCCESS: {job.title} ({job.item_id}) - OCM export ({size_mb:.2f} MB). Path: {path}"
+            log(f"[OK] {msg}")
+            job.finish(True, path, msg)
+            return "finalize"
+        job.strategy_succeeded()
+        job.data_ok, job.data_reason = True, strategy.reason
+        if job.data_version and strategy.kind != "sync":
+            job.data_members = data_members(job.sink, strategy, path)
+        return "compress"
+    job.advance(err)
+    if job.strategy is not None:
+        return "export"
+    return conclude_strategies(job)
+
+def stage_compress(job: BackupJob, gis: GIS, opts: BackupOptions) -> Optional[str]:
+    item = job.item
+    if not job.data_ok:
+        message = f"FAILED: {item.title} ({item.id}) — {job.data_reason}. Metadata/resources saved for diagnostics."
+        log("[ERR] " + message)
+        job.sink.log_line(message)
+        if isinstance(job.sink, ZipSink):
+            job.sink.close(failed=True)
+        job.finish(False, None, message)
+        return "finalize"
+
+    if opts.store:
         try:
-            path = export.download(backup_dir)
-            if isinstance(path, str) and os.path.isfile(path) and os.path.getsize(path) > 0:
-                append_log_line(backup_dir, f"EXPORT_{export_format.upper().replace(' ', '_')}: {item.title}")
-                log(f"[OK] Exported to: {path}")
-                return True, path, None
-            if path and os.path.isdir(path) and any_file_in_dir_nonempty(path):
-                append_log_line(backup_dir, f"EXPORTDIR_{export_format.upper().replace(' ', '_')}: {item.title}")
-                log(f"[OK] Exported to folder: {path}")
-                return True, path, None
-            return False, None, "Export produced no file or empty content."
-        finally:
-            if not keep_exports:
-                try:
-                    export.delete()
-                    log(f"[CLEAN] Deleted temporary export item: {export.id}")
-                except Exception as de:
-                    log(f"[WARN] Could not delete temporary export item: {de}")
+            manifest_path = opts.store.put_dir(job.backup_dir, item, carry=job.carry)
+        except Exception as e:
+            message = f"FAILED: {item.title} ({item.id}) — Chunk store write failed: {e}"
+            log("[ERR] " + message)
+            job.sink.log_line(message)
+            job.finish(False, None, message)
+            return "finalize"
+        log(f"[STORE] Stored backup as manifest: {manifest_path}")
+        if not opts.keep_uncompressed:
+            shutil.rmtree(job.backup_dir, ignore_errors=True)
+            log(f"[CLEAN] Deleted uncompressed folder: {job.backup_dir}")
+        message = f"SUCCESS: {item.title} ({item.id}) — {job.data_reason}. Manifest: {manifest_path}"
+        log("[OK] " + message)
+        job.finish(True, manifest_path, message)
+        return "finalize"
+
+    if isinstance(job.sink, ZipSink):
+        success_zip, zip_path, zip_err = job.sink.close()
+    else:
+        success_zip, zip_path, zip_err = compress_backup(job.backup_dir, delete_uncompressed=not opts.keep_uncompressed, codec=opts.codec)
+    if not success_zip:
+        message = f"FAILED: {item.title} ({item.id}) — {zip_err}"
+        log("[ERR] " + message)
+        job.sink.log_line(message)
+        job.finish(False, None, message)
+        return "finalize"
+
+    if opts.catalog:
+        # Hash here on the compress pool rather than on the single finalize worker.
+        job.checksum = file_sha256(zip_path)
+
+    message = f"SUCCESS: {item.title} ({item.id}) — {job.data_reason}. Zip: {zip_path}"
+    log("[OK] " + message)
+    job.finish(True, zip_path, message)
+    return "finalize"
+
+def stage_finalize(job: BackupJob, gis: GIS, opts: BackupOptions) -> Optional[str]:
+    if opts.admission:
+        opts.admission.release(job)
+    # A single finalize worker serializes writes to the shared run log in dest_root.
+    if job.success and job.sink and job.path:
+        append_log_line(opts.dest_root, job.message)
+    if opts.catalog and job.success and job.path and (job.relinked or not job.unchanged):
+        try:
+            opts.catalog.record(job.item_id, opts.mode, getattr(job.item, "modified", None), job.path, job.checksum)
+        except Exception as e:
+            log(f"[WARN] Could not record {job.item_id} in backup catalog: {e}")
+    if opts.catalog and job.success and job.path and job.data_version and job.data_members:
+        try:
+            opts.catalog.record_data(job.item_id, opts.mode, job.data_version, job.data_members,
+                                     job.reused_data or job.data_reason, job.path)
+        except Exception as e:
+            log(f"[WARN] Could not record data version for {job.item_id}: {e}")
+    if opts.catalog and job.success and job.path and job.sync_update:
+        try:
+            update = job.sync_update
+            artifact = os.path.relpath(job.path, opts.dest_root)
+            previous = opts.catalog.sync_state(job.item_id)
+            if update["kind"] == "baseline" or not previous:
+                opts.catalog.record_sync(job.item_id, update["replica_id"], update["layer_server_gens"], [artifact])
             else:
-                log(f"[INFO] Keeping temporary export item: {export.id}")
-    except Exception as e:
-        return False, None, f"Export failed: {e}"
+                opts.catalog.record_sync(job.item_id, update["replica_id"], update["layer_server_gens"],
+                                         previous["chain"] + [artifact], previous["baseline_at"])
+        except Exception as e:
+            log(f"[WARN] Could not record sync state for {job.item_id}: {e}")
+    if opts.catalog and opts.learn_strategies and job.attempts:
+        try:
+            record_strategy_attempts(job, opts.catalog)
+        except Exception as e:
+            log(f"[WARN] Could not record strategy history for {job.item_id}: {e}")
+    return None
+
+PARKED = "parked"  # returned by a stage that handed the job to the export poller
 
-def try_create_replica(item, backup_dir: str) -> Tuple[bool, Optional[str], Optional[str]]:
+STAGE_HANDLERS = {
+    "capture": stage_capture,
+    "export": stage_export,
+    "download": stage_download,
+    "compress": stage_compress,
+    "finalize": stage_finalize,
+}
+
+def run_stage(stage: str, job: BackupJob, gis: GIS, opts: BackupOptions) -> Optional[str]:
     try:
-        if not getattr(item, "url", None):
-            return False, None, "No service URL; replica not applicable."
-        layers = getattr(item, "layers", None)
-        if not layers:
-            return False, None, "Item has no layers; replica not applicable."
-        layer_ids = []
-        for lyr in layers:
-            try:
-                lid = lyr.properties.id
-                layer_ids.append(str(lid))
-            except Exception:
-                continue
-        if not layer_ids:
-            return False, None, "No layer IDs available for replica."
-        params = {
-            "f": "json",
-            "replicaName": f"{item.title}_replica",
-            "layers": ",".join(layer_ids),
-            "returnAttachments": True,
-            "attachmentsSyncDirection": "none",
-            "syncModel": "none",
-            "dataFormat": "filegdb",
-            "async": True,
-            "transportType": "esriTransportTypeUrl"
-        }
-        url = item.url.rstrip("/") + "/createReplica"
-        resp = item._con.post(url, params)
-        if not resp or "resultUrl" not in resp:
-            return False, None, f"Replica response invalid: {resp}"
-        import requests
-        r = requests.get(resp["resultUrl"], stream=True, timeout=600)
-        r.raise_for_status()
-        out = os.path.join(backup_dir, f"{item.title}_replica.gdb.zip")
-        with open(out, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
-        if file_exists_and_nonempty(out):
-            append_log_line(backup_dir, f"REPLICA_FGDB: {item.title}")
-            log(f"[OK] Replica downloaded: {out}")
-            return True, out, None
-        return False, None, "Replica file empty."
+        return STAGE_HANDLERS[stage](job, gis, opts)
     except Exception as e:
-        return False, None, f"Replica failed: {e}"
+        message = f"FAILED: {job.title} ({job.item_id}) — Unexpected error: {e}"
+        log("[ERR] " + message)
+        if job.sink:
+            job.sink.log_line(message)
+            if isinstance(job.sink, ZipSink):
+                job.sink.close(failed=True)
+        job.finish(False, None, message)
+        return "finalize" if stage != "finalize" else None
+
+def run_job(job: BackupJob, gis: GIS, opts: BackupOptions) -> BackupJob:
+    """Run every stage of a single job on the calling thread."""
+    stage = "capture"
+    while stage:
+        stage = run_stage(stage, job, gis, opts)
+    return job
 
 # ---------------------------
 # Backup logic per item
@@ -272,120 +2754,104 @@ def backup_item(
     include_thumbnails: bool,
     try_export_fgdb: bool,
     keep_exports: bool = False,
+    catalog: Optional[BackupCatalog] = None,
+    incremental: bool = False,
 ) -> Tuple[bool, Optional[str], str]:
-    log(f"\n=== Backing up: {item.title} ({item.type}) ===")
-    backup_dir = make_backup_dir(dest_root, item.title)
-    item_type = (item.type or "").lower()
-    type_keywords = [k.lower() for k in getattr(item, "typeKeywords", []) or []]
+    opts = BackupOptions(
+        dest_root=dest_root,
+        keep_uncompressed=keep_uncompressed,
+        include_thumbnails=include_thumbnails,
+        try_export_fgdb=try_export_fgdb,
+        keep_exports=keep_exports,
+        catalog=catalog,
+        incremental=incremental,
+    )
+    job = run_job(BackupJob(item.id, item), getattr(item, "_gis", None), opts)
+    return job.success, job.path, job.message
 
-    try:
-        save_metadata_only(item, backup_dir)
-        backup_json_metadata(item, backup_dir)
-        backup_item_data_json(item, backup_dir)
-        if include_thumbnails:
-            backup_thumbnail(item, backup_dir)
-        backup_item_resources(item, backup_dir)
-        try:
-            rel = {
-                "forward": [ri.id for ri in (item.related_items("forward") or [])],
-                "reverse": [ri.id for ri in (item.related_items("reverse") or [])]
-            }
-            with open(os.path.join(backup_dir, f"{item.title}_relationships.json"), "w", encoding="utf-8") as f:
-                json.dump(rel, f, indent=2, ensure_ascii=False)
-        except Exception:
-            pass
-    except Exception as pree:
-        log(f"[WARN] Pre-backup metadata/resources capture issue: {pree}")
+# ---------------------------
+# Item prefetch
+# ---------------------------
+PREFETCH_BATCH = 50     # IDs per search; keeps the query string well under URL limits
+PREFETCH_WORKERS = 4
 
-    data_ok = False
-    data_reason = "No data captured."
+def prefetch_items(gis: GIS, item_ids: List[str], batch_size: int = PREFETCH_BATCH) -> Dict[str, Any]:
+    """
+    Resolve many item IDs with a few bulk searches (`id:(a OR b ...)`) instead
+    of one gis.content.get per ID. IDs the search does not return (not yet
+    indexed, malformed) are simply missing from the result; callers fall back
+    to gis.content.get for those.
+    """
+    wanted = list(dict.fromkeys(i for i in item_ids if i and i.isalnum()))
+    batches = [wanted[i:i + batch_size] for i in range(0, len(wanted), batch_size)]
 
-    try:
-        if ("feature layer" in item_type) or ("feature service" in item_type) or ("table" in item_type):
-            if try_export_fgdb:
-                ok, _, err = export_item(item, "File Geodatabase", backup_dir, "Feature", keep_exports=keep_exports)
-                if ok:
-                    data_ok, data_reason = True, "Exported as File Geodatabase."
-                else:
-                    log(f"[WARN] FGDB export failed: {err}")
-            if not data_ok:
-                ok, _, err = try_create_replica(item, backup_dir)
-                if ok:
-                    data_ok, data_reason = True, "Created replica as File Geodatabase."
-                else:
-                    log(f"[WARN] Replica fallback failed: {err}")
-            if not data_ok:
-                ok, _, err = download_item(item, backup_dir)
-                if ok:
-                    data_ok, data_reason = True, "Downloaded item package."
-                else:
-                    data_reason = f"No reliable data export. Download failed: {err}"
+    def search(batch: List[str]) -> List[Any]:
+        query = "id:(" + " OR ".join(batch) + ")"
+        try:
+            return gis.content.search(query=query, max_items=len(batch), outside_org=True) or []
+        except Exception as e:
+            log(f"[WARN] Bulk item search failed for {len(batch)} ID(s): {e}")
+            return []
 
-        elif ("survey123" in type_keywords) or (item.type and item.type.lower() == "form"):
-            dj_ok, _ = backup_item_data_json(item, backup_dir)
-            res_ok, _ = backup_item_resources(item, backup_dir)
-            related_ok = False
-            try:
-                related_items = item.related_items("forward", "Survey2Data") or []
-                for ri in related_items:
-                    ok, _, err = export_item(ri, "File Geodatabase", backup_dir, "Survey Data", keep_exports=keep_exports)
-                    if ok:
-                        related_ok = True
-                        break
-                if not related_ok:
-                    for ri in item.related_items("forward") or []:
-                        if "feature" in (ri.type or "").lower():
-                            ok, _, err = export_item(ri, "File Geodatabase", backup_dir, "Survey Data", keep_exports=keep_exports)
-                            if ok:
-                                related_ok = True
-                                break
-            except Exception as se:
-                log(f"[WARN] Survey related data export attempt failed: {se}")
-            if dj_ok and (related_ok or res_ok):
-                data_ok = True
-                data_reason = "Survey form JSON/resources saved; survey data exported if available."
+    items: Dict[str, Any] = {}
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(PREFETCH_WORKERS, len(batches))) as executor:
+            for result in executor.map(search, batches):
+                for item in result:
+                    items[item.id] = item
+    wanted_set = set(wanted)
+    items = {k: v for k, v in items.items() if k in wanted_set}
+    log(f"[PREFETCH] Resolved {len(items)}/{len(set(item_ids))} item(s) in {len(batches)} search request(s)")
+    return items
 
-        else:
-            data_json_ok, _ = backup_item_data_json(item, backup_dir)
-            res_ok, _ = backup_item_resources(item, backup_dir)
-            if data_json_ok:
-                data_ok = True
-                data_reason = "Saved JSON definition and resources."
-            else:
-                export_type = "Web Map" if "web map" in item_type else "Web Mapping Application"
-                ok, _, err = export_item(item, export_type, backup_dir, "Item", keep_exports=keep_exports)
-                if ok:
-                    data_ok, data_reason = True, f"Exported as {export_type}."
-                else:
-                    ok, _, err = download_item(item, backup_dir)
-                    if ok:
-                        data_ok, data_reason = True, "Downloaded item content."
-                    else:
-                        data_reason = f"No reliable export or download: {err}"
+# ---------------------------
+# Largest-first scheduling
+# ---------------------------
+# Items enter the pipeline in order of estimated cost, longest first, so the
+# run does not end on a big export that only started near the end (LPT
+# scheduling). The estimate is the item's slowest successful strategy from
+# the catalog when there is one, else a guess from its size (plus a flat
+# allowance for feature services).
+# A "priority" CSV column groups items into tiers; higher tiers go first.
+SCHEDULE_BASE_SECONDS = 5.0
+SCHEDULE_BYTES_PER_SECOND = 5 * 1024 * 1024
+SCHEDULE_FEATURE_SECONDS = 60.0    # server-side export of a feature service, whose item size says little about its data
 
-        if not data_ok:
-            message = f"FAILED: {item.title} ({item.id}) — {data_reason}. Metadata/resources saved for diagnostics."
-            log("[ERR] " + message)
-            append_log_line(backup_dir, message)
-            return False, None, message
+def estimate_cost(item, catalog: Optional[BackupCatalog]) -> float:
+    """
+    Expected seconds to back up `item`, from fields the search already
+    returned and the catalog; it never calls the portal, because it runs for
+    every item before the pipeline starts.
+    """
+    if catalog:
+        durations = [rec["duration"] for rec in catalog.strategy_history("item", item.id).values()
+                     if rec["last_outcome"] == "ok" and rec["duration"]]
+        if durations:
+            return max(durations)
+    cost = SCHEDULE_BASE_SECONDS + (getattr(item, "size", None) or 0) / SCHEDULE_BYTES_PER_SECOND
+    if is_feature_item(item):
+        cost += SCHEDULE_FEATURE_SECONDS
+    return cost
 
-        success_zip, zip_path, zip_err = compress_backup(backup_dir, delete_uncompressed=not keep_uncompressed)
-        if not success_zip:
-            message = f"FAILED: {item.title} ({item.id}) — {zip_err}"
-            log("[ERR] " + message)
-            append_log_line(backup_dir, message)
-            return False, None, message
+def schedule_items(item_ids: List[str], items: Dict[str, Any], catalog: Optional[BackupCatalog],
+                   priorities: Optional[Dict[str, int]] = None) -> List[str]:
+    """item_ids ordered by priority tier, then largest estimated cost first. Unresolved IDs go last in their tier."""
+    priorities = priorities or {}
+    resolved = [iid for iid in dict.fromkeys(item_ids) if iid in items]
 
-        message = f"SUCCESS: {item.title} ({item.id}) — {data_reason}. Zip: {zip_path}"
-        log("[OK] " + message)
-        append_log_line(os.path.dirname(zip_path), message)
-        return True, zip_path, message
+    def cost(iid: str) -> float:
+        try:
+            return estimate_cost(items[iid], catalog)
+        except Exception as e:
+            log(f"[WARN] Could not estimate backup cost of {iid}: {e}")
+            return 0.0
 
-    except Exception as e:
-        message = f"FAILED: {item.title} ({item.id}) — Unexpected error: {e}"
-        log("[ERR] " + message)
-        append_log_line(backup_dir, message)
-        return False, None, message
+    costs = {iid: cost(iid) for iid in resolved}
+    ordered = sorted(item_ids, key=lambda iid: (-priorities.get(iid, 0), -costs.get(iid, 0.0)))
+    head = ", ".join(f"{items[iid].title} (~{costs[iid]:.0f}s)" for iid in ordered[:3] if iid in costs)
+    tiers = len(set(priorities.get(iid, 0) for iid in item_ids))
+    log("[SCHEDULE] Largest first" + (f" within {tiers} priority tier(s)" if tiers > 1 else "") + (f": {head}, ..." if head else ""))
+    return ordered
 
 # ---------------------------
 # Batch OCM Backup
@@ -413,12 +2879,13 @@ def backup_batch_with_ocm(
         
         log(f"[OCM] Preparing batch export for {len(item_ids)} item(s)...")
         
-        # Fetch all Item objects
+        # Fetch all Item objects: bulk search first, gis.content.get for the rest
+        prefetched = prefetch_items(gis, item_ids)
         items = []
         failed_ids = []
         for item_id in item_ids:
             try:
-                item = gis.content.get(item_id)
+                item = prefetched.get(item_id) or gis.content.get(item_id)
                 if item:
                     items.append(item)
                 else:
@@ -485,58 +2952,392 @@ def backup_by_id(
     try_export_fgdb: bool,
     keep_exports: bool = False,
     use_ocm_per_item: bool = False,
+    catalog: Optional[BackupCatalog] = None,
+    incremental: bool = False,
 ) -> Tuple[str, bool, Optional[str], str]:
-    try:
-        item = gis.content.get(item_id)
-        if not item:
-            msg = f"FAILED: No item found with ID: {item_id}"
-            log("[ERR] " + msg)
-            return item_id, False, None, msg
-        
-        # OCM per-item mode: one .contentexport per item
-        if use_ocm_per_item:
-            if not hasattr(gis.content, "offline"):
-                log(f"[WARN] OCM not available for {item.title}, falling back to standard backup")
-                use_ocm_per_item = False
-            else:
-                log(f"[OCM] Exporting {item.title} as .contentexport...")
+    opts = BackupOptions(
+        dest_root=dest_root,
+        keep_uncompressed=keep_uncompressed,
+        include_thumbnails=include_thumbnails,
+        try_export_fgdb=try_export_fgdb,
+        keep_exports=keep_exports,
+        use_ocm_per_item=use_ocm_per_item,
+        catalog=catalog,
+        incremental=incremental,
+    )
+    job = run_job(BackupJob(item_id), gis, opts)
+    return item_id, job.success, job.path, job.message
+
+# ---------------------------
+# Adaptive concurrency
+# ---------------------------
+ADAPTIVE_STAGES = ("capture", "export", "download")
+ADAPTIVE_COOLDOWN = 10.0     # seconds between two decreases, so one burst of errors counts once
+ADAPTIVE_WINDOW = 20         # recent outcomes used for the error rate
+ADAPTIVE_ERROR_RATE = 0.5    # error share in the window that counts as overload
+ADAPTIVE_LATENCY_FACTOR = 3.0
+ADAPTIVE_LATENCY_FLOOR = 1.0 # seconds; slower-than-baseline below this is noise
+
+def classify_outcome(errors: List[str]) -> str:
+    """
+    'throttled' when any error is one the retry engine treats as transient
+    (portal load: 429/5xx, timeouts, refused connections), 'error' for other
+    failures, else 'ok'.
+    """
+    if any(is_transient_message(e) for e in errors):
+        return "throttled"
+    return "error" if errors else "ok"
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the jobs one pipeline stage works on at once. Each healthy
+    job adds 1/limit (about +1 per full window); a throttled job halves the
+    limit, and a high error rate or latency well above the running baseline
+    cuts it by a quarter. The limit stays within [minimum, maximum].
+    """
+
+    def __init__(self, stage: str, initial: int, minimum: int, maximum: int, track_latency: bool = True):
+        self.stage = stage
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.track_latency = track_latency
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._baseline: Optional[float] = None
+        self._recent: List[bool] = []
+        self._last_cut = 0.0
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, outcome: str):
+        with self._cond:
+            self._in_flight -= 1
+            self._record(outcome, latency)
+            self._cond.notify_all()
+
+    def record(self, outcome: str):
+        """Count an outcome that arrived after its job gave its slot back (a parked server job)."""
+        with self._cond:
+            self._record(outcome, None)
+            self._cond.notify_all()
+
+    def _record(self, outcome: str, latency: Optional[float]):
+        """Caller holds self._cond. latency is None when the outcome has no comparable timing."""
+        before = int(self.limit)
+        self._recent = (self._recent + [outcome != "ok"])[-ADAPTIVE_WINDOW:]
+        slow = (self.track_latency and self._baseline is not None and latency is not None
+                and latency > max(self._baseline * ADAPTIVE_LATENCY_FACTOR, self._baseline + ADAPTIVE_LATENCY_FLOOR))
+        overloaded = len(self._recent) >= ADAPTIVE_WINDOW // 2 and sum(self._recent) / len(self._recent) >= ADAPTIVE_ERROR_RATE
+        if outcome == "throttled":
+            self._decrease(0.5, "throttled")
+        elif overloaded:
+            self._decrease(0.75, "error rate")
+        elif slow:
+            self._decrease(0.75, f"latency {latency:.1f}s")
+        elif outcome == "ok":
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        if outcome == "ok" and self.track_latency and latency is not None and not slow:
+            self._baseline = latency if self._baseline is None else 0.9 * self._baseline + 0.1 * latency
+        if int(self.limit) > before:
+            log(f"[ADAPT] {self.stage}: limit {before} -> {int(self.limit)}")
+
+    def _decrease(self, factor: float, reason: str):
+        now = time.time()
+        if now - self._last_cut < ADAPTIVE_COOLDOWN:
+            return
+        self._last_cut = now
+        before = int(self.limit)
+        self.limit = max(float(self.minimum), self.limit * factor)
+        self._recent = []
+        if int(self.limit) < before:
+            log(f"[ADAPT] {self.stage}: limit {before} -> {int(self.limit)} ({reason})")
+
+def make_limiters(workers: Dict[str, int], minimum: int, maximum: Optional[int]) -> Dict[str, AdaptiveLimiter]:
+    """One limiter per network stage, starting at the configured worker count."""
+    limiters = {}
+    for stage in ADAPTIVE_STAGES:
+        hi = maximum or 4 * workers[stage]
+        # Download time follows file size, so only its errors steer the limit.
+        limiters[stage] = AdaptiveLimiter(stage, workers[stage], minimum, hi, track_latency=(stage != "download"))
+    return limiters
+
+# ---------------------------
+# Disk space admission
+# ---------------------------
+# Before an item writes anything it reserves the space its backup may need:
+# the scratch download plus the archive built from it. What a running item
+# has already written shows up in the volume's free space, so only the rest
+# of its estimate stays reserved. Items wait while free space minus every
+# outstanding reservation would fall below the floor and are admitted as
+# running items finish; reservations are released at finalize, once the
+# item's scratch files are gone. An item that cannot fit even with nothing
+# else running fails on its own instead of filling the volume.
+SPACE_FACTOR = 2.0                      # scratch copy + archive
+SPACE_MIN_ESTIMATE = 16 * 1024 * 1024
+SPACE_RECHECK = 5.0                     # seconds between free-space checks while holding an item
+
+def estimate_backup_bytes(item, catalog: Optional[BackupCatalog], mode: str) -> int:
+    """Disk space to reserve for one item: its size or its last artifact, whichever is larger, times SPACE_FACTOR."""
+    size = getattr(item, "size", None) or 0
+    entry = catalog.lookup(item.id, mode) if catalog else None
+    if entry and entry["size"]:
+        size = max(size, entry["size"])
+    return int(max(size * SPACE_FACTOR, SPACE_MIN_ESTIMATE))
+
+class DiskAdmission:
+    """Reserves estimated bytes per job against the free space of `path`, keeping floor_bytes free."""
+
+    def __init__(self, path: str, floor_bytes: int):
+        self.path = path
+        self.floor = floor_bytes
+        self._cond = threading.Condition()
+        self._reserved: Dict[int, Tuple[BackupJob, int]] = {}
+
+    def free(self) -> int:
+        return shutil.disk_usage(self.path).free
+
+    def outstanding(self) -> int:
+        """Reserved bytes not yet written: free() already accounts for what the jobs wrote."""
+        total = 0
+        for job, nbytes in self._reserved.values():
+            written = job.sink.disk_usage() if hasattr(job.sink, "disk_usage") else 0
+            total += max(0, nbytes - written)
+        return total
+
+    def reserve(self, job: BackupJob, nbytes: int) -> Tuple[bool, float, Optional[str]]:
+        """Block until nbytes fit above the floor. Returns (admitted, seconds waited, error)."""
+        started = time.time()
+        held_back = False
+        with self._cond:
+            while True:
+                if id(job) in self._reserved:
+                    return True, time.time() - started, None
+                free, reserved = self.free(), self.outstanding()
+                if free - reserved - nbytes >= self.floor:
+                    self._reserved[id(job)] = (job, nbytes)
+                    if held_back:
+                        log(f"[SPACE] Admitting {job.title} after {time.time() - started:.0f}s")
+                    return True, time.time() - started, None
+                if not self._reserved:
+                    return False, time.time() - started, (
+                        f"Not enough disk space: needs ~{nbytes / 2**20:.0f} MB, {free / 2**20:.0f} MB free, "
+                        f"{self.floor / 2**20:.0f} MB floor")
+                if not held_back:
+                    log(f"[SPACE] Holding {job.title} (~{nbytes / 2**20:.0f} MB): {free / 2**20:.0f} MB free, "
+                        f"{reserved / 2**20:.0f} MB reserved by {len(self._reserved)} running item(s)")
+                    held_back = True
+                self._cond.wait(SPACE_RECHECK)
+
+    def release(self, job: BackupJob):
+        with self._cond:
+            if self._reserved.pop(id(job), None) is not None:
+                self._cond.notify_all()
+
+# ---------------------------
+# Staged pipeline
+# ---------------------------
+class ExportPoller:
+    """
+    One thread that watches every server-side export/replica job in flight.
+    Export workers submit a job and move on; the poller checks each job on
+    its own backoff schedule and hands it to the next stage when it settles.
+    max_jobs caps how many server jobs may run at once.
+    """
+
+    def __init__(self, max_jobs: int = 16):
+        self.max_jobs = max(1, max_jobs)
+        self._slots = threading.BoundedSemaphore(self.max_jobs)
+        self._jobs: List[Tuple[BackupJob, ServerJob]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._dispatch = None
+        self._limiter: Optional[AdaptiveLimiter] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def acquire(self) -> float:
+        """Wait for a free server job slot; returns the seconds waited."""
+        started = time.time()
+        self._slots.acquire()
+        return time.time() - started
+
+    def try_acquire(self) -> bool:
+        """Take a free server job slot if there is one, without waiting."""
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+    def track(self, job: BackupJob, server_job: ServerJob):
+        with self._lock:
+            self._jobs.append((job, server_job))
+        self._wake.set()
+
+    def start(self, dispatch, limiter: Optional["AdaptiveLimiter"] = None):
+        """
+        dispatch(job, next_stage) is called from the poller thread for every
+        settled job; failures are recorded against `limiter` (the export stage's).
+        """
+        self._dispatch = dispatch
+        self._limiter = limiter
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="export-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                tracked = list(self._jobs)
+            next_due = time.time() + POLL_MAX_INTERVAL
+            for job, server_job in tracked:
+                if server_job.next_poll > time.time():
+                    next_due = min(next_due, server_job.next_poll)
+                    continue
                 try:
-                    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                    safe_title = "".join(c for c in item.title if c.isalnum() or c in ("_", "-"))[:50]
-                    safe_title = safe_title.replace("--", "-").strip("-") or "item"
-                    package_name = f"{safe_title}_{timestamp}"
-                    
-                    ocm = gis.content.offline
-                    backup_path = ocm.export_items(
-                        items=[item],
-                        output_folder=dest_root,
-                        package_name=package_name,
-                        service_format="File Geodatabase",
-                    )
-                    
-                    if backup_path and os.path.isfile(backup_path) and os.path.getsize(backup_path) > 0:
-                        size_mb = os.path.getsize(backup_path) / (1024 * 1024)
-                        msg = f"SUCCESS: {item.title} ({item.id}) - OCM export ({size_mb:.2f} MB). Path: {backup_path}"
-                        log(f"[OK] {msg}")
-                        return item_id, True, backup_path, msg
-                    else:
-                        log(f"[WARN] OCM export returned empty or invalid path, falling back to standard")
-                        use_ocm_per_item = False
+                    state, result, err = server_job.check()
                 except Exception as e:
-                    log(f"[WARN] OCM per-item export failed: {e}, falling back to standard")
-                    use_ocm_per_item = False
-        
-        # Standard per-item backup (default or fallback from OCM)
-        if not use_ocm_per_item:
-            success, zip_path, message = backup_item(
-                item, dest_root, keep_uncompressed, include_thumbnails, try_export_fgdb, keep_exports=keep_exports
-            )
-            return item_id, success, zip_path, message
-            
-    except Exception as e:
-        msg = f"FAILED: {item_id} — {e}"
-        log("[ERR] " + msg)
-        return item_id, False, None, msg
+                    # One broken job must not take the poller thread (and every other job) down with it.
+                    state, result, err = "failed", None, f"{server_job.label} status check failed: {e}"
+                if state == "pending":
+                    next_due = min(next_due, server_job.next_poll)
+                    continue
+                with self._lock:
+                    self._jobs.remove((job, server_job))
+                self.release()
+                try:
+                    next_stage = resume_after_server_job(job, state == "done", result, err, self._limiter)
+                except Exception as e:
+                    job.advance(f"Unexpected error: {e}")
+                    next_stage = conclude_strategies(job) if job.strategy is None else "export"
+                self._dispatch(job, next_stage)
+            self._wake.wait(max(0.05, next_due - time.time()))
+            self._wake.clear()
+
+class BackupPipeline:
+    """
+    Runs backup jobs through STAGE_ORDER with a separate worker pool per stage,
+    so export waits, downloads and zipping are sized independently.
+
+    Stages are joined by bounded queues: a stage that falls behind makes the
+    stages before it wait instead of piling up half-finished items on disk.
+
+    With `limiters`, a stage runs as many threads as its limiter's maximum and
+    the limiter decides how many of them may work at once.
+    """
+
+    def __init__(self, gis: GIS, opts: BackupOptions, stage_workers: Dict[str, int], queue_size: int = 8,
+                 limiters: Optional[Dict[str, AdaptiveLimiter]] = None):
+        self.gis = gis
+        self.opts = opts
+        self.limiters = limiters or {}
+        self.workers = {stage: max(1, stage_workers.get(stage, 1)) for stage in STAGE_ORDER}
+        for stage, limiter in self.limiters.items():
+            self.workers[stage] = max(self.workers[stage], limiter.maximum)
+        self.queues = {stage: queue.Queue() for stage in STAGE_ORDER}
+        self.slots = {stage: threading.BoundedSemaphore(max(1, queue_size)) for stage in STAGE_ORDER}
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._done = threading.Event()
+
+    def _put(self, stage: str, job: BackupJob, from_stage: Optional[str] = None, bounded: bool = True):
+        # Forward hand-offs wait for a free slot. Hand-offs back to an earlier
+        # stage (strategy fallbacks) skip the bound so two stages can never end
+        # up waiting on each other.
+        forward = from_stage is None or STAGE_ORDER.index(stage) > STAGE_ORDER.index(from_stage)
+        holds_slot = forward and bounded
+        if holds_slot:
+            self.slots[stage].acquire()
+        self.queues[stage].put((job, holds_slot))
+
+    def _resume(self, job: BackupJob, next_stage: str):
+        # Called by the export poller. It must never block on a full queue;
+        # the poller's own job cap already bounds what it can release.
+        self._put(next_stage, job, "export", bounded=False)
+
+    def _worker(self, stage: str):
+        q = self.queues[stage]
+        while True:
+            entry = q.get()
+            if entry is None:
+                return
+            job, holds_slot = entry
+            if holds_slot:
+                self.slots[stage].release()
+            limiter = self.limiters.get(stage)
+            if limiter:
+                limiter.acquire()
+                started, seen, waited = time.time(), len(job.errors), job.waited
+            next_stage = run_stage(stage, job, self.gis, self.opts)
+            if limiter:
+                latency = time.time() - started - (job.waited - waited)
+                limiter.release(latency, classify_outcome(job.errors[seen:]))
+            if next_stage == PARKED:
+                continue
+            if next_stage:
+                self._put(next_stage, job, stage)
+            else:
+                with self._lock:
+                    self._remaining -= 1
+                    if self._remaining <= 0:
+                        self._done.set()
+
+    def run(self, item_ids: List[str], items: Optional[Dict[str, Any]] = None) -> List[BackupJob]:
+        """Back up item_ids. `items` holds already-resolved Item objects (see prefetch_items)."""
+        items = items or {}
+        jobs = [BackupJob(item_id, items.get(item_id)) for item_id in item_ids]
+        if not jobs:
+            return jobs
+        self._remaining = len(jobs)
+        self._done.clear()
+
+        if self.opts.poller:
+            self.opts.poller.start(self._resume, self.limiters.get("export"))
+        threads = []
+        for stage in STAGE_ORDER:
+            for n in range(self.workers[stage]):
+                t = threading.Thread(target=self._worker, args=(stage,), name=f"{stage}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        for job in jobs:
+            self._put("capture", job)
+        self._done.wait()
+
+        for stage in STAGE_ORDER:
+            for _ in range(self.workers[stage]):
+                self.queues[stage].put(None)
+        for t in threads:
+            t.join()
+        if self.opts.poller:
+            self.opts.poller.stop()
+        return jobs
+
+def resolve_stage_workers(max_workers: int, overrides: Optional[Dict[str, Optional[int]]] = None) -> Dict[str, int]:
+    """Per-stage worker counts: --workers for the network stages, capped by CPU count for zipping."""
+    max_workers = max(1, max_workers)
+    workers = {
+        "capture": max_workers,
+        "export": max_workers,
+        "download": max_workers,
+        "compress": max(1, min(max_workers, os.cpu_count() or 1)),
+        "finalize": 1,
+    }
+    for stage, count in (overrides or {}).items():
+        if count:
+            workers[stage] = max(1, count)
+    return workers
 
 # ---------------------------
 # CSV reader
@@ -561,18 +3362,33 @@ def read_ids_from_csv(csv_path: str) -> List[str]:
                 ids.append(val.strip())
         return ids
 
+def read_priorities_from_csv(csv_path: str) -> Dict[str, int]:
+    """{id: tier} from an optional 'priority' column (integers, higher first; blank = 0)."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as csvfile:
+        reader = csv.DictReader(csvfile)
+        fields = {h.strip().lower(): h for h in reader.fieldnames or []}
+        if "priority" not in fields:
+            return {}
+        id_field = fields.get("id", (reader.fieldnames or [None])[0])
+        priorities: Dict[str, int] = {}
+        for row in reader:
+            iid = (row.get(id_field) or "").strip()
+            value = (row.get(fields["priority"]) or "").strip()
+            if not iid or not value:
+                continue
+            try:
+                priorities[iid] = int(float(value))
+            except ValueError:
+                log(f"[WARN] Ignoring priority '{value}' for {iid}: not a number")
+        return priorities
+
 # ---------------------------
 # Batch runner
 # ---------------------------
 def backup_from_csv(
     csv_path: str,
-    dest_root: str,
+    opts: BackupOptions,
     connection: str = "home",
-    max_workers: int = 4,
-    keep_uncompressed: bool = False,
-    include_thumbnails: bool = True,
-    try_export_fgdb: bool = True,
-    keep_exports: bool = False,
     backup_mode: str = "standard",
 ):
     """
@@ -580,29 +3396,45 @@ def backup_from_csv(
     - "standard": Per-item .zip files (old method)
     - "ocm_per_item": Per-item .contentexport files (OCM, one per item)
     - "ocm_batch": Single .contentexport for all items (OCM, batched)
+
+    opts carries the destination and the run's settings (see BackupOptions).
     """
     if not os.path.isfile(csv_path):
         raise FileNotFoundError(f"CSV not found: {csv_path}")
+    dest_root = opts.dest_root
     ensure_dir(dest_root)
 
+    check_codec(opts.codec, for_zip=(opts.target == "zip"))
+    retry_engine.configure(attempts=opts.retries, breaker_threshold=opts.breaker_threshold, breaker_cooldown=opts.breaker_cooldown)
+
     gis = connect_to_gis(connection)
     item_ids = read_ids_from_csv(csv_path)
+    if opts.skip_removed:
+        if os.path.isfile(opts.skip_removed):
+            removed = set(read_ids_from_csv(opts.skip_removed))
+            kept = [iid for iid in item_ids if iid not in removed]
+            if len(kept) < len(item_ids):
+                log(f"[INFO] Skipping {len(item_ids) - len(kept)} item(s) listed as removed in {opts.skip_removed}")
+            item_ids = kept
+        else:
+            log(f"[WARN] Removed-items feed not found: {opts.skip_removed}")
     if not item_ids:
         log("[WARN] No item IDs found in CSV.")
         return
 
     log(f"Starting backup of {len(item_ids)} item(s) to: {dest_root}")
     log(f"Backup mode: {backup_mode.upper()}")
-    log(f"Workers: {max_workers} | Keep uncompressed: {keep_uncompressed} | Thumbnails: {include_thumbnails} | Export FGDB: {try_export_fgdb} | Keep AGOL exports: {keep_exports}")
+    log(f"Workers: {opts.max_workers} | Keep uncompressed: {opts.keep_uncompressed} | Thumbnails: {opts.include_thumbnails} | Export FGDB: {opts.try_export_fgdb} | Keep AGOL exports: {opts.keep_exports} | Incremental: {opts.incremental}")
 
     results: Dict[str, Tuple[bool, Optional[str], str]] = {}
     success_count = 0
     fail_count = 0
+    unchanged_count = 0
 
     # OCM batch mode: single .contentexport for all items
     if backup_mode == "ocm_batch":
         log("\n[OCM] Running batch export (single .contentexport for all items + dependencies)...")
-        ocm_success, ocm_path, ocm_msg = backup_batch_with_ocm(item_ids, gis, dest_root, try_export_fgdb)
+        ocm_success, ocm_path, ocm_msg = backup_batch_with_ocm(item_ids, gis, dest_root, opts.try_export_fgdb)
         if ocm_success:
             log(f"[OCM] Batch export successful: {ocm_path}")
             for iid in item_ids:
@@ -613,44 +3445,59 @@ def backup_from_csv(
             log("[INFO] Falling back to standard per-item backup...")
             backup_mode = "standard"
 
-    # Standard or OCM per-item: use threading
+    # Standard or OCM per-item: staged pipeline
     if backup_mode in ["standard", "ocm_per_item"]:
-        use_ocm = (backup_mode == "ocm_per_item")
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_id = {
-                executor.submit(
-                    backup_by_id,
-                    item_id,
-                    gis,
-                    dest_root,
-                    keep_uncompressed,
-                    include_thumbnails,
-                    try_export_fgdb,
-                    keep_exports,
-                    use_ocm,
-                ): item_id for item_id in item_ids
-            }
-
-            for future in as_completed(future_to_id):
-                item_id = future_to_id[future]
-                try:
-                    _id, success, zip_path, message = future.result()
-                    results[item_id] = (success, zip_path, message)
-                    if success:
-                        success_count += 1
-                    else:
-                        fail_count += 1
-                except Exception as e:
-                    msg = f"FAILED: {item_id} — {e}"
-                    results[item_id] = (False, None, msg)
-                    fail_count += 1
-                    log("[ERR] " + msg)
+        opts.use_ocm_per_item = backup_mode == "ocm_per_item"
+        opts.catalog = BackupCatalog(dest_root)
+        if opts.capture_concurrency > 0:
+            opts.capture_executor = ThreadPoolExecutor(max_workers=opts.capture_concurrency, thread_name_prefix="precapture")
+        if opts.max_server_jobs > 0:
+            opts.poller = ExportPoller(opts.max_server_jobs)
+        if opts.min_free_gb > 0:
+            opts.admission = DiskAdmission(dest_root, int(opts.min_free_gb * 1024 ** 3))
+        workers = resolve_stage_workers(opts.max_workers, opts.stage_workers)
+        limiters = make_limiters(workers, opts.min_concurrency, opts.max_concurrency) if opts.adaptive else None
+        opts.downloader = HttpDownloader(chunk_size=opts.download_chunk_mb * 1024 * 1024, segments=opts.download_segments,
+                                         pool_size=limiters["download"].maximum if limiters else workers["download"])
+        pool = ProcessPoolExecutor(max_workers=opts.compress_processes) if opts.compress_processes > 1 and opts.target == "store" else None
+        if opts.target == "store":
+            opts.store = ChunkStore(dest_root, codec=opts.codec, pool=pool, pool_width=opts.compress_processes)
+        log("Pipeline workers: " + " | ".join(f"{stage}={workers[stage]}" for stage in STAGE_ORDER) + f" | Queue size: {opts.queue_size} | Server jobs: {opts.max_server_jobs or 'inline'}")
+        if limiters:
+            log("Adaptive concurrency: " + " | ".join(f"{s}={l.minimum}..{l.maximum}" for s, l in limiters.items()))
+        pipeline = BackupPipeline(gis, opts, workers, queue_size=opts.queue_size, limiters=limiters)
+        try:
+            items = prefetch_items(gis, item_ids)
+            run_ids = item_ids
+            if opts.order == "largest":
+                run_ids = schedule_items(item_ids, items, opts.catalog, read_priorities_from_csv(csv_path))
+            jobs = pipeline.run(run_ids, items)
+            if opts.store and opts.keep_runs:
+                removed, freed = opts.store.prune(opts.keep_runs)
+                log(f"[STORE] Pruned {removed} old manifest(s), freed {freed} chunk(s)")
+        finally:
+            opts.catalog.close()
+            if opts.store:
+                opts.store.close()
+            if pool:
+                pool.shutdown()
+            if opts.capture_executor:
+                opts.capture_executor.shutdown()
+            opts.downloader.close()
+        position = {iid: n for n, iid in enumerate(item_ids)}
+        for job in sorted(jobs, key=lambda j: position.get(j.item_id, 0)):  # summary in CSV order
+            results[job.item_id] = (job.success, job.path, job.message)
+            if job.success:
+                success_count += 1
+                unchanged_count += int(job.unchanged)
+            else:
+                fail_count += 1
 
     # Summary
     log("\n" + "=" * 72)
     log("Backup Summary")
     log("=" * 72)
-    log(f"Total: {len(item_ids)} | Success: {success_count} | Failed: {fail_count}\n")
+    log(f"Total: {len(item_ids)} | Success: {success_count} | Failed: {fail_count} | Unchanged: {unchanged_count}\n")
 
     if success_count:
         log("Successful backups:")
@@ -672,25 +3519,133 @@ def parse_args(argv: Optional[List[str]] = None):
     p.add_argument("--dest", required=True, help="Destination folder for backups.")
     p.add_argument("--connection", default="home", help="ArcGIS connection string (default: home).")
     p.add_argument("--workers", type=int, default=4, help="Max concurrent backups.")
+    p.add_argument("--capture-workers", type=int, default=None, help="Workers for metadata/resource capture (default: --workers).")
+    p.add_argument("--export-workers", type=int, default=None, help="Workers submitting server-side exports/replicas (default: --workers).")
+    p.add_argument("--download-workers", type=int, default=None, help="Workers downloading export results (default: --workers).")
+    p.add_argument("--compress-workers", type=int, default=None, help="Workers zipping finished backups (default: min(--workers, CPU count)).")
+    p.add_argument("--capture-concurrency", type=int, default=8,
+                   help="Max concurrent metadata/thumbnail/resources/relationship calls across all items (0 = serial).")
+    p.add_argument("--order", choices=["largest", "csv"], default="largest",
+                   help="Start order: largest (highest estimated cost first, within 'priority' CSV tiers) or csv.")
+    p.add_argument("--min-free-gb", type=float, default=0.0,
+                   help="Hold items back while their estimated scratch + archive size would leave less free space than this in --dest (0 = off).")
+    p.add_argument("--skip-removed", default=None,
+                   help="scan.py removed-items feed (<out>_removed.csv); IDs listed there are not backed up.")
+    p.add_argument("--queue-size", type=int, default=8, help="Max items waiting between two pipeline stages.")
+    p.add_argument("--adaptive", action="store_true",
+                   help="Adjust capture/export/download concurrency to portal throttling, errors and latency (AIMD).")
+    p.add_argument("--min-concurrency", type=int, default=1, help="With --adaptive, lowest concurrency per stage.")
+    p.add_argument("--max-concurrency", type=int, default=None, help="With --adaptive, highest concurrency per stage (default: 4x stage workers).")
+    p.add_argument("--retries", type=int, default=3, help="Retries per portal/service call on transient errors (0 = no retries).")
+    p.add_argument("--breaker-threshold", type=int, default=5,
+                   help="Transient failures in a row before calls to a host are paused.")
+    p.add_argument("--breaker-cooldown", type=float, default=60.0, help="Seconds a failing host is skipped before it is tried again.")
+    p.add_argument("--reuse-exports", action="store_true",
+                   help="Keep export items in ArcGIS and reuse them on later runs while the source item/service is unchanged.")
+    p.add_argument("--export-max-age-days", type=float, default=30.0,
+                   help="With --reuse-exports, regenerate (and delete) exports older than this.")
+    p.add_argument("--replica-sync", action="store_true",
+                   help="Back up sync-enabled feature services as a full baseline plus replica deltas on later runs.")
+    p.add_argument("--sync-full-every", type=int, default=7,
+                   help="With --replica-sync, take a new full baseline after this many deltas.")
+    p.add_argument("--split-layers", type=int, default=0,
+                   help="Back up feature services with at least N layers/tables as one replica job per layer (0 = off).")
+    p.add_argument("--layer-jobs", type=int, default=4, help="With --split-layers, per-layer replicas running at once per service.")
+    p.add_argument("--layer-retries", type=int, default=2, help="With --split-layers, resubmissions of a single failed layer.")
+    p.add_argument("--layer-timeout", type=float, default=3600.0,
+                   help="With --split-layers, seconds before a layer's replica is abandoned and resubmitted.")
+    p.add_argument("--no-query-extract", action="store_true",
+                   help="Do not fall back to paged layer queries when export and replica fail for a feature service.")
+    p.add_argument("--query-workers", type=int, default=8, help="Concurrent page requests per query extraction.")
+    p.add_argument("--query-page-size", type=int, default=0,
+                   help="Rows per query page (default: each layer's maxRecordCount, at most 2000).")
+    p.add_argument("--query-attachments", action="store_true", help="Include attachments in query extractions.")
+    p.add_argument("--no-strategy-cache", action="store_true",
+                   help="Always try data strategies in the default order instead of learning from earlier runs.")
+    p.add_argument("--strategy-ttl-days", type=float, default=14.0,
+                   help="Days before a learned strategy outcome expires and the strategy is re-probed.")
+    p.add_argument("--download-chunk-mb", type=int, default=1, help="Read size for replica/export downloads, in MB.")
+    p.add_argument("--download-segments", type=int, default=4,
+                   help="Parallel Range segments per large replica/export download (1 = single stream).")
+    p.add_argument("--max-server-jobs", type=int, default=16,
+                   help="Max exports/replicas running on the portal at once, tracked by one poller thread (0 = wait inline).")
     p.add_argument("--keep-uncompressed", action="store_true", help="Keep the folder after zipping.")
     p.add_argument("--no-thumbnails", action="store_true", help="Do not download thumbnails.")
     p.add_argument("--no-fgdb", action="store_true", help="Do not try to export Feature Layers/Services to File Geodatabase.")
     p.add_argument("--keep-exports", action="store_true", help="Keep temporary export items in ArcGIS after download.")
+    p.add_argument("--incremental", action="store_true", help="Skip items whose modified date matches the backup catalog in --dest.")
+    p.add_argument("--detect-data-changes", action="store_true",
+                   help="Reuse a feature service's previous data while its layer edit dates are unchanged; only metadata is refreshed.")
+    p.add_argument("--link-unchanged", action="store_true", help="With --incremental, hard-link the previous artifact under a new timestamped name.")
+    p.add_argument("--target", choices=["zip", "store"], default="zip",
+                   help="Standard backup target: zip (one .zip per item) or store (deduplicating chunk store in --dest/store).")
+    p.add_argument("--keep-runs", type=int, default=None, help="With --target store, keep only the newest N backups per item.")
+    p.add_argument("--codec", choices=list(CODECS), default="deflate",
+                   help="Compression for archive members / store chunks. Already-compressed files are always stored. "
+                        "zstd needs Python 3.14+ for .zip; lz4 only applies to --target store.")
+    p.add_argument("--codec-level", type=int, default=None, help="Compression level for the chosen codec.")
+    p.add_argument("--compress-processes", type=int, default=0, help="With --target store, compress chunks on a pool of N processes.")
     p.add_argument("--mode", choices=["standard", "ocm_per_item", "ocm_batch"], default="standard", 
                    help="Backup mode: standard (per-item .zip), ocm_per_item (per-item .contentexport), ocm_batch (single .contentexport).")
     return p.parse_args(argv)
 
-def main(argv: Optional[List[str]] = None):
-    args = parse_args(argv)
-    backup_from_csv(
-        csv_path=args.csv,
+def options_from_args(args) -> BackupOptions:
+    return BackupOptions(
         dest_root=args.dest,
-        connection=args.connection,
-        max_workers=args.workers,
         keep_uncompressed=args.keep_uncompressed,
         include_thumbnails=not args.no_thumbnails,
         try_export_fgdb=not args.no_fgdb,
         keep_exports=args.keep_exports,
+        max_workers=args.workers,
+        stage_workers={
+            "capture": args.capture_workers,
+            "export": args.export_workers,
+            "download": args.download_workers,
+            "compress": args.compress_workers,
+        },
+        queue_size=args.queue_size,
+        incremental=args.incremental,
+        link_unchanged=args.link_unchanged,
+        target=args.target,
+        keep_runs=args.keep_runs,
+        codec=Codec(args.codec, args.codec_level),
+        compress_processes=args.compress_processes,
+        capture_concurrency=args.capture_concurrency,
+        max_server_jobs=args.max_server_jobs,
+        download_chunk_mb=args.download_chunk_mb,
+        download_segments=args.download_segments,
+        adaptive=args.adaptive,
+        min_concurrency=args.min_concurrency,
+        max_concurrency=args.max_concurrency,
+        retries=args.retries,
+        breaker_threshold=args.breaker_threshold,
+        breaker_cooldown=args.breaker_cooldown,
+        learn_strategies=not args.no_strategy_cache,
+        strategy_ttl_days=args.strategy_ttl_days,
+        reuse_exports=args.reuse_exports,
+        export_max_age_days=args.export_max_age_days,
+        replica_sync=args.replica_sync,
+        sync_full_every=max(0, args.sync_full_every),
+        query_extract=not args.no_query_extract,
+        query_workers=max(1, args.query_workers),
+        query_page_size=max(0, args.query_page_size),
+        query_attachments=args.query_attachments,
+        split_layers=max(0, args.split_layers),
+        layer_jobs=max(1, args.layer_jobs),
+        layer_retries=max(0, args.layer_retries),
+        layer_timeout=args.layer_timeout,
+        detect_data_changes=args.detect_data_changes,
+        order=args.order,
+        min_free_gb=args.min_free_gb,
+        skip_removed=args.skip_removed,
+    )
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    backup_from_csv(
+        csv_path=args.csv,
+        opts=options_from_args(args),
+        connection=args.connection,
         backup_mode=args.mode,
     )
 
@@ -3,6 +3,8 @@ import sys
 import json
 import zipfile
 import shutil
+import zlib
+import sqlite3
 import argparse
 from typing import Optional, List, Dict, Any, Tuple
 import datetime as dt
@@ -108,6 +110,66 @@ def extract_zip(zip_path: str, work_dir: Optional[str] = None) -> str:
         err(f"Failed to extract ZIP: {e}")
         raise
 
+def is_store_manifest(file_path: str) -> bool:
+    """Check if file is a chunk-store manifest written by backup.py --target store"""
+    return file_path.lower().endswith(".manifest.json")
+
+def decode_chunk(payload: bytes) -> bytes:
+    """Decompress one chunk-store chunk using its one-byte codec tag"""
+    tag, body = payload[:1], payload[1:]
+    if tag == b"S":
+        return body
+    if tag == b"Z":
+        return zlib.decompress(body)
+    if tag == b"B":
+        import bz2
+        return bz2.decompress(body)
+    if tag == b"X":
+        import lzma
+        return lzma.decompress(body)
+    if tag == b"T":
+        try:
+            from compression import zstd  # Python 3.14+
+            return zstd.decompress(body)
+        except ImportError:
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(body)
+    if tag == b"L":
+        import lz4.frame
+        return lz4.frame.decompress(body)
+    # Untagged chunks are zlib streams from stores written before codecs existed
+    return zlib.decompress(payload)
+
+def extract_manifest(manifest_path: str, work_dir: Optional[str] = None) -> str:
+    """Rebuild a chunk-store backup folder from its manifest"""
+    if not os.path.isfile(manifest_path):
+        raise FileNotFoundError(f"Backup manifest not found: {manifest_path}")
+
+    # Manifests live in <store>/manifests/<item_id>/; chunks in <store>/chunks/<aa>/<hash>
+    store_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(manifest_path))))
+    chunk_dir = os.path.join(store_root, "chunks")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    base = os.path.abspath(work_dir or manifest_path[:-len(".manifest.json")])
+    ensure_dir(base)
+    info(f"Rebuilding backup from chunk store to: {base}")
+    try:
+        for rel_path, entry in manifest.get("files", {}).items():
+            out_path = os.path.join(base, *rel_path.split("/"))
+            ensure_dir(os.path.dirname(out_path))
+            with open(out_path, "wb") as out:
+                for digest in entry.get("chunks", []):
+                    with open(os.path.join(chunk_dir, digest[:2], digest), "rb") as cf:
+                        out.write(decode_chunk(cf.read()))
+            if os.path.getsize(out_path) != entry.get("size"):
+                raise ValueError(f"Size mismatch rebuilding {rel_path}")
+        ok(f"Rebuilt {len(manifest.get('files', {}))} file(s) from: {manifest_path}")
+        return base
+    except Exception as e:
+        err(f"Failed to rebuild backup from manifest: {e}")
+        raise
+
 def load_json_if_exists(path: str) -> Optional[Dict[str, Any]]:
     try:
         if os.path.isfile(path):
@@ -573,7 +635,8 @@ def restore_zip(
     keep_metadata: bool = True
 ) -> Optional[str]:
     """
-    Restore a standard .zip backup.
+    Restore a standard .zip backup (or a chunk-store manifest, which is
+    rebuilt into the same folder layout first).
     
     Supports:
     - Feature Services (publishes from FGDB)
@@ -591,9 +654,17 @@ def restore_zip(
         log(f"{'='*70}\n")
         
         # Extract the backup
-        extract_dir = extract_zip(zip_path)
+        if is_store_manifest(zip_path):
+            extract_dir = extract_manifest(zip_path)
+        else:
+            extract_dir = extract_zip(zip_path)
         info(f"Backup extracted to: {extract_dir}")
         
+        # Replica delta backups are restored from their baseline up
+        chain = find_sync_chain(extract_dir)
+        if chain and chain.get("generation"):
+            return restore_sync_chain(zip_path, chain, gis, keep_metadata)
+        
         # Load all backup artifacts
         art = load_backup_artifacts(extract_dir)
         
@@ -692,9 +763,18 @@ def restore_feature_service_from_zip(
     3. Applying metadata from the backup
     """
     try:
+        # Per-layer backups hold one geodatabase per layer
+        layer_set = find_layer_manifest(extract_dir)
+        if layer_set:
+            return restore_layer_set(gis, layer_set, meta, new_title, keep_metadata)
+        
         # Find the geodatabase
         gdb_path = find_geodatabase(extract_dir)
         if not gdb_path:
+            extract_path = find_query_extract(extract_dir)
+            if extract_path:
+                info(f"No geodatabase; restoring the query extract {os.path.basename(extract_path)}")
+                return restore_query_extract(gis, extract_path, meta, new_title, keep_metadata)
             err(f"Feature Service backup detected but no geodatabase found")
             err(f"Searched for: .gdb folder or _export.zip")
             return None
@@ -802,7 +882,7 @@ def find_geodatabase(extract_dir: str) -> Optional[str]:
     
     Looks for:
     1. .gdb folders (geodatabase)
-    2. _export.zip files (zipped geodatabase)
+    2. _export.zip / _replica.gdb.zip files (zipped geodatabase)
     
     Returns the path to whichever is found first.
     """
@@ -814,9 +894,9 @@ def find_geodatabase(extract_dir: str) -> Optional[str]:
                 if d.endswith(".gdb"):
                     return os.path.join(root, d)
             
-            # Check for _export.zip
+            # Check for _export.zip or a replica download
             for f in files:
-                if f.endswith("_export.zip"):
+                if f.endswith("_export.zip") or f.endswith("_replica.gdb.zip"):
                     return os.path.join(root, f)
         
         return None
@@ -866,6 +946,344 @@ def create_feature_service_item(
         err(f"Could not create Feature Service item: {e}")
         return None
 
+# =====================================================================
+# PER-LAYER RESTORE (for backup.py --split-layers)
+# =====================================================================
+LAYER_MANIFEST_SUFFIX = "_layers.json"
+
+def find_layer_manifest(extract_dir: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Return (folder, manifest) for a per-layer backup's <title>_layers.json, if it has one"""
+    for root, _, files in os.walk(extract_dir):
+        for f in files:
+            if f.endswith(LAYER_MANIFEST_SUFFIX):
+                manifest = load_json_if_exists(os.path.join(root, f))
+                if manifest and manifest.get("layers"):
+                    return root, manifest
+    return None
+
+def merge_layer_service(target_item, source_item, layer_id: int) -> Tuple[int, int]:
+    """
+    Fold the one layer of a freshly published per-layer service into
+    target_item under its original layer ID: add its definition, copy its
+    rows across, then delete the temporary service. Attachments are not
+    copied. Returns (copied, failed); raises if the layer cannot be added.
+    """
+    from arcgis.features import FeatureLayerCollection
+    src_flc = FeatureLayerCollection.fromitem(source_item)
+    sources = list(src_flc.layers or []) + list(getattr(src_flc, "tables", None) or [])
+    if not sources:
+        raise RuntimeError(f"{source_item.title} has no layer")
+    src = sources[0]
+    definition = dict(src.properties)
+    definition["id"] = layer_id
+    key = "tables" if definition.get("type") == "Table" else "layers"
+    FeatureLayerCollection.fromitem(target_item).manager.add_to_definition({key: [definition]})
+    
+    target_flc = FeatureLayerCollection.fromitem(target_item)
+    target = next((lyr for lyr in list(target_flc.layers or []) + list(getattr(target_flc, "tables", None) or [])
+                   if int(lyr.properties.id) == layer_id), None)
+    if target is None:
+        raise RuntimeError(f"layer {layer_id} was not added to {target_item.title}")
+    
+    copied = failed = 0
+    offset = 0
+    while True:
+        page = src.query(where="1=1", out_fields="*", return_geometry=True,
+                         result_offset=offset, result_record_count=EDIT_BATCH)
+        features = [f.as_dict for f in page.features]
+        if not features:
+            break
+        result = target.edit_features(adds=features, rollback_on_failure=False) or {}
+        for res in result.get("addResults") or []:
+            copied += 1 if res.get("success") else 0
+            failed += 0 if res.get("success") else 1
+        offset += len(features)
+    source_item.delete()
+    return copied, failed
+
+def restore_layer_set(
+    gis: GIS,
+    layer_set: Tuple[str, Dict[str, Any]],
+    meta: Dict[str, Any],
+    new_title: str,
+    keep_metadata: bool = True
+) -> Optional[str]:
+    """
+    Restore a per-layer backup as one feature service. Each layer was
+    captured as its own geodatabase, so each is published on its own first;
+    the first becomes the target service and every other layer is folded
+    into it under its original layer ID. A layer that cannot be folded in is
+    left as its own service titled "<title>_<layer name>". Returns the
+    target service's ID.
+    """
+    base_dir, manifest = layer_set
+    layers = manifest["layers"]
+    info(f"Per-layer backup: {len(layers)} layer geodatabase(s)")
+    
+    target = None
+    merged = []
+    separate = []
+    for entry in layers:
+        gdb_zip = os.path.join(base_dir, entry["file"])
+        label = entry.get("name") or f"layer{entry['id']}"
+        if not os.path.isfile(gdb_zip):
+            err(f"Layer {label}: {entry['file']} missing from the backup")
+            continue
+        layer_dir = os.path.join(base_dir, f"layer_{entry['id']}_restore")
+        ensure_dir(layer_dir)
+        shutil.copy(gdb_zip, os.path.join(layer_dir, f"layer_{entry['id']}_replica.gdb.zip"))
+        title = new_title if target is None else f"{new_title}_{label}"
+        item_id = restore_feature_service_from_zip(gis, layer_dir, meta, title, keep_metadata)
+        if not item_id:
+            err(f"Layer {label} could not be restored")
+            continue
+        if target is None:
+            target = gis.content.get(item_id)
+            if target is None:
+                err(f"Layer {label}: restored service {item_id} not found")
+                continue
+            merged.append(label)
+            continue
+        try:
+            copied, failed = merge_layer_service(target, gis.content.get(item_id), int(entry["id"]))
+            (ok if not failed else warn)(f"Layer {label}: {copied} row(s) copied into {target.id}" + (f", {failed} failed" if failed else ""))
+            merged.append(label)
+        except Exception as e:
+            warn(f"Layer {label} could not be added to {target.id}; kept as its own service {item_id}: {e}")
+            separate.append(item_id)
+    
+    if target is None:
+        return None
+    restored = len(merged) + len(separate)
+    (ok if restored == len(layers) and not separate else warn)(
+        f"Restored {restored}/{len(layers)} layer(s) into {target.id}"
+        + (f"; separate service(s): {', '.join(separate)}" if separate else ""))
+    return target.id
+
+# =====================================================================
+# QUERY EXTRACT RESTORE (for backup.py's paged-query fallback)
+# =====================================================================
+QUERY_EXTRACT_SUFFIX = "_features.sqlite"
+EDIT_BATCH = 1000  # rows sent per edit_features call when loading rows into a restored layer
+
+def find_query_extract(extract_dir: str) -> Optional[str]:
+    """Find the <title>_features.sqlite written when export and replica both failed"""
+    for root, _, files in os.walk(extract_dir):
+        for f in files:
+            if f.endswith(QUERY_EXTRACT_SUFFIX):
+                return os.path.join(root, f)
+    return None
+
+def restore_query_extract(
+    gis: GIS,
+    extract_path: str,
+    meta: Dict[str, Any],
+    new_title: str,
+    keep_metadata: bool = True
+) -> Optional[str]:
+    """
+    Restore a query extract: create an empty feature service, add one layer
+    (or table) per extracted layer from its stored fields, geometry type and
+    spatial reference, then load its rows with edit_features. Attachments
+    are not restored. Returns the service's ID.
+    """
+    from arcgis.features import FeatureLayerCollection
+    item_id = create_feature_service_item(gis, new_title, meta if keep_metadata else {})
+    item = gis.content.get(item_id) if item_id else None
+    if item is None:
+        return None
+    
+    conn = sqlite3.connect(extract_path)
+    try:
+        layers = conn.execute(
+            "SELECT id, table_name, name, geometry_type, spatial_reference, fields, geometry_column FROM _layers ORDER BY id"
+        ).fetchall()
+        definition: Dict[str, List[Dict[str, Any]]] = {"layers": [], "tables": []}
+        for lid, table, name, geometry_type, spatial_reference, fields, _ in layers:
+            fields = json.loads(fields)
+            layer = {
+                "id": lid,
+                "name": name or table,
+                "fields": fields,
+                "objectIdField": next((f["name"] for f in fields if f.get("type") == "esriFieldTypeOID"), None),
+            }
+            if geometry_type:
+                layer.update(type="Feature Layer", geometryType=geometry_type,
+                             extent={"spatialReference": json.loads(spatial_reference or "null")})
+                definition["layers"].append(layer)
+            else:
+                layer["type"] = "Table"
+                definition["tables"].append(layer)
+        FeatureLayerCollection.fromitem(item).manager.add_to_definition({k: v for k, v in definition.items() if v})
+        
+        flc = FeatureLayerCollection.fromitem(item)
+        targets = {int(lyr.properties.id): lyr for lyr in list(flc.layers or []) + list(getattr(flc, "tables", None) or [])}
+        loaded = failed = 0
+        for lid, table, name, _, _, fields, geometry in layers:
+            target = targets.get(lid)
+            if target is None:
+                warn(f"Layer {name or lid} was not added to the restored service; skipping its rows")
+                continue
+            names = [f["name"] for f in json.loads(fields)]
+            columns = ", ".join('"' + n.replace('"', '""') + '"' for n in names + [geometry])
+            cursor = conn.execute(f'SELECT {columns} FROM "{table}"')
+            while True:
+                rows = cursor.fetchmany(EDIT_BATCH)
+                if not rows:
+                    break
+                adds = []
+                for row in rows:
+                    feature = {"attributes": dict(zip(names, row[:-1]))}
+                    if row[-1]:
+                        feature["geometry"] = json.loads(row[-1])
+                    adds.append(feature)
+                result = target.edit_features(adds=adds, rollback_on_failure=False) or {}
+                for res in result.get("addResults") or []:
+                    loaded += 1 if res.get("success") else 0
+                    failed += 0 if res.get("success") else 1
+        (ok if not failed else warn)(f"Loaded {loaded} row(s) from the query extract into {item_id}"
+                                     + (f", {failed} failed" if failed else ""))
+        return item_id
+    except Exception as e:
+        err(f"Query extract restore failed: {e}")
+        return item_id
+    finally:
+        conn.close()
+
+# =====================================================================
+# REPLICA SYNC CHAIN RESTORE (for backup.py --replica-sync)
+# =====================================================================
+SYNC_CHAIN_FILE = "sync_chain.json"
+
+def find_sync_chain(extract_dir: str) -> Optional[Dict[str, Any]]:
+    """Load sync_chain.json from an extracted backup, if it has one"""
+    for root, _, files in os.walk(extract_dir):
+        if SYNC_CHAIN_FILE in files:
+            chain = load_json_if_exists(os.path.join(root, SYNC_CHAIN_FILE))
+            if chain is not None:
+                chain["_dir"] = root
+            return chain
+    return None
+
+def resolve_chain_path(backup_path: str, rel_path: str) -> Optional[str]:
+    """
+    Find a backup named in a sync chain. Chain paths are relative to the
+    backup root, which is the backup's own folder for .zip files and a few
+    levels up for chunk-store manifests.
+    """
+    base = os.path.dirname(os.path.abspath(backup_path))
+    for _ in range(5):
+        candidate = os.path.join(base, rel_path)
+        if os.path.isfile(candidate):
+            return candidate
+        base = os.path.dirname(base)
+    return None
+
+def load_delta(backup_path: str) -> Optional[Dict[str, Any]]:
+    """Extract one delta backup and return its replica delta JSON"""
+    extract_dir = extract_manifest(backup_path) if is_store_manifest(backup_path) else extract_zip(backup_path)
+    try:
+        chain = find_sync_chain(extract_dir)
+        if not chain or not chain.get("delta_file"):
+            err(f"No replica delta found in {backup_path}")
+            return None
+        return load_json_if_exists(os.path.join(chain["_dir"], chain["delta_file"]))
+    finally:
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+def apply_delta(item, delta: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Apply one replica delta (adds, updates, deletes per layer) to a restored
+    feature service, matching rows by GlobalID. Adds that already exist
+    (older baselines were exported after their replica was registered) are
+    applied as updates.
+    Returns (applied, failed).
+    """
+    from arcgis.features import FeatureLayerCollection
+    flc = FeatureLayerCollection.fromitem(item)
+    targets = {}
+    for lyr in list(flc.layers or []) + list(getattr(flc, "tables", None) or []):
+        try:
+            targets[int(lyr.properties.id)] = lyr
+        except Exception:
+            continue
+    
+    applied = failed = 0
+    for layer_edits in delta.get("edits") or []:
+        target = targets.get(int(layer_edits.get("id", -1)))
+        features = layer_edits.get("features") or {}
+        adds = features.get("adds") or []
+        updates = features.get("updates") or []
+        deletes = features.get("deletes") or features.get("deleteIds") or []
+        if layer_edits.get("attachments"):
+            warn(f"Layer {layer_edits.get('id')}: attachment edits in the delta are not restored")
+        if not (adds or updates or deletes):
+            continue
+        if target is None:
+            warn(f"Layer {layer_edits.get('id')} not found in the restored service; skipping its edits")
+            failed += len(adds) + len(updates) + len(deletes)
+            continue
+        
+        result = target.edit_features(
+            adds=adds or None,
+            updates=updates or None,
+            deletes=",".join(str(d) for d in deletes) if deletes else None,
+            use_global_ids=True,
+            rollback_on_failure=False
+        ) or {}
+        retry_as_updates = []
+        for feature, res in zip(adds, result.get("addResults") or []):
+            if res.get("success"):
+                applied += 1
+            else:
+                retry_as_updates.append(feature)
+        for key in ("updateResults", "deleteResults"):
+            for res in result.get(key) or []:
+                applied += 1 if res.get("success") else 0
+                failed += 0 if res.get("success") else 1
+        if retry_as_updates:
+            res2 = target.edit_features(updates=retry_as_updates, use_global_ids=True, rollback_on_failure=False) or {}
+            for res in res2.get("updateResults") or []:
+                applied += 1 if res.get("success") else 0
+                failed += 0 if res.get("success") else 1
+    return applied, failed
+
+def restore_sync_chain(
+    backup_path: str,
+    chain: Dict[str, Any],
+    gis: GIS,
+    keep_metadata: bool = True
+) -> Optional[str]:
+    """
+    Restore a --replica-sync delta backup: restore its baseline backup, then
+    replay every delta in the chain, ending with this one.
+    """
+    baseline = resolve_chain_path(backup_path, chain["baseline"])
+    if not baseline:
+        err(f"Baseline backup not found for sync chain: {chain['baseline']}")
+        return None
+    
+    deltas = chain.get("deltas") or []
+    info(f"Sync chain: baseline {chain['baseline']} + {len(deltas) + 1} delta(s)")
+    item_id = restore_zip(baseline, gis, keep_metadata)
+    if not item_id:
+        return None
+    new_item = gis.content.get(item_id)
+    
+    current = load_json_if_exists(os.path.join(chain["_dir"], chain.get("delta_file", "")))
+    steps = [(rel, None) for rel in deltas] + [(os.path.basename(backup_path), current)]
+    for n, (rel, delta) in enumerate(steps, start=1):
+        if delta is None:
+            path = resolve_chain_path(backup_path, rel)
+            delta = load_delta(path) if path else None
+        if delta is None:
+            err(f"Delta {n} ({rel}) is missing; data restored up to delta {n - 1} only")
+            return item_id
+        applied, failed = apply_delta(new_item, delta)
+        (ok if not failed else warn)(f"Delta {n}: {applied} edit(s) applied, {failed} failed")
+    
+    return item_id
+
 # =====================================================================
 # MAIN RESTORE DISPATCHER
 # =====================================================================
@@ -876,7 +1294,7 @@ def restore_backup(
     keep_metadata: bool = True
 ) -> Tuple[bool, Optional[str]]:
     """
-    Restore a backup file (.contentexport or .zip).
+    Restore a backup file (.contentexport, .zip or chunk-store .manifest.json).
     Returns: (success, item_ids_or_message)
     """
     log(f"\n{'='*70}")
@@ -913,7 +1331,7 @@ def restore_backup(
             else:
                 return False, "ContentExport import failed"
         else:
-            log(f"Detected .zip format")
+            log("Detected chunk-store manifest" if is_store_manifest(backup_path) else f"Detected .zip format")
             item_id = restore_zip(backup_path, gis, keep_metadata)
             if item_id:
                 return True, item_id
@@ -931,7 +1349,7 @@ def restore_backup(
 # =====================================================================
 def parse_args(argv: Optional[List[str]] = None):
     p = argparse.ArgumentParser(description="Restore ArcGIS items from backups (.zip or .contentexport).")
-    p.add_argument("--backup", required=True, help="Path to backup file (.zip or .contentexport).")
+    p.add_argument("--backup", required=True, help="Path to backup file (.zip, .contentexport or chunk-store .manifest.json).")
     p.add_argument("--connection", default="home", help="ArcGIS connection string (default: home).")
     p.add_argument("--overwrite", action="store_true", help="Overwrite existing items (for .contentexport).")
     p.add_argument("--keep-metadata", action="store_true", default=True, help="Preserve original metadata.")
@@ -0,0 +1,141 @@
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# ---------------------------
+# Retries and circuit breakers
+# ---------------------------
+# Shared by backup.py and scan.py. Each script keeps its own RetryEngine and
+# passes its logger in.
+#
+# "refused" errors mean the server turned the request away before doing any
+# work, so even non-idempotent calls (export/replica submission) can be sent
+# again. "transient" errors may have been half-processed and are only retried
+# for idempotent reads and downloads.
+REFUSED_PATTERN = re.compile(
+    r"\b(429|502|503)\b|too many requests|rate limit|throttl|service unavailable|bad gateway|connection refused",
+    re.IGNORECASE,
+)
+TRANSIENT_PATTERN = re.compile(
+    r"\b(500|504)\b|gateway time-?out|timed out|timeout|connection (reset|aborted)|remote end closed|"
+    r"temporarily unavailable|broken pipe|max retries exceeded",
+    re.IGNORECASE,
+)
+TRANSIENT_EXCEPTIONS = ("ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout", "ChunkedEncodingError", "ProtocolError")
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+def is_transient_message(err: Optional[str]) -> bool:
+    """True for error text that points at the server or network rather than the request."""
+    err = err or ""
+    return bool(REFUSED_PATTERN.search(err) or TRANSIENT_PATTERN.search(err)) or "Circuit open" in err
+
+def transient_kind(exc: Exception) -> Optional[str]:
+    """'refused', 'transient' or None (a real answer from the server, not worth retrying)."""
+    if isinstance(exc, CircuitOpenError):
+        return None
+    if isinstance(exc, ConnectionRefusedError) or REFUSED_PATTERN.search(str(exc)):
+        return "refused"
+    if (isinstance(exc, (ConnectionError, TimeoutError)) or type(exc).__name__ in TRANSIENT_EXCEPTIONS
+            or TRANSIENT_PATTERN.search(str(exc))):
+        return "transient"
+    return None
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` failed calls in a row against one host and
+    fails calls fast for `cooldown` seconds. Then a single trial call is let
+    through: success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and time.time() - self.opened_at >= self.cooldown:
+                self.trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures, self.opened_at, self.trial = 0, None, False
+
+    def failure(self) -> bool:
+        """Record a transient failure; True when this opened the breaker."""
+        with self._lock:
+            self.failures += 1
+            if self.trial or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at, self.trial = time.time(), False
+                return True
+            return False
+
+def print_line(msg: str):
+    print(msg, flush=True)
+
+class RetryEngine:
+    """
+    Runs portal/service calls with jittered exponential backoff ("full
+    jitter": a random wait up to base * 2^attempt, capped at max_delay) and
+    one circuit breaker per host, so a hosting server that is down stops
+    being called while items on other hosts carry on.
+    """
+
+    def __init__(self, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 60.0,
+                 log: Callable[[str], None] = print_line):
+        self.configure(attempts, base_delay, max_delay, breaker_threshold, breaker_cooldown)
+        self.log = log
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                  breaker_threshold: int = 5, breaker_cooldown: float = 60.0):
+        self.attempts = max(0, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+            return self._breakers[key]
+
+    def call(self, key: str, fn, *args, idempotent: bool = True, label: Optional[str] = None, **kwargs):
+        """fn(*args, **kwargs) with retries; non-idempotent calls are only repeated after a refusal."""
+        breaker = self.breaker(key)
+        label = label or getattr(fn, "__name__", "call")
+        for attempt in range(self.attempts + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {key}; not calling {label} for up to {self.breaker_cooldown:.0f}s")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                kind = transient_kind(e)
+                if kind is None:
+                    breaker.success()  # the host answered; the error is about the request
+                    raise
+                if attempt == self.attempts or not (idempotent or kind == "refused"):
+                    # Only calls that used up their retries count towards opening the breaker.
+                    if breaker.failure():
+                        self.log(f"[BREAKER] {key} failing ({e}); pausing calls for {self.breaker_cooldown:.0f}s")
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                self.log(f"[RETRY] {label} on {key} failed ({e}); retry {attempt + 1}/{self.attempts} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            breaker.success()
+            return result
@@ -1,103 +1,475 @@
-import pandas as pd
 from arcgis.gis import GIS
 import urllib3
 import time
 import csv
+import json
 import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
 import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+from retrying import RetryEngine
 
 # Suppress HTTPS warnings for environments with SSL inspection
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Portal search returns at most 100 results per page and stops paging at
+# start + num = 10,000, whatever the total is.
+SEARCH_PAGE_SIZE = 100
+SEARCH_RESULT_CAP = 10000
+
+# Delta scans ask only for items modified since the high-water mark, minus an
+# overlap because the search index lags behind item edits.
+DELTA_OVERLAP_MS = 2 * 3600 * 1000
+
+# STRICT filter list to prevent 'fuzzy' search results from entering CSV
+VALID_STATUSES = ['org_authoritative', 'public_authoritative']
+
+# A full sweep that would tombstone more than this share of the index is
+# treated as a bad search result (outage, permissions) unless explicitly allowed.
+REMOVAL_GUARD = 0.5
+
 def PrintWithTime(msg):
     timestamp = time.strftime('%H:%M:%S')
     print(f"[{timestamp}] {msg}", flush=True)
 
+# Backoff and the portal's circuit breaker, shared with backup.py through retrying.py
+retry_engine = RetryEngine(log=PrintWithTime)
+
+# Inventory column -> scan store column
+INVENTORY_COLUMNS = [
+    ("Title", "title"), ("Id", "id"), ("Type", "type"), ("Owner", "owner"),
+    ("Created", "created"), ("Modified", "modified"), ("RestUrl", "rest_url"),
+    ("ItemPageUrl", "item_page_url"), ("Tags", "tags"), ("ContentStatus", "content_status"),
+]
+
 def GetItemDetails(gis, item):
     """
-    Extracts core metadata only. 
-    Using getattr to safely handle potential missing attributes.
-    """
-    return {
-        "Title": item.title,
-        "Id": item.id,
-        "Type": item.type,
-        "Owner": item.owner,
-        "Created": pd.to_datetime(item.created, unit="ms"),
-        "Modified": pd.to_datetime(item.modified, unit="ms"),
-        "RestUrl": getattr(item, "url", ""),
-        "ItemPageUrl": f"{gis.url}/home/item.html?id={item.id}",
-        "Tags": ", ".join(item.tags or []),
-        "ContentStatus": getattr(item, "content_status", "")
-    }
-
-def GenerateInventory(gis, out_file, index_file, max_items):
-    # STRICT filter list to prevent 'fuzzy' search results from entering CSV
-    VALID_STATUSES = ['org_authoritative', 'public_authoritative']
+    Extracts core metadata only from a raw search result, as a row in
+    INVENTORY_COLUMNS order. Using .get to safely handle potential missing fields.
+    Created/Modified stay epoch ms; they are converted once, per column, at export.
+    """
+    return (
+        item.get("title"),
+        item["id"],
+        item.get("type"),
+        item.get("owner"),
+        item.get("created"),
+        item.get("modified"),
+        item.get("url") or "",
+        f"{gis.url}/home/item.html?id={item['id']}",
+        ", ".join(item.get("tags") or []),
+        item.get("contentStatus") or "",
+    )
+
+def SearchPage(gis, query, start, num=SEARCH_PAGE_SIZE):
+    """
+    One page of raw item JSON from the portal search, oldest first, through
+    the retry engine.
+    """
+    return retry_engine.call(
+        urlparse(gis.url).netloc or "portal", gis.content.advanced_search,
+        query=query, start=start, max_items=num, sort_field="created", sort_order="asc", as_dict=True,
+        label=f"search page {start}",
+    ) or {}
+
+def PartitionQuery(gis, query, lo, hi, total=None):
+    """
+    Split `query` into created-date ranges [lo, hi] (epoch ms) that each
+    return at most SEARCH_RESULT_CAP results. Returns [(query, total)].
+    """
+    ranged = f"({query}) AND created:[{lo:019d} TO {hi:019d}]"
+    if total is None:
+        total = SearchPage(gis, ranged, 1, 1).get("total", 0)
+    if total <= SEARCH_RESULT_CAP or hi - lo < 1000:
+        if total > SEARCH_RESULT_CAP:
+            PrintWithTime(f"WARNING: {total} items created within one second; only {SEARCH_RESULT_CAP} can be read.")
+        return [(ranged, total)] if total else []
+    mid = (lo + hi) // 2
+    return PartitionQuery(gis, query, lo, mid) + PartitionQuery(gis, query, mid + 1, hi)
+
+def StreamSearch(gis, query, max_items=0, workers=8):
+    """
+    Yield raw item dicts for `query` as their pages arrive.
+    Queries over the result cap are partitioned by created date first; then the
+    start/num pages of every partition are fetched on a pool of `workers`, a few
+    pages ahead of the consumer, so validation starts with the first page.
+    """
+    first = SearchPage(gis, query, 1)
+    total = first.get("total", 0)
+    if total > SEARCH_RESULT_CAP:
+        partitions = PartitionQuery(gis, query, 0, int(time.time() * 1000) + 86400000)
+        pages = [(q, start) for q, n in partitions for start in range(1, min(n, SEARCH_RESULT_CAP) + 1, SEARCH_PAGE_SIZE)]
+        PrintWithTime(f"Server reports {total} matches; split into {len(partitions)} created-date partitions.")
+    else:
+        pages = [(query, start) for start in range(1 + SEARCH_PAGE_SIZE, total + 1, SEARCH_PAGE_SIZE)]
+        PrintWithTime(f"Server reports {total} matches.")
+    limit = max_items or total
+    if limit < total:
+        PrintWithTime(f"WARNING: --max {max_items} stops the scan before all {total} matches are read.")
     
-    # Server-side query to narrow down the initial list
-    query = 'contentstatus:org_authoritative OR contentstatus:public_authoritative'
+    yielded = 0
+    if total <= SEARCH_RESULT_CAP:
+        for result in first.get("results") or []:
+            if yielded >= limit:
+                return
+            yield result
+            yielded += 1
     
-    # Load Index (item_id -> modified_timestamp)
-    # This prevents re-processing items that haven't changed
+    pages = iter(pages)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        def Fill():
+            for q, start in itertools.islice(pages, max(1, workers) * 2 - len(pending)):
+                pending.add(executor.submit(SearchPage, gis, q, start))
+        
+        Fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                for result in future.result().get("results") or []:
+                    if yielded >= limit:
+                        for other in pending:
+                            other.cancel()
+                        return
+                    yield result
+                    yielded += 1
+            Fill()
+
+# ---------------------------
+# Scan state store
+# ---------------------------
+def ScanStorePath(index_file):
+    """A legacy scan_index.csv maps to a sibling .sqlite store"""
+    if index_file.lower().endswith(".csv"):
+        return os.path.splitext(index_file)[0] + ".sqlite"
+    return index_file
+
+def ParseLegacyTime(value):
+    """'YYYY-MM-DD HH:MM:SS[.ffffff]' (UTC, as pandas wrote it) -> epoch ms"""
+    try:
+        return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return None
+
+def OpenScanStore(index_file, out_file):
+    """
+    SQLite store keyed by item id: one row per item (raw ms timestamps, first
+    seen, last update, tombstone and its reason) plus a meta table for the high-water mark and
+    last full sweep. Legacy scan_index.csv + inventory CSV are imported once.
+    """
+    path = ScanStorePath(index_file)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS items (
+            id TEXT PRIMARY KEY, title TEXT, type TEXT, owner TEXT,
+            created INTEGER, modified INTEGER, rest_url TEXT, item_page_url TEXT,
+            tags TEXT, content_status TEXT,
+            first_seen INTEGER, updated_at INTEGER, deleted_at INTEGER, removed_reason TEXT
+        );
+        CREATE INDEX IF NOT EXISTS items_modified ON items(modified);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """)
+    if "removed_reason" not in {row[1] for row in conn.execute("PRAGMA table_info(items)")}:
+        conn.execute("ALTER TABLE items ADD COLUMN removed_reason TEXT")
+    if path != index_file and GetMeta(conn, "legacy_import") is None:
+        ImportLegacyIndex(conn, index_file, out_file)
+    return conn
+
+def GetMeta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def SetMeta(conn, key, value):
+    conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                 (key, str(value)))
+
+def ImportLegacyIndex(conn, index_file, out_file):
+    """
+    One-time import of the old CSV pair. The append-only inventory holds one row
+    per update, so the last row for each id wins. No high-water mark is carried
+    over: the first scan on the store is a full sweep.
+    """
     index = {}
     if os.path.exists(index_file):
         with open(index_file, 'r', encoding="utf-8-sig") as f:
-            reader = csv.DictReader(f)
-            index = {row['id']: int(row['mod']) for row in reader}
+            index = {row['id']: int(row['mod']) for row in csv.DictReader(f)}
+    rows = {}
+    if os.path.exists(out_file) and out_file.lower().endswith(".csv"):
+        with open(out_file, 'r', encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                if row.get("Id"):
+                    rows[row["Id"]] = row
+    now_ms = int(time.time() * 1000)
+    records = []
+    for item_id, row in rows.items():
+        record = {name: row.get(name) or "" for name, _ in INVENTORY_COLUMNS}
+        record["Created"] = ParseLegacyTime(row.get("Created"))
+        record["Modified"] = index.get(item_id) or ParseLegacyTime(row.get("Modified"))
+        records.append(tuple(record[name] for name, _ in INVENTORY_COLUMNS))
+    with conn:
+        UpsertItems(conn, records, now_ms)
+        SetMeta(conn, "legacy_import", now_ms)
+    if records:
+        PrintWithTime(f"Imported {len(records)} items from legacy {index_file} / {out_file} (collapsed from the append-only inventory).")
+
+def LoadIndex(conn):
+    """item_id -> modified (ms) for every live item"""
+    return dict(conn.execute("SELECT id, modified FROM items WHERE deleted_at IS NULL"))
 
-    PrintWithTime("Querying server for potential authoritative items...")
-    raw_items = gis.content.search(query=query, max_items=max_items, outside_org=False)
-    PrintWithTime(f"Server returned {len(raw_items)} matches. Starting strict validation...")
+def UpsertItems(conn, records, now_ms):
+    """Insert or update only the given inventory rows (GetItemDetails tuples); clears any tombstone"""
+    columns = [column for _, column in INVENTORY_COLUMNS]
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+    conn.executemany(
+        f"INSERT INTO items ({', '.join(columns)}, first_seen, updated_at, deleted_at) "
+        f"VALUES ({', '.join('?' * len(columns))}, ?, ?, NULL) "
+        f"ON CONFLICT(id) DO UPDATE SET {updates}, updated_at = excluded.updated_at, deleted_at = NULL, removed_reason = NULL",
+        [record + (now_ms, now_ms) for record in records])
+
+def TombstoneItems(conn, removed, when_ms):
+    """Mark items ({id: 'deleted'|'demoted'}) as gone; they stay in the store but drop out of the inventory"""
+    conn.executemany("UPDATE items SET deleted_at = ?, removed_reason = ? WHERE id = ? AND deleted_at IS NULL",
+                     [(when_ms, reason, i) for i, reason in removed.items()])
+
+def FormatTimestamps(values):
+    """
+    Epoch ms column -> 'YYYY-MM-DD HH:MM:SS' strings (UTC) in one pass, matching
+    what pandas writes: microseconds are shown for every row only when any
+    value has a sub-second part.
+    """
+    fraction = any(v % 1000 for v in values if v is not None)
+    fmt = "%Y-%m-%d %H:%M:%S.%f" if fraction else "%Y-%m-%d %H:%M:%S"
+    epoch = datetime(1970, 1, 1)
+    return ["" if v is None else (epoch + timedelta(milliseconds=v)).strftime(fmt) for v in values]
+
+def RemovedFeedPath(out_file):
+    return os.path.splitext(out_file)[0] + "_removed.csv"
+
+def ExportRemoved(conn, feed_file):
+    """
+    Write every tombstoned item (newest first) to a CSV with an Id column, so
+    backup.py --skip-removed can drop dead IDs before fetching them.
+    """
+    rows = conn.execute("SELECT id, title, type, owner, removed_reason, deleted_at FROM items "
+                        "WHERE deleted_at IS NOT NULL ORDER BY deleted_at DESC, id").fetchall()
+    columns = list(map(list, zip(*rows))) if rows else [[] for _ in range(6)]
+    columns[5] = FormatTimestamps(columns[5])
+    os.makedirs(os.path.dirname(feed_file) or ".", exist_ok=True)
+    tmp = feed_file + ".tmp"
+    with open(tmp, 'w', newline='', encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Id", "Title", "Type", "Owner", "Reason", "RemovedAt"])
+        writer.writerows(zip(*columns))
+    os.replace(tmp, feed_file)
+    return len(rows)
+
+def ClassifyMissing(gis, item_ids, org_id=None, workers=8):
+    """
+    Indexed items absent from a full sweep: look them up with bulk id:(...)
+    searches (no status filter). Returns ({id: reason}, [still live raw items]).
+    Not found -> 'deleted'; found but no longer authoritative or owned by
+    another org -> 'demoted'. Found and still authoritative means the sweep
+    missed it (shifted page, lagging index), so it stays live.
+    """
+    ids = sorted(item_ids)
+    batch = SEARCH_PAGE_SIZE // 2
+    batches = [ids[i:i + batch] for i in range(0, len(ids), batch)]
+    
+    def Lookup(chunk):
+        result = SearchPage(gis, "id:(" + " OR ".join(chunk) + ")", 1, SEARCH_PAGE_SIZE)
+        return result.get("results") or []
+    
+    found = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for hits in executor.map(Lookup, batches):
+            found.update((r["id"], r) for r in hits if r.get("id") in item_ids)
+    removed, alive = {}, []
+    for i in ids:
+        item = found.get(i)
+        if item is None:
+            removed[i] = "deleted"
+        elif (item.get("contentStatus") or "") not in VALID_STATUSES or (org_id and item.get("orgId", org_id) != org_id):
+            removed[i] = "demoted"
+        else:
+            alive.append(item)
+    return removed, alive
+
+def ExportInventory(conn, out_file):
+    """
+    Rewrite the inventory from the live rows of the store. Rows are read into
+    column arrays and the timestamp columns converted in one pass. CSV and JSONL
+    are written with the standard library; only a .parquet path imports pandas.
+    """
+    names = [name for name, _ in INVENTORY_COLUMNS]
+    rows = conn.execute(f"SELECT {', '.join(c for _, c in INVENTORY_COLUMNS)} FROM items "
+                        "WHERE deleted_at IS NULL ORDER BY created, id").fetchall()
+    columns = dict(zip(names, map(list, zip(*rows)))) if rows else {name: [] for name in names}
+    os.makedirs(os.path.dirname(out_file) or ".", exist_ok=True)
+    tmp = out_file + ".tmp"
+    ext = os.path.splitext(out_file)[1].lower()
+    if ext == ".parquet":
+        import pandas as pd
+        df = pd.DataFrame(columns)
+        df["Created"] = pd.to_datetime(df["Created"], unit="ms")
+        df["Modified"] = pd.to_datetime(df["Modified"], unit="ms")
+        df.to_parquet(tmp, index=False)
+    else:
+        columns["Created"] = FormatTimestamps(columns["Created"])
+        columns["Modified"] = FormatTimestamps(columns["Modified"])
+        records = zip(*(columns[name] for name in names))
+        if ext == ".jsonl":
+            with open(tmp, 'w', encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(dict(zip(names, record)), ensure_ascii=False) + "\n")
+        else:
+            with open(tmp, 'w', newline='', encoding="utf-8-sig") as f:
+                writer = csv.writer(f)
+                writer.writerow(names)
+                writer.writerows(records)
+    os.replace(tmp, out_file)
+    return len(rows)
+
+def GenerateInventory(gis, out_file, index_file, max_items=0, workers=8, full_every_days=7, force_full=False,
+                      export_only=False, removed_file=None, allow_mass_removal=False):
+    removed_file = removed_file or RemovedFeedPath(out_file)
+    conn = OpenScanStore(index_file, out_file)
+    try:
+        if export_only:
+            count = ExportInventory(conn, out_file)
+            PrintWithTime(f"Exported {count} items to {out_file}.")
+            count = ExportRemoved(conn, removed_file)
+            PrintWithTime(f"Exported {count} removed items to {removed_file}.")
+        else:
+            ScanIntoStore(gis, conn, out_file, removed_file, max_items, workers, full_every_days, force_full, allow_mass_removal)
+    finally:
+        conn.close()
+
+def ScanIntoStore(gis, conn, out_file, removed_file, max_items, workers, full_every_days, force_full, allow_mass_removal):
+    # Server-side query to narrow down the initial list (own organization only)
+    query = 'contentstatus:org_authoritative OR contentstatus:public_authoritative'
+    org_id = getattr(gis.properties, "id", None)
+    if org_id:
+        query = f"({query}) AND accountid:{org_id}"
+    
+    # Load Index (item_id -> modified_timestamp) from the state store
+    # This prevents re-processing items that haven't changed
+    index = LoadIndex(conn)
+
+    # Delta vs full sweep: a delta only asks the server for items modified since
+    # the high-water mark; the periodic full sweep re-reads every match so status
+    # changes that don't bump `modified`, and deletions, are still picked up.
+    now_ms = int(time.time() * 1000)
+    high_water = int(GetMeta(conn, "high_water", 0))
+    last_full = int(GetMeta(conn, "last_full_sweep", 0))
+    full = (force_full or not index or not high_water or full_every_days <= 0
+            or now_ms - last_full >= full_every_days * 86400000)
+    if full:
+        PrintWithTime("Full sweep: querying server for all potential authoritative items (streaming, validating as pages arrive)...")
+    else:
+        since = max(0, high_water - DELTA_OVERLAP_MS)
+        query = f"({query}) AND modified:[{since:019d} TO {now_ms + 86400000:019d}]"
+        PrintWithTime(f"Delta scan: querying server for items modified since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(since / 1000))}...")
 
     new_records = []
+    seen = set()
     skipped_not_auth = 0
     skipped_no_change = 0
+    high_water_seen = high_water
+    removed = {}
 
-    for item in raw_items:
+    for item in StreamSearch(gis, query, max_items, workers):
+        if item["id"] in seen:
+            continue
+        seen.add(item["id"])
+        
         # --- STEP 1: Strict Status Validation ---
         # Ensures items with 'authoritative' in tags/description are excluded
-        actual_status = getattr(item, "content_status", "")
+        actual_status = item.get("contentStatus") or ""
         if actual_status not in VALID_STATUSES:
             skipped_not_auth += 1
+            if item["id"] in index:
+                removed[item["id"]] = "demoted"
             continue
 
         # --- STEP 2: Delta Change Check ---
-        # Skip if we already have this version of the item in our CSV
-        if item.id in index and index[item.id] >= item.modified:
+        # Skip if we already have this version of the item in the store
+        modified = item.get("modified") or 0
+        high_water_seen = max(high_water_seen, modified)
+        if item["id"] in index and index[item["id"]] >= modified:
             skipped_no_change += 1
             continue
         
         # --- STEP 3: Extraction ---
         new_records.append(GetItemDetails(gis, item))
-        index[item.id] = item.modified
+        index[item["id"]] = modified
 
+    PrintWithTime(f"Validated {len(seen)} matches.")
     PrintWithTime(f"Filtered out {skipped_not_auth} non-authoritative items.")
     PrintWithTime(f"Skipped {skipped_no_change} items with no new updates.")
 
-    if new_records:
-        df = pd.DataFrame(new_records)
-        # Append to CSV (creates file if it doesn't exist)
-        header = not os.path.exists(out_file)
-        os.makedirs(os.path.dirname(out_file) or ".", exist_ok=True)
-        df.to_csv(out_file, mode='a', index=False, header=header, encoding="utf-8-sig")
-        
-        # Update the Index file for the next run
-        with open(index_file, 'w', newline='', encoding="utf-8-sig") as f:
-            writer = csv.DictWriter(f, fieldnames=['id', 'mod'])
-            writer.writeheader()
-            for k, v in index.items():
-                writer.writerow({'id': k, 'mod': v})
-        
-        PrintWithTime(f"SUCCESS: Added/Updated {len(new_records)} items in {out_file}.")
+    # Upsert only the changed rows. A scan cut short by --max may have missed
+    # older edits, so it must not move the high-water mark or count as a full sweep.
+    truncated = bool(max_items) and len(seen) >= max_items
+
+    # --- STEP 4: Removal Detection ---
+    # Only a complete full sweep sees every live item; whatever the index holds
+    # beyond that was deleted or demoted. A sweep stopped by the guard is not
+    # recorded as a full sweep, so the next run tries again.
+    if full and not truncated:
+        missing = index.keys() - seen
+        if missing and len(missing) > max(10, len(index) * REMOVAL_GUARD) and not allow_mass_removal:
+            PrintWithTime(f"WARNING: {len(missing)} of {len(index)} indexed items are missing from the sweep; "
+                          "not tombstoning them (rerun with --allow-mass-removal if this is real).")
+            full = False
+        elif missing:
+            PrintWithTime(f"Checking {len(missing)} indexed items missing from the sweep...")
+            gone, alive = ClassifyMissing(gis, missing, org_id, workers)
+            removed.update(gone)
+            if alive:
+                # Refresh their rows rather than trusting a sweep that skipped them
+                PrintWithTime(f"{len(alive)} missing items are still authoritative; kept.")
+                new_records.extend(GetItemDetails(gis, item) for item in alive)
+    if removed:
+        deleted = sum(1 for reason in removed.values() if reason == "deleted")
+        PrintWithTime(f"Tombstoned {deleted} deleted and {len(removed) - deleted} demoted items.")
+
+    with conn:
+        UpsertItems(conn, new_records, now_ms)
+        TombstoneItems(conn, removed, now_ms)
+        if not truncated:
+            SetMeta(conn, "high_water", high_water_seen)
+            if full:
+                SetMeta(conn, "last_full_sweep", now_ms)
+    if truncated:
+        PrintWithTime("Scan was truncated by --max; high-water mark left unchanged.")
+
+    # Re-export the removed-items feed and the inventory from the store (one row
+    # per item, no duplicates) when something changed or they are missing
+    if removed or new_records or not os.path.exists(removed_file):
+        count = ExportRemoved(conn, removed_file)
+        PrintWithTime(f"Removed-items feed: {count} items in {removed_file}.")
+    if new_records or removed or not os.path.exists(out_file):
+        count = ExportInventory(conn, out_file)
+        PrintWithTime(f"SUCCESS: Added/Updated {len(new_records)} items; exported {count} items to {out_file}.")
     else:
         PrintWithTime("Inventory is already 100% up to date.")
 
 def main():
     parser = argparse.ArgumentParser(description="Strict Authoritative Layer Scanner")
-    parser.add_argument("--out", default="AuthInventory.csv", help="The final report CSV")
-    parser.add_argument("--index", default="scan_index.csv", help="The tracking file for speed")
-    parser.add_argument("--max", type=int, default=10000, help="Max items to scan")
+    parser.add_argument("--out", default="AuthInventory.csv", help="The final report: .csv, .jsonl, or .parquet (the only format that needs pandas)")
+    parser.add_argument("--index", default="scan_index.sqlite", help="The scan state store (a .csv path maps to a sibling .sqlite, importing the old index once)")
+    parser.add_argument("--max", type=int, default=0, help="Max items to scan (0 = all)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent search page requests")
+    parser.add_argument("--full-every-days", type=float, default=7, help="Days between full sweeps; runs in between only fetch items modified since the last scan (0 = always full)")
+    parser.add_argument("--full", action="store_true", help="Force a full sweep this run")
+    parser.add_argument("--export-only", action="store_true", help="Rewrite --out and the removed-items feed from the state store without scanning")
+    parser.add_argument("--removed-out", default=None, help="Removed-items feed CSV (default: <out>_removed.csv)")
+    parser.add_argument("--allow-mass-removal", action="store_true", help="Tombstone missing items even when more than half the index disappears")
     args = parser.parse_args()
 
     try:
@@ -105,7 +477,8 @@ def main():
         gis = GIS("home")
         PrintWithTime(f"Connected to {gis.url}")
         
-        GenerateInventory(gis, args.out, args.index, args.max)
+        GenerateInventory(gis, args.out, args.index, args.max, args.workers, args.full_every_days, args.full,
+                          args.export_only, args.removed_out, args.allow_mass_removal)
     except Exception as e:
         PrintWithTime(f"CRITICAL ERROR: {e}")
 
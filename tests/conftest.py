@@ -0,0 +1,63 @@
+import os
+import sys
+import types
+
+# The tools are top-level scripts, not a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _stub_module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+# The scripts import arcgis, urllib3 and requests. No test talks to a portal
+# or a server, so small stand-ins are used when those packages are not
+# installed; download tests replace the session with their own fake.
+try:
+    import arcgis.gis  # noqa: F401
+except ImportError:
+    class GIS:
+        def __init__(self, *args, **kwargs):
+            raise RuntimeError("arcgis is not installed")
+
+    _stub_module("arcgis").gis = _stub_module("arcgis.gis", GIS=GIS)
+
+try:
+    import urllib3  # noqa: F401
+except ImportError:
+    class InsecureRequestWarning(Warning):
+        pass
+
+    _stub_module(
+        "urllib3",
+        disable_warnings=lambda *args, **kwargs: None,
+        exceptions=_stub_module("urllib3.exceptions", InsecureRequestWarning=InsecureRequestWarning),
+    )
+
+try:
+    import requests  # noqa: F401
+except ImportError:
+    class Session:
+        def mount(self, prefix, adapter):
+            pass
+
+        def get(self, *args, **kwargs):
+            raise RuntimeError("requests is not installed")
+
+        def close(self):
+            pass
+
+    class ChunkedEncodingError(Exception):
+        pass
+
+    _stub_module(
+        "requests",
+        Session=Session,
+        ConnectionError=type("ConnectionError", (Exception,), {}),
+        Timeout=type("Timeout", (Exception,), {}),
+        exceptions=_stub_module("requests.exceptions", ChunkedEncodingError=ChunkedEncodingError),
+        adapters=_stub_module("requests.adapters", HTTPAdapter=lambda *args, **kwargs: None),
+    )
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+import backup
+
+
+@pytest.fixture(autouse=True)
+def no_cooldown(monkeypatch):
+    monkeypatch.setattr(backup, "ADAPTIVE_COOLDOWN", 0.0)
+
+
+def run_jobs(limiter, outcomes, latency=0.1):
+    for outcome in outcomes:
+        limiter.acquire()
+        limiter.release(latency, outcome)
+
+
+def test_healthy_jobs_grow_the_limit_additively_up_to_the_maximum():
+    limiter = backup.AdaptiveLimiter("export", initial=2, minimum=1, maximum=4)
+
+    run_jobs(limiter, ["ok"] * 3)
+    assert int(limiter.limit) == 3
+
+    run_jobs(limiter, ["ok"] * 50)
+    assert limiter.limit == 4
+
+
+def test_a_throttled_job_halves_the_limit_but_not_below_the_minimum():
+    limiter = backup.AdaptiveLimiter("export", initial=8, minimum=3, maximum=8)
+
+    run_jobs(limiter, ["throttled"])
+    assert limiter.limit == 4
+
+    run_jobs(limiter, ["throttled"])
+    assert limiter.limit == 3
+
+
+def test_a_high_error_rate_cuts_the_limit_by_a_quarter():
+    limiter = backup.AdaptiveLimiter("capture", initial=8, minimum=1, maximum=8)
+
+    run_jobs(limiter, ["error"] * (backup.ADAPTIVE_WINDOW // 2))
+
+    assert limiter.limit == 6
+
+
+def test_latency_well_above_the_baseline_backs_off_unless_untracked():
+    tracked = backup.AdaptiveLimiter("export", initial=4, minimum=1, maximum=4)
+    untracked = backup.AdaptiveLimiter("download", initial=4, minimum=1, maximum=4, track_latency=False)
+    for limiter in (tracked, untracked):
+        run_jobs(limiter, ["ok"] * 5, latency=1.0)
+        run_jobs(limiter, ["ok"], latency=30.0)
+
+    assert tracked.limit == 3
+    assert untracked.limit == 4
+
+
+def test_acquire_blocks_at_the_limit():
+    limiter = backup.AdaptiveLimiter("export", initial=1, minimum=1, maximum=1)
+    limiter.acquire()
+    entered = threading.Event()
+
+    def second():
+        limiter.acquire()
+        entered.set()
+
+    threading.Thread(target=second, daemon=True).start()
+    assert not entered.wait(0.2)
+    limiter.release(0.1, "ok")
+    assert entered.wait(2)
+
+
+def test_outcomes_classify_portal_load_separately_from_other_failures():
+    assert backup.classify_outcome([]) == "ok"
+    assert backup.classify_outcome(["Error code 429: Too Many Requests"]) == "throttled"
+    assert backup.classify_outcome(["HTTP 503 Service Unavailable"]) == "throttled"
+    assert backup.classify_outcome(["Item has no layers"]) == "error"
+
+
+def test_a_server_job_failing_in_the_poller_still_counts_against_the_export_stage():
+    limiter = backup.AdaptiveLimiter("export", initial=4, minimum=1, maximum=4)
+    job = backup.BackupJob("abc")
+    job.strategies = [backup.Strategy("export", None, "File Geodatabase"),
+                      backup.Strategy("download", None)]
+
+    next_stage = backup.resume_after_server_job(job, False, None, "HTTP 502 Bad Gateway", limiter)
+
+    assert next_stage == "export"
+    assert limiter.limit == 2
+
+
+def test_adaptive_flags_reach_the_backup_options():
+    args = backup.parse_args(["--csv", "ids.csv", "--dest", "out", "--adaptive", "--max-concurrency", "12"])
+    opts = backup.options_from_args(args)
+
+    assert opts.adaptive and opts.min_concurrency == 1 and opts.max_concurrency == 12
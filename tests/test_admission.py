@@ -0,0 +1,69 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+MB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def fast_recheck(monkeypatch):
+    monkeypatch.setattr(backup, "SPACE_RECHECK", 0.05)
+
+
+def make_admission(free_mb, floor_mb):
+    admission = backup.DiskAdmission(".", floor_mb * MB)
+    admission.free = lambda: free_mb * MB
+    return admission
+
+
+def make_job(name, written=0):
+    job = backup.BackupJob(name, SimpleNamespace(id=name, title=name))
+    job.sink = SimpleNamespace(disk_usage=lambda: written * MB)
+    return job
+
+
+def test_an_item_waits_for_space_until_a_running_item_releases_it():
+    admission = make_admission(free_mb=100, floor_mb=10)
+    first, second = make_job("first"), make_job("second")
+    assert admission.reserve(first, 60 * MB)[0]
+    admitted = threading.Event()
+
+    def reserve_second():
+        if admission.reserve(second, 60 * MB)[0]:
+            admitted.set()
+
+    threading.Thread(target=reserve_second, daemon=True).start()
+    assert not admitted.wait(0.2)
+    admission.release(first)
+    assert admitted.wait(2)
+
+
+def test_bytes_already_written_are_not_reserved_twice():
+    admission = make_admission(free_mb=100, floor_mb=10)
+    assert admission.reserve(make_job("running", written=50), 60 * MB)[0]
+
+    assert admission.outstanding() == 10 * MB
+    assert admission.reserve(make_job("next"), 70 * MB)[0]
+
+
+def test_an_item_that_can_never_fit_fails_on_its_own():
+    admission = make_admission(free_mb=100, floor_mb=10)
+
+    admitted, _, err = admission.reserve(make_job("huge"), 200 * MB)
+
+    assert not admitted and "Not enough disk space" in err
+
+
+def test_the_estimate_is_twice_the_larger_of_item_size_and_last_artifact(tmp_path):
+    catalog = backup.BackupCatalog(str(tmp_path))
+    artifact = tmp_path / "old.zip"
+    artifact.write_bytes(b"x" * (40 * MB))
+    catalog.record("a", "standard", 1, str(artifact), checksum="-")
+    try:
+        assert backup.estimate_backup_bytes(SimpleNamespace(id="a", size=10 * MB), catalog, "standard") == 80 * MB
+        assert backup.estimate_backup_bytes(SimpleNamespace(id="b", size=0), catalog, "standard") == backup.SPACE_MIN_ESTIMATE
+    finally:
+        catalog.close()
@@ -0,0 +1,46 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import backup
+
+
+class Item:
+    id = "item1"
+    title = "Parcels"
+    type = "Web Map"
+    resources = None
+
+    def get_data(self):
+        return {"layers": []}
+
+    def related_items(self, direction, rel_type=None):
+        if direction == "reverse":
+            raise RuntimeError("relationships unavailable")
+        return []
+
+    def download_thumbnail(self, save_folder):
+        raise RuntimeError("thumbnail not found")
+
+
+@pytest.fixture(params=["serial", "pooled"])
+def executor(request):
+    if request.param == "serial":
+        yield None
+        return
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def test_failed_calls_are_returned_and_written_to_the_backup_log(tmp_path, executor):
+    item = Item()
+    sink = backup.FolderSink(str(tmp_path))
+
+    errors = backup.capture_item_artifacts(item, sink, True, backup.ItemArtifacts(item), executor=executor)
+
+    assert sorted(err.split(":")[0] for err in errors) == ["relationships", "thumbnail"]
+    assert os.path.isfile(tmp_path / "Parcels_data.json")
+    assert not os.path.exists(tmp_path / "Parcels_relationships.json")
+    with open(tmp_path / "backup_log.txt", encoding="utf-8") as f:
+        assert f.read().count("CAPTURE_ERROR") == 2
@@ -0,0 +1,86 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+
+def make_item(item_id="item1", modified=1000, title="Parcels"):
+    return SimpleNamespace(id=item_id, title=title, type="Web Map", modified=modified)
+
+
+def write_artifact(dest, name, data=b"zip bytes"):
+    path = os.path.join(dest, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = backup.BackupCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+
+def run_incremental(catalog, dest, item, link_unchanged=False):
+    opts = backup.BackupOptions(dest_root=dest, catalog=catalog, incremental=True, link_unchanged=link_unchanged)
+    job = backup.BackupJob(item.id, item)
+    assert backup.stage_capture(job, None, opts) == "finalize"
+    backup.stage_finalize(job, None, opts)
+    return job
+
+
+def test_find_unchanged_needs_the_same_modified_and_an_intact_artifact(catalog, tmp_path):
+    path = write_artifact(str(tmp_path), "Parcels_1.zip")
+    catalog.record("item1", "standard", 1000, path)
+
+    assert catalog.find_unchanged(make_item(), "standard")["artifact_path"] == path
+    assert catalog.find_unchanged(make_item(modified=2000), "standard") is None
+    assert catalog.find_unchanged(make_item(), "ocm_per_item") is None
+
+    write_artifact(str(tmp_path), "Parcels_1.zip", b"short")
+    assert catalog.find_unchanged(make_item(), "standard") is None
+    os.remove(path)
+    assert catalog.find_unchanged(make_item(), "standard") is None
+
+
+def test_incremental_skips_an_unchanged_item(catalog, tmp_path):
+    path = write_artifact(str(tmp_path), "Parcels_1.zip")
+    catalog.record("item1", "standard", 1000, path)
+
+    job = run_incremental(catalog, str(tmp_path), make_item())
+
+    assert job.success and job.unchanged
+    assert job.path == path
+    assert catalog.lookup("item1", "standard")["artifact_path"] == path
+
+
+def test_link_unchanged_records_the_new_link_in_the_catalog(catalog, tmp_path):
+    old = write_artifact(str(tmp_path), "Parcels_1.zip")
+    catalog.record("item1", "standard", 1000, old)
+
+    job = run_incremental(catalog, str(tmp_path), make_item(), link_unchanged=True)
+
+    assert job.success and job.unchanged and job.path != old
+    assert os.path.samefile(job.path, old)
+    # The old artifact can now be pruned without losing the catalog's copy.
+    os.remove(old)
+    assert catalog.find_unchanged(make_item(), "standard")["artifact_path"] == job.path
+
+
+def test_links_within_the_same_second_get_a_suffix(tmp_path, monkeypatch):
+    old = write_artifact(str(tmp_path), "old.zip")
+
+    class FrozenDatetime(backup.datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2026, 1, 2, 3, 4, 5)
+
+    monkeypatch.setattr(backup.datetime, "datetime", FrozenDatetime)
+    first = backup.link_unchanged_artifact(str(tmp_path), "Parcels", old)
+    second = backup.link_unchanged_artifact(str(tmp_path), "Parcels", old)
+
+    assert os.path.basename(first) == "Parcels_20260102_030405.zip"
+    assert os.path.basename(second) == "Parcels_20260102_030405_2.zip"
@@ -0,0 +1,90 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+ITEM = SimpleNamespace(id="item1", title="Parcels", type="Feature Service", modified=1)
+CHUNK = 1024
+
+
+def make_backup(root, name, files):
+    backup_dir = os.path.join(root, name)
+    os.makedirs(backup_dir)
+    for file_name, data in files.items():
+        with open(os.path.join(backup_dir, file_name), "wb") as f:
+            f.write(data)
+    return backup_dir
+
+
+def refs(store):
+    return dict(store._conn.execute("SELECT hash, refs FROM chunks"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = backup.ChunkStore(str(tmp_path / "dest"), chunk_size=CHUNK)
+    yield store
+    store.close()
+
+
+def test_shared_chunks_are_stored_once_and_counted_per_manifest(store, tmp_path):
+    shared = b"s" * CHUNK
+    store.put_dir(make_backup(str(tmp_path), "Parcels_1", {"data.bin": shared + b"a" * CHUNK}), ITEM)
+    store.put_dir(make_backup(str(tmp_path), "Parcels_2", {"data.bin": shared + b"b" * CHUNK}), ITEM)
+
+    counts = refs(store)
+    assert len(counts) == 3
+    assert sorted(counts.values()) == [1, 1, 2]
+
+
+def test_prune_frees_only_chunks_nothing_references(store, tmp_path):
+    shared = b"s" * CHUNK
+    old = store.put_dir(make_backup(str(tmp_path), "Parcels_1", {"data.bin": shared + b"a" * CHUNK}), ITEM)
+    new = store.put_dir(make_backup(str(tmp_path), "Parcels_2", {"data.bin": shared + b"b" * CHUNK}), ITEM)
+
+    assert store.prune(keep_runs=1) == (1, 1)
+
+    assert not os.path.exists(old) and os.path.exists(new)
+    counts = refs(store)
+    assert sorted(counts.values()) == [1, 1]
+    assert counts[backup.hashlib.sha256(shared).hexdigest()] == 1
+    assert all(os.path.isfile(store.chunk_path(digest)) for digest in counts)
+    assert not os.path.exists(store.chunk_path(backup.hashlib.sha256(b"a" * CHUNK).hexdigest()))
+
+
+def test_cloned_manifest_keeps_chunks_alive_after_the_original_is_pruned(store, tmp_path):
+    original = store.put_dir(make_backup(str(tmp_path), "Parcels_1", {"data.bin": b"x" * (2 * CHUNK)}), ITEM)
+    clone = store.clone_manifest(original)
+    assert refs(store) == {backup.hashlib.sha256(b"x" * CHUNK).hexdigest(): 2}
+
+    store._drop_manifest(original)
+
+    assert os.path.exists(clone)
+    digest = backup.hashlib.sha256(b"x" * CHUNK).hexdigest()
+    assert refs(store) == {digest: 1}
+    assert os.path.isfile(store.chunk_path(digest))
+
+    assert store._drop_manifest(clone) == 1
+    assert refs(store) == {}
+    assert not os.path.exists(store.chunk_path(digest))
+
+
+def test_incremental_clone_is_recorded_so_prune_cannot_orphan_the_catalog(store, tmp_path):
+    dest = str(tmp_path / "dest")
+    original = store.put_dir(make_backup(str(tmp_path), "Parcels_1", {"data.bin": b"x" * CHUNK}), ITEM)
+    catalog = backup.BackupCatalog(dest)
+    try:
+        catalog.record(ITEM.id, "store", ITEM.modified, original)
+        opts = backup.BackupOptions(dest_root=dest, catalog=catalog, store=store, incremental=True, link_unchanged=True)
+        job = backup.BackupJob(ITEM.id, ITEM)
+        assert backup.stage_capture(job, None, opts) == "finalize"
+        backup.stage_finalize(job, None, opts)
+
+        assert job.unchanged and job.path != original
+        store.prune(keep_runs=1)
+        assert not os.path.exists(original)
+        assert catalog.find_unchanged(ITEM, "store")["artifact_path"] == job.path
+    finally:
+        catalog.close()
@@ -0,0 +1,79 @@
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+
+class Connection:
+    def __init__(self, layers):
+        self.layers = layers
+        self.calls = []
+
+    def get(self, url, params):
+        self.calls.append(url)
+        return self.layers
+
+
+def make_service(layers):
+    return SimpleNamespace(id="svc1", title="Parcels", type="Feature Service",
+                           url="https://services.example.com/arcgis/rest/services/Parcels/FeatureServer",
+                           _con=Connection(layers))
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = backup.BackupCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+
+@pytest.fixture
+def previous(tmp_path):
+    """A finished backup zip holding an export folder and a metadata member."""
+    sink = backup.ZipSink(str(tmp_path), "Parcels_old")
+    for name, data in (("Parcels.gdb/a0000001.gdbtable", b"rows"), ("Parcels.gdb/gdb", b"header")):
+        with sink.open_stream(name) as f:
+            f.write(data)
+    sink.write_json("item.json", {"title": "Parcels"})
+    _, path, _ = sink.close()
+    return path
+
+
+def test_the_data_version_is_the_sorted_layer_stamps_from_one_request():
+    service = make_service({"layers": [{"id": 1, "serverGen": 9}, {"id": 0, "editingInfo": {"lastEditDate": 5}}]})
+
+    assert backup.feature_data_version(service) == '{"0": 5, "1": 9}'
+    assert len(service._con.calls) == 1
+    assert backup.feature_data_version(make_service({"layers": [{"id": 0}]})) is None
+
+
+def test_unchanged_data_is_copied_from_the_previous_backup(tmp_path, catalog, previous):
+    catalog.record_data("svc1", "standard", '{"0": 5}', ["Parcels.gdb/"], "Exported as File Geodatabase.", previous)
+    opts = backup.BackupOptions(dest_root=str(tmp_path), catalog=catalog)
+    job = backup.BackupJob("svc1", make_service({}))
+    job.sink = backup.ZipSink(str(tmp_path), "Parcels_new")
+    job.data_version = '{"0": 5}'
+
+    assert backup.reuse_unchanged_data(job, opts)
+    _, path, _ = job.sink.close()
+
+    with zipfile.ZipFile(path) as zf:
+        assert sorted(zf.namelist()) == ["Parcels_new/Parcels.gdb/a0000001.gdbtable", "Parcels_new/Parcels.gdb/gdb"]
+    assert job.data_ok and job.data_members == ["Parcels.gdb/"]
+
+
+def test_changed_stamps_or_missing_members_mean_a_fresh_export(tmp_path, catalog, previous):
+    opts = backup.BackupOptions(dest_root=str(tmp_path), catalog=catalog)
+    job = backup.BackupJob("svc1", make_service({}))
+    job.sink = backup.ZipSink(str(tmp_path), "Parcels_new")
+
+    catalog.record_data("svc1", "standard", '{"0": 5}', ["Parcels.gdb/"], "Exported.", previous)
+    job.data_version = '{"0": 6}'
+    assert not backup.reuse_unchanged_data(job, opts)
+
+    catalog.record_data("svc1", "standard", '{"0": 6}', ["Parcels_replica.gdb.zip"], "Replica.", previous)
+    assert not backup.reuse_unchanged_data(job, opts)
+    assert not job.data_ok
+    job.sink.close()
@@ -0,0 +1,111 @@
+import os
+import threading
+import zipfile
+
+import pytest
+
+import backup
+
+PAYLOAD = bytes(range(256)) * 40
+
+
+class FakeResponse:
+    def __init__(self, status_code, body, headers=None, drop_after=None, dropped=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.drop_after = drop_after
+        self.dropped = dropped
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), 100):
+            if self.drop_after is not None and i >= self.drop_after:
+                raise self.dropped("connection reset")
+            yield self.body[i:i + 100]
+
+
+class FakeServer:
+    """Serves PAYLOAD, honours Range when `ranged`, and drops the first full GET part-way through."""
+
+    def __init__(self, dropped, ranged=True, drop_after=None):
+        self.dropped = dropped
+        self.ranged = ranged
+        self.drop_after = drop_after
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, stream=False, timeout=None):
+        header = (headers or {}).get("Range")
+        with self.lock:
+            self.requests.append(header)
+            drop = self.drop_after if header is None or header == "bytes=0-" else None
+            if drop is not None:
+                self.drop_after = None
+        if not header or not self.ranged:
+            return FakeResponse(200, PAYLOAD, {"Content-Length": str(len(PAYLOAD))}, drop, self.dropped)
+        start, _, end = header[len("bytes="):].partition("-")
+        start, end = int(start), (int(end) if end else len(PAYLOAD) - 1)
+        if start >= len(PAYLOAD):
+            return FakeResponse(416, b"")
+        return FakeResponse(206, PAYLOAD[start:end + 1],
+                            {"Content-Range": f"bytes {start}-{end}/{len(PAYLOAD)}"}, drop, self.dropped)
+
+    def close(self):
+        pass
+
+
+def downloader(server, segments=1):
+    dl = backup.HttpDownloader(segments=segments)
+    dl.session = server
+    return dl
+
+
+def transient():
+    return backup.HttpDownloader()._transient[0]
+
+
+def test_a_dropped_stream_resumes_with_range_into_the_member(tmp_path):
+    server = FakeServer(transient(), drop_after=1500)
+    sink = backup.ZipSink(str(tmp_path), "Parcels_1")
+
+    size = downloader(server).fetch_into("https://host/replica", sink, "replica.zip")
+    ok, path, _ = sink.close()
+
+    assert ok and size == len(PAYLOAD)
+    assert server.requests == ["bytes=0-0", None, "bytes=1500-"]
+    with zipfile.ZipFile(path) as zf:
+        assert zf.read("Parcels_1/replica.zip") == PAYLOAD
+
+
+def test_a_drop_without_range_support_fails_and_leaves_no_file(tmp_path):
+    server = FakeServer(transient(), ranged=False, drop_after=1500)
+    sink = backup.FolderSink(str(tmp_path))
+
+    with pytest.raises(server.dropped):
+        downloader(server).fetch_into("https://host/data", sink, "data.bin")
+
+    assert not os.path.exists(tmp_path / "data.bin")
+
+
+def test_large_files_are_fetched_as_parallel_ranges_and_joined(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "SEGMENT_MIN_SIZE", 1000)
+    server = FakeServer(transient())
+    sink = backup.FolderSink(str(tmp_path))
+    sink.scratch_dir = str(tmp_path / "scratch")
+
+    size = downloader(server, segments=4).fetch_into("https://host/export", sink, "export.zip")
+
+    assert size == len(PAYLOAD)
+    assert (tmp_path / "export.zip").read_bytes() == PAYLOAD
+    assert len([r for r in server.requests if r and r != "bytes=0-0"]) == 4
+    assert os.listdir(tmp_path / "scratch") == []
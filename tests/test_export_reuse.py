@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+
+class Connection:
+    def __init__(self, layers):
+        self.layers = layers
+        self.calls = []
+
+    def get(self, url, params):
+        self.calls.append(url)
+        if isinstance(self.layers, Exception):
+            raise self.layers
+        return self.layers
+
+
+def make_service(layers, modified=1000):
+    return SimpleNamespace(id="svc1", title="Parcels", type="Feature Service", modified=modified,
+                           url="https://services.example.com/arcgis/rest/services/Parcels/FeatureServer",
+                           _con=Connection(layers))
+
+
+class Content:
+    def __init__(self, items):
+        self.items = items
+
+    def get(self, item_id):
+        return self.items.get(item_id)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = backup.BackupCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+
+@pytest.fixture(autouse=True)
+def no_retries(monkeypatch):
+    monkeypatch.setattr(backup.retry_engine, "attempts", 0)
+
+
+def test_edit_stamps_come_from_one_layers_request():
+    service = make_service({"layers": [{"id": 0, "editingInfo": {"lastEditDate": 5}}],
+                            "tables": [{"id": 1, "serverGen": 7}]})
+
+    assert backup.layer_edit_stamps(service) == {"0": 5, "1": 7}
+    assert service._con.calls == [service.url + "/layers"]
+
+
+@pytest.mark.parametrize("layers", [
+    {"layers": [{"id": 0, "editingInfo": {"lastEditDate": 5}}, {"id": 1}]},
+    RuntimeError("Invalid token"),
+])
+def test_unreadable_stamps_give_no_source_version(layers):
+    assert backup.source_version(make_service(layers)) is None
+
+
+def test_a_matching_export_is_reused_and_a_changed_source_evicts_it(catalog):
+    service = make_service({"layers": [{"id": 0, "editingInfo": {"lastEditDate": 5}}]})
+    export = SimpleNamespace(id="exp1", deleted=False)
+    export.delete = lambda: setattr(export, "deleted", True)
+    gis = SimpleNamespace(content=Content({"exp1": export}))
+    catalog.record_export("svc1", "File Geodatabase", backup.source_version(service), "exp1")
+
+    found, _ = backup.cached_export_item(gis, catalog, service, "File Geodatabase", 30)
+    assert found is export
+
+    service._con.layers["layers"][0]["editingInfo"]["lastEditDate"] = 6
+    found, version = backup.cached_export_item(gis, catalog, service, "File Geodatabase", 30)
+    assert found is None and version is not None
+    assert export.deleted
+    assert catalog.cached_export("svc1", "File Geodatabase") is None
+
+
+def test_an_export_is_not_reused_or_kept_when_stamps_cannot_be_read(catalog):
+    service = make_service({"layers": [{"id": 0}]})
+    gis = SimpleNamespace(content=Content({}))
+    catalog.record_export("svc1", "File Geodatabase", "1000:{}", "exp1")
+
+    found, version = backup.cached_export_item(gis, catalog, service, "File Geodatabase", 30)
+
+    assert found is None and version is None
+    job = backup.BackupJob("svc1", service)
+    job.export_version = version
+    assert not backup.keep_export(job, backup.BackupOptions(dest_root="", reuse_exports=True))
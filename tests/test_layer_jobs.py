@@ -0,0 +1,113 @@
+import json
+import threading
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+
+class Properties(dict):
+    __getattr__ = dict.__getitem__
+
+
+class Replica(backup.ServerJob):
+    def __init__(self, lid):
+        super().__init__(f"layer {lid}")
+        self.state = ("pending", None, None)
+
+    def poll(self):
+        return self.state
+
+
+def make_service(count):
+    layers = [SimpleNamespace(properties=Properties(id=i, name=f"L{i}")) for i in range(count)]
+    return SimpleNamespace(id="svc1", title="Parcels", url="https://services.example.com/FeatureServer",
+                           layers=layers, tables=[])
+
+
+@pytest.fixture(autouse=True)
+def fast_polls(monkeypatch):
+    monkeypatch.setattr(backup, "POLL_INTERVAL", 0.0)
+
+
+def settle(job):
+    """check() until nothing is waiting on a submission thread; returns the last state."""
+    while True:
+        state = job.check()
+        if state[0] != "pending" or not job.submitting:
+            return state
+        for future in list(job.submitting.values()):
+            future.result()
+
+
+def test_layer_replicas_take_free_server_slots_off_the_poller_thread(monkeypatch):
+    replicas, threads = {}, []
+
+    def request_replica(item, layer_ids, name):
+        threads.append(threading.current_thread().name)
+        replicas[layer_ids[0]] = Replica(layer_ids[0])
+        return True, replicas[layer_ids[0]], None
+
+    monkeypatch.setattr(backup, "request_replica", request_replica)
+    poller = backup.ExportPoller(3)
+    poller.acquire()  # the export worker's slot
+    job = backup.LayerSetJob(make_service(4), ["0", "1", "2", "3"], parallel=4, poller=poller)
+
+    assert settle(job)[0] == "pending"
+    assert sorted(job.running) == ["0", "1", "2"] and job.queue == ["3"]
+    assert not poller.try_acquire()
+    assert all(name.startswith("layer-submit") for name in threads)
+
+    for lid in ("0", "1", "2"):
+        replicas[lid].state = ("done", f"https://result/{lid}", None)
+    settle(job)
+    replicas["3"].state = ("done", "https://result/3", None)
+    state, results, err = settle(job)
+
+    assert state == "done" and err is None
+    assert results == {lid: f"https://result/{lid}" for lid in ("0", "1", "2", "3")}
+    assert [poller.try_acquire() for _ in range(3)] == [True, True, False]
+
+
+def test_a_failed_layer_is_resubmitted_alone_until_its_retries_run_out(monkeypatch):
+    calls = []
+
+    def request_replica(item, layer_ids, name):
+        calls.append(layer_ids[0])
+        if layer_ids[0] == "1":
+            return False, None, "Replica failed: layer is locked"
+        return True, backup.CompletedJob(f"https://result/{layer_ids[0]}"), None
+
+    monkeypatch.setattr(backup, "request_replica", request_replica)
+    job = backup.LayerSetJob(make_service(2), ["0", "1"], retries=1)
+
+    state = settle(job)
+    while state[0] == "pending":
+        state = settle(job)
+
+    assert state[0] == "failed" and "Layer 1 of Parcels failed after 2 attempt(s)" in state[2]
+    assert calls.count("0") == 1 and calls.count("1") == 2
+
+
+def test_layer_replicas_download_in_parallel_into_one_archive(tmp_path):
+    both_running = threading.Barrier(2, timeout=5)
+
+    class Downloader:
+        def fetch(self, url, path):
+            both_running.wait()  # only returns once the other layer is downloading too
+            with open(path, "wb") as f:
+                f.write(url.encode())
+
+    sink = backup.ZipSink(str(tmp_path), "Parcels_1")
+    results = {"0": "https://result/0", "1": "https://result/1"}
+
+    ok, name, err = backup.download_layer_replicas(make_service(2), results, sink, Downloader(), workers=2)
+    _, path, _ = sink.close()
+
+    assert ok and err is None and name == "Parcels_layers.json"
+    with zipfile.ZipFile(path) as zf:
+        assert zf.read("Parcels_1/Parcels_layers/layer_1.gdb.zip") == b"https://result/1"
+        manifest = json.loads(zf.read("Parcels_1/Parcels_layers.json"))
+    assert [entry["name"] for entry in manifest["layers"]] == ["L0", "L1"]
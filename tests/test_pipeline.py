@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+import backup
+
+WORKERS = {stage: 1 for stage in backup.STAGE_ORDER}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Replace every stage handler with one that records the visit and moves on."""
+    visits = []
+    lock = threading.Lock()
+
+    def make(stage):
+        def handler(job, gis, opts):
+            with lock:
+                visits.append((job.item_id, stage))
+            if stage == "finalize":
+                if not job.message:
+                    job.finish(True, None, "ok")
+                return None
+            return backup.STAGE_ORDER[backup.STAGE_ORDER.index(stage) + 1]
+        return handler
+
+    for stage in backup.STAGE_ORDER:
+        monkeypatch.setitem(backup.STAGE_HANDLERS, stage, make(stage))
+    return visits
+
+
+def pipeline(queue_size=1):
+    return backup.BackupPipeline(None, backup.BackupOptions(dest_root="."), WORKERS, queue_size=queue_size)
+
+
+def test_every_job_passes_through_the_stages_in_order(stages):
+    jobs = pipeline(queue_size=2).run([f"id{n}" for n in range(10)])
+
+    assert [job.item_id for job in jobs] == [f"id{n}" for n in range(10)]
+    assert all(job.success for job in jobs)
+    for job in jobs:
+        assert [stage for item_id, stage in stages if item_id == job.item_id] == list(backup.STAGE_ORDER)
+
+
+def test_handing_a_job_back_to_an_earlier_stage_does_not_deadlock(stages, monkeypatch):
+    retried = set()
+
+    def download(job, gis, opts):
+        if job.item_id not in retried:
+            retried.add(job.item_id)
+            return "export"  # strategy fallback
+        return "compress"
+
+    monkeypatch.setitem(backup.STAGE_HANDLERS, "download", download)
+    jobs = pipeline(queue_size=1).run([f"id{n}" for n in range(6)])
+
+    assert all(job.success for job in jobs)
+    assert retried == {f"id{n}" for n in range(6)}
+
+
+def test_a_stalled_stage_holds_back_the_stages_before_it(stages, monkeypatch):
+    release = threading.Event()
+    compress = backup.STAGE_HANDLERS["compress"]
+
+    def stalled_compress(job, gis, opts):
+        release.wait()
+        return compress(job, gis, opts)
+
+    monkeypatch.setitem(backup.STAGE_HANDLERS, "compress", stalled_compress)
+    captured = lambda: sum(1 for _, stage in stages if stage == "capture")
+    result = []
+    runner = threading.Thread(target=lambda: result.extend(pipeline(queue_size=1).run([f"id{n}" for n in range(20)])))
+    runner.start()
+    try:
+        # One job held by each of the capture, export, download and compress
+        # workers, plus one queued in front of export, download and compress.
+        assert wait_for(lambda: captured() == 7)
+        time.sleep(0.2)
+        assert captured() == 7
+    finally:
+        release.set()
+        runner.join(timeout=10)
+
+    assert len(result) == 20 and all(job.success for job in result)
+
+
+def test_a_stage_that_raises_fails_only_that_job(stages, monkeypatch):
+    export = backup.STAGE_HANDLERS["export"]
+
+    def export_or_raise(job, gis, opts):
+        if job.item_id == "bad":
+            raise RuntimeError("boom")
+        return export(job, gis, opts)
+
+    monkeypatch.setitem(backup.STAGE_HANDLERS, "export", export_or_raise)
+    jobs = {job.item_id: job for job in pipeline().run(["a", "bad", "b"])}
+
+    assert jobs["a"].success and jobs["b"].success
+    assert not jobs["bad"].success and "boom" in jobs["bad"].message
@@ -0,0 +1,65 @@
+import queue
+
+import backup
+
+
+class Job(backup.ServerJob):
+    def __init__(self, label, states):
+        super().__init__(label)
+        self.states = list(states)
+
+    def poll(self):
+        return self.states.pop(0)
+
+
+class BrokenJob(Job):
+    def check(self):
+        raise RuntimeError("status check blew up")
+
+
+def backup_job(item_id):
+    job = backup.BackupJob(item_id)
+    job.strategies = [backup.Strategy("replica", None), backup.Strategy("download", None)]
+    return job
+
+
+def run_poller(tracked, max_jobs=4):
+    settled = queue.Queue()
+    poller = backup.ExportPoller(max_jobs)
+    poller.start(lambda job, next_stage: settled.put((job.item_id, next_stage)))
+    try:
+        for job, server_job in tracked:
+            poller.acquire()
+            poller.track(job, server_job)
+        return dict(settled.get(timeout=5) for _ in tracked), poller
+    finally:
+        poller.stop()
+
+
+def test_settled_jobs_go_to_the_next_stage_and_free_their_slot(monkeypatch):
+    monkeypatch.setattr(backup, "POLL_INTERVAL", 0.01)
+    done = backup_job("done")
+    failed = backup_job("failed")
+
+    routed, poller = run_poller([
+        (done, Job("ok", [("pending", None, None), ("done", "https://result", None)])),
+        (failed, Job("bad", [("failed", None, "Replica failed")])),
+    ], max_jobs=2)
+
+    assert routed == {"done": "download", "failed": "export"}
+    assert done.pending == "https://result"
+    assert failed.strategy.kind == "download" and failed.last_error == "Replica failed"
+    assert all(poller._slots.acquire(blocking=False) for _ in range(2))
+
+
+def test_a_job_whose_check_raises_fails_alone():
+    broken = backup_job("broken")
+    healthy = backup_job("healthy")
+
+    routed, _ = run_poller([
+        (broken, BrokenJob("broken", [])),
+        (healthy, Job("healthy", [("done", "https://result", None)])),
+    ])
+
+    assert routed == {"broken": "export", "healthy": "download"}
+    assert "status check blew up" in broken.last_error
@@ -0,0 +1,116 @@
+import json
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+SERVICE_URL = "https://services.example.com/arcgis/rest/services/Parcels/FeatureServer"
+FIELDS = [
+    {"name": "OBJECTID", "type": "esriFieldTypeOID"},
+    {"name": "_geometry", "type": "esriFieldTypeString"},
+    {"name": "AREA", "type": "esriFieldTypeDouble"},
+]
+
+
+class Properties(dict):
+    __getattr__ = dict.__getitem__
+
+
+class Connection:
+    """Answers query, statistics and attachment requests for one layer of rows."""
+
+    def __init__(self, rows, tmp_path, stats=True):
+        self.rows = rows
+        self.tmp_path = tmp_path
+        self.stats = stats
+        self.queries = []
+
+    def post(self, url, params):
+        endpoint = url.rsplit("/", 1)[1]
+        if "outStatistics" in params:
+            if not self.stats:
+                raise RuntimeError("statistics not supported")
+            oids = [r["OBJECTID"] for r in self.rows]
+            return {"features": [{"attributes": {"OID_MIN": min(oids), "OID_MAX": max(oids), "OID_COUNT": len(oids)}}]}
+        if params.get("returnCountOnly"):
+            return {"count": len(self.rows)}
+        if endpoint == "queryAttachments":
+            return {"attachmentGroups": [{"parentObjectId": 1, "attachmentInfos": [
+                {"id": 9, "name": "photo.jpg", "contentType": "image/jpeg"}]}]}
+        self.queries.append(params)
+        if "resultOffset" in params:
+            page = self.rows[params["resultOffset"]:params["resultOffset"] + params["resultRecordCount"]]
+        else:
+            low, high = [int(part.split()[-1]) for part in params["where"].split(" AND ")]
+            page = [r for r in self.rows if low <= r["OBJECTID"] < high]
+        return {"features": [{"attributes": r, "geometry": {"x": r["OBJECTID"], "y": 0}} for r in page]}
+
+    def get(self, url, params, try_json=False, out_folder=None, file_name=None):
+        path = self.tmp_path / file_name
+        path.write_bytes(b"\xff" * (3 * backup.DOWNLOAD_CHUNK_SIZE // 2))
+        return str(path)
+
+
+def make_service(tmp_path, rows, stats=True, attachments=False):
+    props = Properties(id=0, name="Parcels", fields=FIELDS, objectIdField="OBJECTID", maxRecordCount=2,
+                       geometryType="esriGeometryPoint", hasAttachments=attachments,
+                       extent={"spatialReference": {"wkid": 4326}})
+    layer = SimpleNamespace(properties=props, url=SERVICE_URL + "/0")
+    return SimpleNamespace(id="svc1", title="Parcels", url=SERVICE_URL, layers=[layer], tables=[],
+                           _con=Connection(rows, tmp_path, stats))
+
+
+@pytest.fixture(autouse=True)
+def no_retries(monkeypatch, tmp_path):
+    monkeypatch.setattr(backup.retry_engine, "attempts", 0)
+    (tmp_path / "out").mkdir()
+
+
+def rows(*oids):
+    return [{"OBJECTID": oid, "_geometry": f"field {oid}", "AREA": oid * 1.5} for oid in oids]
+
+
+def open_extract(tmp_path):
+    return sqlite3.connect(tmp_path / "out" / "Parcels_features.sqlite")
+
+
+def test_dense_ids_are_paged_by_range_and_the_geometry_column_avoids_the_fields(tmp_path):
+    service = make_service(tmp_path, rows(1, 2, 3, 4, 5))
+
+    ok, name, err = backup.extract_features(service, str(tmp_path / "out"), workers=2)
+
+    assert ok and err is None and name == "Parcels_features.sqlite"
+    assert all("resultOffset" not in q for q in service._con.queries) and len(service._con.queries) == 3
+    conn = open_extract(tmp_path)
+    table, column, count = conn.execute("SELECT table_name, geometry_column, feature_count FROM _layers").fetchone()
+    assert column == "__geometry" and count == 5
+    row = conn.execute(f'SELECT "_geometry", "{column}" FROM {table} WHERE OBJECTID = 3').fetchone()
+    assert row[0] == "field 3" and json.loads(row[1]) == {"x": 3, "y": 0}
+    conn.close()
+
+
+def test_sparse_ids_or_missing_statistics_fall_back_to_offset_pages(tmp_path):
+    for service in (make_service(tmp_path, rows(1, 500, 1000)),
+                    make_service(tmp_path, rows(1, 2, 3), stats=False)):
+        ok, _, _ = backup.extract_features(service, str(tmp_path / "out"))
+
+        assert ok
+        assert [q["resultOffset"] for q in service._con.queries] == [0, 2]
+        conn = open_extract(tmp_path)
+        assert conn.execute("SELECT COUNT(*) FROM layer_0").fetchone()[0] == 3
+        conn.close()
+
+
+def test_attachments_are_copied_into_their_blob_in_full(tmp_path):
+    service = make_service(tmp_path, rows(1), attachments=True)
+
+    ok, _, _ = backup.extract_features(service, str(tmp_path / "out"), attachments=True)
+
+    assert ok
+    conn = open_extract(tmp_path)
+    name, data = conn.execute("SELECT name, data FROM _attachments").fetchone()
+    assert name == "photo.jpg" and data == b"\xff" * (3 * backup.DOWNLOAD_CHUNK_SIZE // 2)
+    conn.close()
+    assert not (tmp_path / "1_9").exists()
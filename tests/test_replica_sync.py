@@ -0,0 +1,127 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+SERVICE_URL = "https://services.example.com/arcgis/rest/services/Parcels/FeatureServer"
+GENS = [{"id": 0, "serverGen": 42}]
+
+
+class Connection:
+    def __init__(self):
+        self.posts = []
+
+    def get(self, url, params):
+        if url == SERVICE_URL:
+            return {"syncEnabled": True}
+        if url.endswith("/replicas"):
+            return [{"replicaName": "other", "replicaID": "r0"}, {"replicaName": "Parcels_sync", "replicaID": "r1"}]
+        if "/replicas/" in url:
+            return {"layerServerGens": GENS}
+        raise AssertionError(url)
+
+    def post(self, url, params):
+        self.posts.append((url.rsplit("/", 1)[1], params))
+        return {}
+
+
+def make_service():
+    return SimpleNamespace(id="svc1", title="Parcels", type="Feature Service", url=SERVICE_URL, _con=Connection())
+
+
+def make_job(item):
+    job = backup.BackupJob(item.id, item)
+    job.strategies = [backup.Strategy("replica", item), backup.Strategy("download", item)]
+    return job
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = backup.BackupCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+
+@pytest.fixture
+def opts(tmp_path, catalog):
+    return backup.BackupOptions(dest_root=str(tmp_path), catalog=catalog, replica_sync=True, sync_full_every=2)
+
+
+def kinds(job):
+    return [s.kind for s in job.strategies]
+
+
+def test_the_first_run_puts_a_registered_baseline_replica_first(opts):
+    job = make_job(make_service())
+
+    backup.plan_sync(job, opts)
+
+    assert kinds(job) == ["sync_baseline", "replica", "download"]
+
+
+def test_a_recorded_chain_pulls_a_delta_until_it_is_long_enough(opts, catalog, tmp_path):
+    (tmp_path / "base.zip").write_bytes(b"zip")
+    catalog.record_sync("svc1", "r1", GENS, ["base.zip"])
+    job = make_job(make_service())
+
+    backup.plan_sync(job, opts)
+    assert kinds(job) == ["sync", "replica", "download"]
+
+    catalog.record_sync("svc1", "r1", GENS, ["base.zip", "d1.zip", "d2.zip"])
+    item = make_service()
+    job = make_job(item)
+    backup.plan_sync(job, opts)
+    assert kinds(job) == ["sync_baseline", "replica", "download"]
+    assert item._con.posts[0] == ("unRegisterReplica", {"f": "json", "replicaID": "r1"})
+
+
+def test_a_baseline_records_the_generations_of_its_own_replica(opts, tmp_path, monkeypatch):
+    item = make_service()
+    job = make_job(item)
+    job.sink = backup.FolderSink(str(tmp_path))
+    monkeypatch.setattr(backup, "download_replica", lambda *args, **kwargs: (True, "Parcels_replica.gdb.zip", None))
+
+    ok, name, err = backup.save_sync_baseline(job, item, backup.Strategy("sync_baseline", item, label="Parcels_sync"), opts)
+
+    assert ok and err is None
+    assert job.sync_update == {"kind": "baseline", "replica_id": "r1", "layer_server_gens": GENS}
+    assert json.loads((tmp_path / backup.SYNC_CHAIN_FILE).read_text())["replica_id"] == "r1"
+
+
+def test_a_delta_is_stored_with_its_chain(opts, tmp_path):
+    item = make_service()
+    job = make_job(item)
+    job.sink = backup.FolderSink(str(tmp_path))
+    job.sync_state = {"replica_id": "r1", "layer_server_gens": GENS, "chain": ["base.zip", "d1.zip"], "baseline_at": None}
+    job.pending = {"edits": [{"id": 0, "features": {"adds": [{}, {}], "deleteIds": [7]}}],
+                   "layerServerGens": [{"id": 0, "serverGen": 50}]}
+
+    ok, name, err = backup.save_sync_delta(job, item, opts)
+
+    assert ok and name == "Parcels_delta_2.json"
+    assert json.loads((tmp_path / name).read_text())["edits"][0]["features"]["deleteIds"] == [7]
+    chain = json.loads((tmp_path / backup.SYNC_CHAIN_FILE).read_text())
+    assert chain["baseline"] == "base.zip" and chain["deltas"] == ["d1.zip"] and chain["generation"] == 2
+    assert job.sync_update["layer_server_gens"] == [{"id": 0, "serverGen": 50}]
+    with open(os.path.join(tmp_path, "backup_log.txt"), encoding="utf-8") as f:
+        assert "REPLICA_DELTA: Parcels (3 edits)" in f.read()
+
+
+def test_a_delta_behind_a_result_url_is_buffered_and_parsed(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup.retry_engine, "attempts", 0)
+    delta = {"edits": [], "layerServerGens": GENS}
+
+    class Downloader:
+        def fetch_into(self, url, sink, name):
+            with sink.open_stream(name) as out:
+                out.write(json.dumps(delta).encode())
+            return sink.member_size(name)
+
+    sink = backup.FolderSink(str(tmp_path))
+    parsed = backup.download_sync_delta(make_service(), "https://host/result.json", sink, Downloader(), "d.json")
+
+    assert parsed == delta
+    assert json.loads((tmp_path / "d.json").read_text()) == delta
@@ -0,0 +1,86 @@
+import pytest
+
+import retrying
+
+
+class Flaky:
+    """Raises the given errors in turn, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def engine():
+    return retrying.RetryEngine(attempts=3, base_delay=0.0, breaker_threshold=100, log=lambda msg: None)
+
+
+def test_idempotent_call_is_retried_after_a_transient_error(engine):
+    fn = Flaky(TimeoutError("read timed out"), RuntimeError("504 Gateway Timeout"))
+    assert engine.call("host", fn) == "ok"
+    assert fn.calls == 3
+
+
+def test_non_idempotent_call_is_not_retried_after_a_transient_error(engine):
+    fn = Flaky(RuntimeError("504 Gateway Timeout"))
+    with pytest.raises(RuntimeError):
+        engine.call("host", fn, idempotent=False)
+    assert fn.calls == 1
+
+
+def test_non_idempotent_call_is_retried_when_the_server_refused_it(engine):
+    fn = Flaky(RuntimeError("429 Too Many Requests"), ConnectionRefusedError("connection refused"))
+    assert engine.call("host", fn, idempotent=False) == "ok"
+    assert fn.calls == 3
+
+
+def test_request_errors_are_not_retried(engine):
+    fn = Flaky(RuntimeError("Invalid token"))
+    with pytest.raises(RuntimeError):
+        engine.call("host", fn)
+    assert fn.calls == 1
+
+
+def test_retries_stop_after_the_configured_attempts(engine):
+    fn = Flaky(*[RuntimeError("503 Service Unavailable")] * 5)
+    with pytest.raises(RuntimeError):
+        engine.call("host", fn)
+    assert fn.calls == 4
+
+
+def test_a_host_that_keeps_failing_is_paused_without_blocking_other_hosts():
+    engine = retrying.RetryEngine(attempts=0, breaker_threshold=2, breaker_cooldown=60.0, log=lambda msg: None)
+    down = Flaky(*[RuntimeError("502 Bad Gateway")] * 5)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            engine.call("down", down)
+
+    with pytest.raises(retrying.CircuitOpenError):
+        engine.call("down", down)
+    assert down.calls == 2
+    assert engine.call("up", Flaky()) == "ok"
+
+
+def test_a_successful_trial_call_closes_the_breaker():
+    breaker = retrying.CircuitBreaker(threshold=1, cooldown=0.0)
+    assert breaker.failure()
+
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial call at a time
+    breaker.success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_messages_are_classified_like_exceptions():
+    assert retrying.is_transient_message("HTTP 429 Too Many Requests")
+    assert retrying.is_transient_message("Read timed out")
+    assert retrying.is_transient_message("Circuit open for host; not calling export")
+    assert not retrying.is_transient_message("Item does not exist")
+    assert not retrying.is_transient_message(None)
@@ -0,0 +1,102 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import scan
+
+MODIFIED = 1_700_000_000_000
+
+
+class Content:
+    def __init__(self, items):
+        self.items = items
+        self.queries = []
+
+    def advanced_search(self, query, start, max_items, sort_field, sort_order, as_dict):
+        self.queries.append(query)
+        return {"total": len(self.items), "results": self.items[start - 1:start - 1 + max_items]}
+
+
+def make_gis(items):
+    return SimpleNamespace(url="https://org.example.com/portal", properties=SimpleNamespace(id="org1"),
+                           content=Content(items))
+
+
+@pytest.fixture
+def out_file(tmp_path):
+    """An existing inventory, so an unchanged scan does not re-export it."""
+    path = tmp_path / "out.csv"
+    path.write_text("Id\nitem1\n", encoding="utf-8")
+    return str(path)
+
+
+def make_store(tmp_path, out_file, **meta):
+    """A store that already holds item1 at MODIFIED, with the given meta values."""
+    index_file = str(tmp_path / "scan_index.sqlite")
+    conn = scan.OpenScanStore(index_file, out_file)
+    with conn:
+        scan.UpsertItems(conn, [scan.GetItemDetails(make_gis([]), {"id": "item1", "modified": MODIFIED})], MODIFIED)
+        for key, value in meta.items():
+            scan.SetMeta(conn, key, value)
+    conn.close()
+    return index_file
+
+
+def read_meta(index_file):
+    conn = scan.OpenScanStore(index_file, "")
+    try:
+        return {key: int(scan.GetMeta(conn, key, 0)) for key in ("high_water", "last_full_sweep")}
+    finally:
+        conn.close()
+
+
+def unchanged_items():
+    return [{"id": "item1", "contentStatus": "org_authoritative", "modified": MODIFIED},
+            {"id": "item2", "contentStatus": "", "modified": MODIFIED + 5}]
+
+
+def test_between_full_sweeps_only_items_modified_since_the_mark_are_asked_for(tmp_path, out_file):
+    last_full = int(time.time() * 1000) - 3600 * 1000
+    index_file = make_store(tmp_path, out_file, high_water=MODIFIED, last_full_sweep=last_full)
+    gis = make_gis(unchanged_items())
+
+    scan.GenerateInventory(gis, out_file, index_file)
+
+    assert f"modified:[{MODIFIED - scan.DELTA_OVERLAP_MS:019d} TO " in gis.content.queries[0]
+    assert read_meta(index_file) == {"high_water": MODIFIED, "last_full_sweep": last_full}
+
+
+def test_a_full_sweep_runs_when_it_is_due_and_records_itself(tmp_path, out_file):
+    index_file = make_store(tmp_path, out_file, high_water=MODIFIED,
+                            last_full_sweep=int(time.time() * 1000) - 8 * 86400000)
+    gis = make_gis(unchanged_items())
+
+    scan.GenerateInventory(gis, out_file, index_file, full_every_days=7)
+
+    assert "modified:" not in gis.content.queries[0]
+    assert time.time() * 1000 - read_meta(index_file)["last_full_sweep"] < 60000
+
+
+def test_a_scan_cut_short_by_max_leaves_the_mark_alone(tmp_path, out_file):
+    index_file = make_store(tmp_path, out_file, high_water=MODIFIED - 1, last_full_sweep=0)
+
+    scan.GenerateInventory(make_gis(unchanged_items()), out_file, index_file, max_items=1)
+
+    assert read_meta(index_file) == {"high_water": MODIFIED - 1, "last_full_sweep": 0}
+
+
+def test_a_legacy_csv_index_is_imported_once_with_the_last_inventory_row_winning(tmp_path):
+    (tmp_path / "scan_index.csv").write_text(f"id,mod\nitem1,{MODIFIED}\n", encoding="utf-8")
+    inventory = tmp_path / "out.csv"
+    inventory.write_text("Title,Id,Created,Modified\nOld,item1,2023-11-14 22:13:20,\nNew,item1,2023-11-14 22:13:20,\n",
+                         encoding="utf-8")
+
+    conn = scan.OpenScanStore(str(tmp_path / "scan_index.csv"), str(inventory))
+    try:
+        assert scan.LoadIndex(conn) == {"item1": MODIFIED}
+        assert conn.execute("SELECT title, created FROM items").fetchall() == [("New", MODIFIED)]
+        assert scan.GetMeta(conn, "high_water") is None
+    finally:
+        conn.close()
+    assert (tmp_path / "scan_index.sqlite").exists()
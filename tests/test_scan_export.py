@@ -0,0 +1,60 @@
+import csv
+import json
+from types import SimpleNamespace
+
+import scan
+
+CREATED = 1_700_000_000_000
+
+
+class Content:
+    def __init__(self, items):
+        self.items = items
+
+    def advanced_search(self, query, start, max_items, sort_field, sort_order, as_dict):
+        return {"total": len(self.items), "results": self.items[start - 1:start - 1 + max_items]}
+
+
+def make_gis(items):
+    return SimpleNamespace(url="https://org.example.com/portal", properties=SimpleNamespace(id="org1"),
+                           content=Content(items))
+
+
+def items():
+    return [
+        {"id": "b", "title": "Roads", "type": "Feature Service", "contentStatus": "org_authoritative",
+         "created": CREATED + 1000, "modified": CREATED + 2500, "tags": ["roads", "gis"]},
+        {"id": "a", "title": "Parcels", "type": "Web Map", "contentStatus": "public_authoritative",
+         "created": CREATED, "modified": CREATED},
+        {"id": "c", "title": "Draft", "contentStatus": "", "created": CREATED, "modified": CREATED},
+    ]
+
+
+def test_a_scan_exports_one_csv_row_per_live_item_with_converted_timestamps(tmp_path):
+    out = tmp_path / "inventory.csv"
+
+    scan.GenerateInventory(make_gis(items()), str(out), str(tmp_path / "scan_index.sqlite"))
+
+    with open(out, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["Id"] for row in rows] == ["a", "b"]
+    assert rows[0]["Created"] == "2023-11-14 22:13:20"
+    assert rows[1]["Modified"] == "2023-11-14 22:13:22.500000"
+    assert rows[1]["Tags"] == "roads, gis"
+    assert rows[0]["ItemPageUrl"] == "https://org.example.com/portal/home/item.html?id=a"
+
+
+def test_timestamps_only_show_microseconds_when_some_value_needs_them():
+    assert scan.FormatTimestamps([CREATED, None]) == ["2023-11-14 22:13:20", ""]
+
+
+def test_export_only_rewrites_jsonl_from_the_store(tmp_path):
+    index_file = str(tmp_path / "scan_index.sqlite")
+    scan.GenerateInventory(make_gis(items()), str(tmp_path / "inventory.csv"), index_file)
+    out = tmp_path / "inventory.jsonl"
+
+    scan.GenerateInventory(None, str(out), index_file, export_only=True)
+
+    records = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [r["Title"] for r in records] == ["Parcels", "Roads"]
+    assert records[0]["Modified"] == "2023-11-14 22:13:20.000000"
@@ -0,0 +1,73 @@
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import scan
+
+
+class Content:
+    """advanced_search over a list of items, honouring created:[lo TO hi] ranges."""
+
+    def __init__(self, items, fail_once=()):
+        self.items = items
+        self.fail_once = set(fail_once)
+        self.calls = []
+
+    def advanced_search(self, query, start, max_items, sort_field, sort_order, as_dict):
+        self.calls.append((query, start))
+        if start in self.fail_once:
+            self.fail_once.discard(start)
+            raise ConnectionError("Connection reset by peer")
+        matches = self.items
+        found = re.search(r"created:\[(\d+) TO (\d+)\]", query)
+        if found:
+            lo, hi = int(found.group(1)), int(found.group(2))
+            matches = [i for i in matches if lo <= i["created"] <= hi]
+        page = matches[start - 1:start - 1 + max_items]
+        return {"total": len(matches), "results": page}
+
+
+def make_gis(count, **kwargs):
+    items = [{"id": f"item{n}", "created": 1_000_000 * (n + 1)} for n in range(count)]
+    return SimpleNamespace(url="https://org.example.com/portal", content=Content(items, **kwargs))
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(scan.retry_engine, "base_delay", 0.0)
+
+
+def test_every_page_is_streamed_once():
+    gis = make_gis(250)
+
+    ids = [item["id"] for item in scan.StreamSearch(gis, "q", workers=3)]
+
+    assert sorted(ids) == sorted(f"item{n}" for n in range(250))
+    assert sorted(start for _, start in gis.content.calls) == [1, 101, 201]
+
+
+def test_max_items_stops_the_stream_early():
+    ids = list(scan.StreamSearch(make_gis(250), "q", max_items=120, workers=2))
+
+    assert len(ids) == 120 and len(set(i["id"] for i in ids)) == 120
+
+
+def test_queries_over_the_result_cap_are_split_by_created_date(monkeypatch):
+    monkeypatch.setattr(scan, "SEARCH_RESULT_CAP", 100)
+    gis = make_gis(250)
+
+    ids = [item["id"] for item in scan.StreamSearch(gis, "q", workers=4)]
+
+    assert sorted(ids) == sorted(f"item{n}" for n in range(250))
+    assert all(total <= 100 for _, total in scan.PartitionQuery(gis, "q", 0, 10 ** 12))
+
+
+def test_a_transient_page_failure_is_retried_through_the_shared_engine():
+    gis = make_gis(150, fail_once=[101])
+
+    ids = list(scan.StreamSearch(gis, "q", workers=2))
+
+    assert len(ids) == 150
+    assert [start for _, start in gis.content.calls].count(101) == 2
+    assert type(scan.retry_engine).__module__ == "retrying"
@@ -0,0 +1,82 @@
+import csv
+
+import pytest
+
+import scan
+
+
+def row(item_id, modified=1000, status="org_authoritative"):
+    return (f"Title {item_id}", item_id, "Feature Service", "owner", 500, modified,
+            "", f"https://portal/home/item.html?id={item_id}", "", status)
+
+
+def read_feed(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return {r["Id"]: r["Reason"] for r in csv.DictReader(f)}
+
+
+@pytest.fixture
+def store(tmp_path):
+    conn = scan.OpenScanStore(str(tmp_path / "scan_index.sqlite"), str(tmp_path / "inventory.csv"))
+    yield conn
+    conn.close()
+
+
+def test_tombstoned_items_leave_the_index_and_enter_the_feed(store, tmp_path):
+    with store:
+        scan.UpsertItems(store, [row("a"), row("b"), row("c")], 1)
+        scan.TombstoneItems(store, {"a": "deleted", "b": "demoted"}, 2)
+
+    assert scan.LoadIndex(store) == {"c": 1000}
+    feed = str(tmp_path / "inventory_removed.csv")
+    assert scan.ExportRemoved(store, feed) == 2
+    assert read_feed(feed) == {"a": "deleted", "b": "demoted"}
+
+
+def test_tombstone_keeps_the_first_removal(store):
+    with store:
+        scan.UpsertItems(store, [row("a")], 1)
+        scan.TombstoneItems(store, {"a": "demoted"}, 2)
+        scan.TombstoneItems(store, {"a": "deleted"}, 3)
+
+    assert store.execute("SELECT deleted_at, removed_reason FROM items WHERE id = 'a'").fetchone() == (2, "demoted")
+
+
+def test_item_that_comes_back_is_revived(store, tmp_path):
+    with store:
+        scan.UpsertItems(store, [row("a")], 1)
+        scan.TombstoneItems(store, {"a": "deleted"}, 2)
+        scan.UpsertItems(store, [row("a", modified=2000)], 3)
+
+    assert scan.LoadIndex(store) == {"a": 2000}
+    assert store.execute("SELECT deleted_at, removed_reason FROM items WHERE id = 'a'").fetchone() == (None, None)
+    assert scan.ExportRemoved(store, str(tmp_path / "inventory_removed.csv")) == 0
+
+
+class FakeContent:
+    def __init__(self, items):
+        self.items = items
+
+    def advanced_search(self, query, start=1, max_items=100, **kwargs):
+        ids = query[len("id:("):-1].split(" OR ")
+        return {"total": len(ids), "results": [self.items[i] for i in ids if i in self.items]}
+
+
+class FakeGIS:
+    url = "https://portal.example.com"
+
+    def __init__(self, items):
+        self.content = FakeContent(items)
+
+
+def test_classify_missing_keeps_items_that_are_still_authoritative():
+    gis = FakeGIS({
+        "live": {"id": "live", "contentStatus": "org_authoritative", "orgId": "org1"},
+        "demoted": {"id": "demoted", "contentStatus": "", "orgId": "org1"},
+        "moved": {"id": "moved", "contentStatus": "public_authoritative", "orgId": "org2"},
+    })
+
+    removed, alive = scan.ClassifyMissing(gis, {"live", "demoted", "moved", "gone"}, org_id="org1", workers=2)
+
+    assert removed == {"demoted": "demoted", "moved": "demoted", "gone": "deleted"}
+    assert [item["id"] for item in alive] == ["live"]
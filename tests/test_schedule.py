@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = backup.BackupCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+
+def make_item(item_id, size=0, item_type="Web Map"):
+    return SimpleNamespace(id=item_id, title=item_id, type=item_type, size=size)
+
+
+def test_larger_items_start_first_and_unresolved_ids_last():
+    items = {iid: make_item(iid, size) for iid, size in (("small", 1), ("big", 500 * 1024 * 1024), ("mid", 50 * 1024 * 1024))}
+
+    order = backup.schedule_items(["small", "missing", "big", "mid"], items, None)
+
+    assert order == ["big", "mid", "small", "missing"]
+
+
+def test_a_recorded_duration_outweighs_the_size_guess(catalog):
+    catalog.record_strategy("item", "slow", "export", "File Geodatabase", True, 900.0)
+    items = {"slow": make_item("slow"), "big": make_item("big", 100 * 1024 * 1024)}
+
+    assert backup.schedule_items(["big", "slow"], items, catalog) == ["slow", "big"]
+    assert backup.estimate_cost(make_item("svc", item_type="Feature Service"), catalog) == \
+        backup.SCHEDULE_BASE_SECONDS + backup.SCHEDULE_FEATURE_SECONDS
+
+
+def test_priority_tiers_come_before_cost(tmp_path):
+    csv_path = tmp_path / "ids.csv"
+    csv_path.write_text("id,priority\nsmall,2\nbig,\nmid,1\nbad,high\n", encoding="utf-8")
+    items = {iid: make_item(iid, size) for iid, size in (("small", 1), ("big", 10 ** 9), ("mid", 10 ** 6))}
+
+    priorities = backup.read_priorities_from_csv(str(csv_path))
+
+    assert priorities == {"small": 2, "mid": 1}
+    assert backup.schedule_items(["big", "mid", "small"], items, None, priorities) == ["small", "mid", "big"]
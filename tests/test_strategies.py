@@ -0,0 +1,77 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import backup
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = backup.BackupCatalog(str(tmp_path))
+    yield catalog
+    catalog.close()
+
+
+def make_item(item_id="item1", item_type="Feature Service"):
+    return SimpleNamespace(id=item_id, title="Parcels", type=item_type)
+
+
+def default_strategies(item):
+    return [
+        backup.Strategy("export", item, "File Geodatabase"),
+        backup.Strategy("replica", item),
+        backup.Strategy("download", item),
+    ]
+
+
+def kinds(strategies):
+    return [s.kind for s in strategies]
+
+
+def test_without_history_the_default_order_is_kept(catalog):
+    strategies = default_strategies(make_item())
+    assert backup.order_strategies(strategies, catalog, 14) == strategies
+
+
+def test_the_strategy_that_last_worked_for_the_item_goes_first(catalog):
+    catalog.record_strategy("item", "item1", "export", "File Geodatabase", False, 30.0, "Export failed")
+    catalog.record_strategy("item", "item1", "replica", "", True, 12.0)
+
+    ordered = backup.order_strategies(default_strategies(make_item()), catalog, 14)
+
+    assert kinds(ordered) == ["replica", "download", "export"]
+
+
+def test_a_strategy_that_only_ever_failed_for_the_type_goes_last(catalog):
+    for item_id in ("a", "b", "c"):
+        catalog.record_strategy("type", "Feature Service", "export", "File Geodatabase", False, 5.0, "Not allowed")
+
+    ordered = backup.order_strategies(default_strategies(make_item("new")), catalog, 14)
+
+    assert kinds(ordered) == ["replica", "download", "export"]
+
+
+def test_history_older_than_the_ttl_is_ignored(catalog):
+    catalog.record_strategy("item", "item1", "export", "File Geodatabase", False, 30.0, "Export failed")
+    month_ago = (datetime.datetime.now() - datetime.timedelta(days=30)).isoformat(timespec="seconds")
+    with catalog._conn:
+        catalog._conn.execute("UPDATE strategies SET updated_at = ?", (month_ago,))
+    strategies = default_strategies(make_item())
+
+    assert backup.order_strategies(strategies, catalog, 14) == strategies
+
+
+def test_transient_failures_are_not_remembered(catalog):
+    item = make_item()
+    job = backup.BackupJob(item.id, item)
+    export, replica, _ = default_strategies(item)
+    job.attempts = [
+        (export, False, 3.0, "HTTP 503 Service Unavailable"),
+        (replica, False, 4.0, "Sync is not enabled"),
+    ]
+
+    backup.record_strategy_attempts(job, catalog)
+
+    assert list(catalog.strategy_history("item", "item1")) == [("replica", "")]
+    assert catalog.strategy_history("type", "Feature Service")[("replica", "")]["failures"] == 1
@@ -0,0 +1,74 @@
+import threading
+import zipfile
+
+import pytest
+
+import backup
+
+
+@pytest.fixture
+def sink(tmp_path):
+    return backup.ZipSink(str(tmp_path), "Parcels_1")
+
+
+def members(path):
+    with zipfile.ZipFile(path) as zf:
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+def test_streamed_and_json_members_land_under_the_item_prefix(sink):
+    sink.write_json("item.json", {"v": 1})
+    sink.write_json("item.json", {"v": 2})
+    with sink.open_stream("data.bin") as f:
+        f.write(b"payload")
+
+    ok, path, err = sink.close()
+
+    assert ok and err is None and path == sink.zip_path
+    files = members(path)
+    assert files["Parcels_1/data.bin"] == b"payload"
+    assert backup.json.loads(files["Parcels_1/item.json"]) == {"v": 2}
+    assert sink.member_size("data.bin") == 7
+
+
+def test_a_failed_stream_leaves_no_member_and_can_be_retried(sink):
+    with pytest.raises(ConnectionError):
+        with sink.open_stream("data.bin") as f:
+            f.write(b"half")
+            raise ConnectionError("dropped")
+    assert sink.member_size("data.bin") == 0
+
+    with sink.open_stream("data.bin") as f:
+        f.write(b"whole")
+    ok, path, _ = sink.close()
+
+    assert ok
+    assert members(path) == {"Parcels_1/data.bin": b"whole"}
+
+
+def test_streams_do_not_wait_for_each_other(sink):
+    both_open = threading.Barrier(2, timeout=5)
+
+    def stream(name):
+        with sink.open_stream(name) as f:
+            f.write(name.encode())
+            both_open.wait()  # breaks if the other stream cannot open meanwhile
+
+    threads = [threading.Thread(target=stream, args=(name,)) for name in ("a.bin", "b.bin")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not both_open.broken
+    ok, path, _ = sink.close()
+    assert members(path) == {"Parcels_1/a.bin": b"a.bin", "Parcels_1/b.bin": b"b.bin"}
+
+
+def test_a_failed_backup_is_kept_as_failed_zip(sink):
+    sink.write_json("item.json", {})
+    ok, path, _ = sink.close(failed=True)
+
+    assert ok and path.endswith("Parcels_1_FAILED.zip")
+    assert not backup.os.path.exists(sink.partial_path)
+    assert not backup.os.path.exists(sink.scratch_dir)